@@ -0,0 +1,109 @@
+"""
+Compare the sequential and concurrent runs of the Modrinth and packwiz exports
+
+Replaces mmc-export with a stand-in that waits --seconds (like the hashing and network lookups
+of the real one) and writes the expected outputs, then times PrismInstance.pack_modrinth followed
+by pack_packwiz against pack_all. Also checks that when the Modrinth export fails, the packwiz
+one is stopped instead of being left running.
+
+Usage: python benchmarks/bench_concurrent_exports.py [--seconds 2]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from bench_streaming_load import generate_export, load_script_module
+
+parser = argparse.ArgumentParser(description="Benchmark of the concurrent exports")
+parser.add_argument("--seconds", type=float, default=2, help="Duration of each stand-in export")
+
+# Stand-in for mmc-export: -f <format> -o <output dir>, fails if MMC_EXPORT_FAIL is the format
+FAKE_MMC_EXPORT = """
+import os, sys, time, zipfile
+args = sys.argv[1:]
+output_format = args[args.index("-f") + 1]
+output_dir = args[args.index("-o") + 1]
+print(f"Exporting {output_format}", flush=True)
+if os.environ.get("MMC_EXPORT_FAIL") == output_format:
+    print("Network error", file=sys.stderr, flush=True)
+    sys.exit(3)
+time.sleep(float(os.environ["MMC_EXPORT_SECONDS"]))
+os.makedirs(output_dir, exist_ok=True)
+if output_format == "packwiz":
+    with zipfile.ZipFile(os.path.join(output_dir, "mmc_export_packwiz_output.zip"), "w") as archive:
+        archive.writestr("pack.toml", "name = 'Benchmark'")
+else:
+    open(os.path.join(output_dir, "Benchmark.mrpack"), "wb").close()
+with open("finished.log", "a") as f:
+    f.write(output_format + "\\n")
+print("Done", flush=True)
+"""
+
+
+def quiet(function):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        os.makedirs("exports")
+        os.makedirs("Packwiz")
+        with open("config.json", "w") as f:
+            json.dump({"modpack_name": "Benchmark", "instance_includes_list": ["config", "mods", "options.txt"]}, f)
+        with open("fake_mmc_export.py", "w") as f:
+            f.write(FAKE_MMC_EXPORT)
+        generate_export("exports/Benchmark-1.0.0.zip", 5, 100_000, 50)
+        module = load_script_module()
+        fake_program = f"{sys.executable} fake_mmc_export.py"
+        module.MMC_EXPORT_TO_MODRINTH_COMMAND = module.MMC_EXPORT_TO_MODRINTH_COMMAND.replace(module.MMC_EXPORT_PROGRAM, fake_program, 1)
+        module.MMC_EXPORT_TO_PACKWIZ_COMMAND = module.MMC_EXPORT_TO_PACKWIZ_COMMAND.replace(module.MMC_EXPORT_PROGRAM, fake_program, 1)
+        os.environ["MMC_EXPORT_SECONDS"] = str(args.seconds)
+        instance = None
+
+        def load():
+            nonlocal instance
+            instance = module.PrismInstance("exports/Benchmark-1.0.0.zip")
+        quiet(load)
+
+        sequential_time = quiet(lambda: (instance.pack_modrinth(), instance.pack_packwiz()))
+        concurrent_time = quiet(instance.pack_all)
+        outputs_ok = os.path.isfile("output/Benchmark.mrpack") and os.path.isfile(f"Packwiz/{instance.get_version()}/pack.toml")
+
+        # Failure of one export: the other one must not keep running
+        os.remove("finished.log")
+        os.environ["MMC_EXPORT_FAIL"] = "Modrinth"
+        error = None
+        try:
+            quiet(instance.pack_all)
+        except Exception as e:
+            error = e
+        time.sleep(args.seconds + 0.5)
+        orphan = os.path.isfile("finished.log")
+
+    print(f"{'run':<28}{'wall time':>12}")
+    print(f"{'sequential':<28}{sequential_time:>11.2f}s")
+    print(f"{'concurrent':<28}{concurrent_time:>11.2f}s")
+    print(f"Speedup: {sequential_time / concurrent_time:.2f}x")
+    print(f"Outputs written: {outputs_ok}")
+    print(f"Failure reported: {error is not None}")
+    print(f"Other export left running after the failure: {orphan}")
+    if not outputs_ok or error is None or orphan:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Check and benchmark of the CurseForge fingerprints (MurmurHash2 of the file without whitespace bytes)
+
+Checks the fingerprints of fixed contents against the values of the reference C MurmurHash2,
+checks that the NumPy and pure Python versions agree on random data, then prints the speed
+of each version on one big content and of the process pool on many jar sized contents.
+
+Usage: python benchmarks/bench_fingerprint.py [--size-mb 64] [--jars 200] [--jar-size 2000000] [--workers 4]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+
+from ModpackCreator.Hashing import Fingerprint
+
+parser = argparse.ArgumentParser(description="Check and benchmark of the CurseForge fingerprints")
+parser.add_argument("--size-mb", type=int, default=64, help="Size of the content of the single content benchmark")
+parser.add_argument("--jars", type=int, default=200, help="Number of contents of the process pool benchmark")
+parser.add_argument("--jar-size", type=int, default=2_000_000, help="Size of each of these contents")
+parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes of the pool")
+
+
+def sha256_chain(size):
+    content = bytearray()
+    digest = b"seed"
+    while len(content) < size:
+        digest = hashlib.sha256(digest).digest()
+        content += digest
+    return bytes(content[:size])
+
+
+# Fingerprints of the reference MurmurHash2 (seed 1) of these contents without their whitespace bytes
+KNOWN_FINGERPRINTS = [
+    ("empty", b"", 1540447798),
+    ("whitespace only", b" \t\r\n" * 10, 1540447798),
+    ("hello", b"Hello World\n", 1756117720),
+    ("tail of 1 byte", b"abcde", 3469237630),
+    ("tail of 2 bytes", b"abcdef", 455443312),
+    ("tail of 3 bytes", b"abcdefg", 184182053),
+    ("text with CRLF", b"public class Mod {\n    int x = 1;\r\n}\n" * 5000, 4025524760),
+    ("all byte values", bytes(range(256)) * 4096 + b"xyz", 1501783164),
+    ("1 MB + 1 byte", sha256_chain(1_000_001), 1193826499),
+]
+
+
+def check_known():
+    failures = 0
+    for label, content, expected in KNOWN_FINGERPRINTS:
+        filtered = content.translate(None, Fingerprint.WHITESPACE)
+        results = {"python": Fingerprint.murmur2_python(filtered)}
+        if Fingerprint.numpy is not None:
+            results["numpy"] = Fingerprint.murmur2_numpy(filtered)
+        for version, value in results.items():
+            if value != expected:
+                failures += 1
+                print(f"FAIL {label} ({version}): {value} != {expected}")
+    print(f"{len(KNOWN_FINGERPRINTS)} known fingerprints checked, {failures} failures")
+    return failures
+
+
+def check_random():
+    if Fingerprint.numpy is None:
+        return 0
+    rng = random.Random(0)
+    failures = 0
+    for size in (4, 63 * 4, 64 * 4 + 3, 100_003, 4 * Fingerprint.NUMPY_CHUNK_BLOCKS + 5):
+        content = rng.randbytes(size)
+        if Fingerprint.murmur2_numpy(content) != Fingerprint.murmur2_python(content):
+            failures += 1
+            print(f"FAIL random content of {size} bytes: NumPy and pure Python disagree")
+    print(f"NumPy and pure Python compared on random contents, {failures} failures")
+    return failures
+
+
+def speed(function, content):
+    start = time.perf_counter()
+    function(content)
+    return len(content) / 1024 / 1024 / (time.perf_counter() - start)
+
+
+def main():
+    args = parser.parse_args()
+    failures = check_known() + check_random()
+    rng = random.Random(1)
+    content = rng.randbytes(args.size_mb * 1024 * 1024)
+    print(f"NumPy: {'available' if Fingerprint.numpy is not None else 'not installed'}, {os.cpu_count()} CPUs")
+    # The pure Python version on a part only, it's slow
+    print(f"  pure Python:  {speed(Fingerprint.murmur2_python, content[:8 * 1024 * 1024]):8.1f} MB/s")
+    if Fingerprint.numpy is not None:
+        print(f"  NumPy:        {speed(Fingerprint.murmur2_numpy, content):8.1f} MB/s")
+    print(f"  whitespace filter: {speed(lambda data: data.translate(None, Fingerprint.WHITESPACE), content):8.1f} MB/s")
+    contents = [rng.randbytes(args.jar_size) for _ in range(args.jars)]
+    start = time.perf_counter()
+    Fingerprint.fingerprint_contents(contents, args.workers)
+    seconds = time.perf_counter() - start
+    print(f"  {args.jars} contents of {args.jar_size} bytes, {args.workers} processes: {args.jars * args.jar_size / 1024 / 1024 / seconds:8.1f} MB/s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
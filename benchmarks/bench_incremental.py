@@ -0,0 +1,89 @@
+"""
+Rebuild time of the "incremental" build mode of PrismInstance.load after a small change
+
+Generates a synthetic Prism export, builds it once in incremental mode, then changes one mod
+and a few configs, removes a config and rebuilds. The prepared export of the rebuild must have
+the same content as a full build of the changed export in "unpacked" mode.
+
+Usage: python benchmarks/bench_incremental.py [--mods 400] [--mod-size 2000000] [--configs 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+from bench_streaming_load import generate_export, load_script_module, read_zip_content
+
+parser = argparse.ArgumentParser(description="Benchmark of the incremental build mode")
+parser.add_argument("--mods", type=int, default=400, help="Number of mods in the export")
+parser.add_argument("--mod-size", type=int, default=2_000_000, help="Size of each mod in bytes")
+parser.add_argument("--configs", type=int, default=2000, help="Number of config files in the export")
+parser.add_argument("--changed-configs", type=int, default=5, help="Configs changed between the two exports")
+
+
+def change_export(from_path, to_path, changed_configs):
+    # Same export with one mod and a few configs changed, and one config removed
+    rng = random.Random(1)
+    changed = 0
+    with zipfile.ZipFile(from_path) as from_archive, zipfile.ZipFile(to_path, "w", zipfile.ZIP_DEFLATED) as to_archive:
+        for zipinfo in from_archive.infolist():
+            content = from_archive.read(zipinfo)
+            if zipinfo.filename == "minecraft/mods/mod-0.jar":
+                content = rng.randbytes(len(content))
+            elif zipinfo.filename.startswith("minecraft/config/") and changed < changed_configs:
+                content += b"changed = true\n"
+                changed += 1
+            elif zipinfo.filename.startswith("minecraft/config/") and changed == changed_configs:
+                changed += 1
+                continue
+            to_archive.writestr(zipinfo, content)
+
+
+def build(module, build_mode, zip_path):
+    module.BUILD_MODE = build_mode
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = time.perf_counter()
+        module.PrismInstance(zip_path)
+        return time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        os.makedirs("exports")
+        with open("config.json", "w") as f:
+            json.dump({"modpack_name": "Benchmark", "instance_includes_list": ["config", "mods", "options.txt"]}, f)
+        print(f"Generating exports: {args.mods} mods of {args.mod_size} bytes, {args.configs} configs")
+        generate_export("exports/Benchmark-1.0.0.zip", args.mods, args.mod_size, args.configs)
+        change_export("exports/Benchmark-1.0.0.zip", "exports/Benchmark-1.0.1.zip", args.changed_configs)
+        module = load_script_module()
+        results = [
+            ("incremental, first build", build(module, module.BUILD_MODE_INCREMENTAL, "exports/Benchmark-1.0.0.zip")),
+            ("incremental, rebuild", build(module, module.BUILD_MODE_INCREMENTAL, "exports/Benchmark-1.0.1.zip")),
+        ]
+        incremental_output = read_zip_content(module.PATH_PRISM_PREPARED_EXPORT)
+        results.append(("unpacked, full build", build(module, module.BUILD_MODE_UNPACKED, "exports/Benchmark-1.0.1.zip")))
+        unpacked_output = read_zip_content(module.PATH_PRISM_PREPARED_EXPORT)
+
+    same_output = incremental_output == unpacked_output
+    print(f"Same prepared export content: {same_output}")
+    print(f"{'build':<28}{'wall time':>12}")
+    for name, wall_time in results:
+        print(f"{name:<28}{wall_time:>11.2f}s")
+    if not same_output:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Scaling of the CRLF normalization of ModpackCreator.Text.Normalizer with the number of workers
+
+Generates a synthetic config tree in a temporary directory, normalizes a copy of it with
+each worker count and checks that every result is byte-identical to the serial one.
+Then normalizes fresh copies through a NormalizationCache: a cold build, and a warm one
+where only --changed configs differ.
+
+Usage: python benchmarks/bench_normalize.py [--configs 8000] [--lines 80] [--workers 1 2 4 8] [--changed 400]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+from ModpackCreator.Text.Normalizer import normalize_tree
+from ModpackCreator.Text.NormalizationCache import NormalizationCache
+
+parser = argparse.ArgumentParser(description="Benchmark of the parallel CRLF normalization")
+parser.add_argument("--configs", type=int, default=8000, help="Number of config files")
+parser.add_argument("--lines", type=int, default=80, help="Lines per config file")
+parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to compare")
+parser.add_argument("--changed", type=int, default=400, help="Configs changed between the cold and the warm cached builds")
+
+
+def generate_tree(root, configs, lines):
+    rng = random.Random(0)
+    endings = ["\n", "\r\n", "\r"]
+    extensions = [".json", ".toml", ".cfg", ".properties", ".json5"]
+    for i in range(configs):
+        config_dir = os.path.join(root, "config", f"mod-{i % 200}")
+        os.makedirs(config_dir, exist_ok=True)
+        ending = endings[i % len(endings)]
+        content = ending.join(f"option_{j} = {rng.randint(0, 100000)}" for j in range(lines)) + ending
+        with open(os.path.join(config_dir, f"config-{i}{extensions[i % len(extensions)]}"), "w", newline="") as f:
+            f.write(content)
+
+
+def change_tree(root, changed):
+    # Append a line to the first configs, the others stay byte-identical
+    paths = sorted(os.path.join(dir_path, file_name) for dir_path, _, file_names in os.walk(root) for file_name in file_names)
+    for path in paths[:changed]:
+        with open(path, "ab") as f:
+            f.write(b"changed = true\n")
+
+
+def read_tree(root):
+    content = {}
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            with open(path, "rb") as f:
+                content[os.path.relpath(path, root)] = f.read()
+    return content
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        source = os.path.join(workspace, "source")
+        print(f"Generating {args.configs} configs of {args.lines} lines ({os.cpu_count()} cores)")
+        generate_tree(source, args.configs, args.lines)
+        reference = None
+        identical = True
+        baseline_seconds = None
+        for workers in args.workers:
+            tree = os.path.join(workspace, f"tree-{workers}")
+            shutil.copytree(source, tree)
+            stats = normalize_tree(tree, workers=workers)
+            baseline_seconds = baseline_seconds or stats.seconds
+            print(f"{stats.summary()} (speedup {baseline_seconds / stats.seconds:.2f}x)")
+            content = read_tree(tree)
+            if reference is None:
+                reference = content
+            identical = identical and content == reference
+            shutil.rmtree(tree)
+        # Cached builds: each one starts from a fresh copy of the export, like a real build
+        cache_dir = os.path.join(workspace, "cache")
+        for build in ["cold", "warm"]:
+            if build == "warm":
+                change_tree(source, args.changed)
+                reference = None
+            tree = os.path.join(workspace, f"cached-{build}")
+            shutil.copytree(source, tree)
+            cache = NormalizationCache(cache_dir)
+            stats = normalize_tree(tree, workers=args.workers[-1], cache=cache)
+            print(f"{build} cache: {stats.summary()}")
+            print(f"  {cache.summary()}")
+            if reference is not None:
+                identical = identical and read_tree(tree) == reference
+            elif build == "warm":
+                serial_tree = os.path.join(workspace, "serial-warm")
+                shutil.copytree(source, serial_tree)
+                normalize_tree(serial_tree, workers=1)
+                identical = identical and read_tree(tree) == read_tree(serial_tree)
+    print(f"Byte-identical results: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare shutil.make_archive with the parallel make_archive of ModpackCreator.Zip.ParallelZipWriter
+
+Generates a synthetic staging tree (mods and config files) in a temporary directory,
+zips it with shutil.make_archive and with the parallel writer at several worker counts,
+and checks that every archive has the same content.
+
+Usage: python benchmarks/bench_parallel_zip.py [--mods 200] [--mod-size 2000000] [--configs 4000] [--workers 1 4 16]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+from ModpackCreator.Zip.ParallelZipWriter import make_archive
+
+parser = argparse.ArgumentParser(description="Benchmark of the parallel zip writer")
+parser.add_argument("--mods", type=int, default=200, help="Number of mods in the tree")
+parser.add_argument("--mod-size", type=int, default=2_000_000, help="Size of each mod in bytes")
+parser.add_argument("--configs", type=int, default=4000, help="Number of config files in the tree")
+parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="Worker counts to compare")
+
+
+def generate_tree(root, mods, mod_size, configs):
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(500)]
+    os.makedirs(os.path.join(root, "minecraft", "mods"))
+    for i in range(mods):
+        # Half random bytes, half text: compressible like the classes and assets of a real jar
+        content = rng.randbytes(mod_size // 2) + " ".join(rng.choices(words, k=mod_size // 12)).encode()[:mod_size // 2]
+        with open(os.path.join(root, "minecraft", "mods", f"mod-{i}.jar"), "wb") as f:
+            f.write(content)
+    for i in range(configs):
+        config_dir = os.path.join(root, "minecraft", "config", f"mod-{i % 100}")
+        os.makedirs(config_dir, exist_ok=True)
+        with open(os.path.join(config_dir, f"config-{i}.toml"), "w") as f:
+            f.write("\r\n".join(f"{rng.choice(words)} = {rng.randint(0, 1000)}" for _ in range(60)))
+
+
+def read_zip_content(zip_path):
+    with zipfile.ZipFile(zip_path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        root = os.path.join(workspace, "tree")
+        print(f"Generating tree: {args.mods} mods of {args.mod_size} bytes, {args.configs} configs ({os.cpu_count()} cores)")
+        generate_tree(root, args.mods, args.mod_size, args.configs)
+        results = []
+        start = time.perf_counter()
+        reference_path = shutil.make_archive(os.path.join(workspace, "reference"), "zip", root)
+        results.append(("make_archive", time.perf_counter() - start, os.path.getsize(reference_path)))
+        reference = read_zip_content(reference_path)
+        same_content = True
+        for workers in args.workers:
+            start = time.perf_counter()
+            zip_path = make_archive(os.path.join(workspace, f"parallel-{workers}"), root, workers)
+            results.append((f"parallel x{workers}", time.perf_counter() - start, os.path.getsize(zip_path)))
+            same_content = same_content and read_zip_content(zip_path) == reference
+            os.remove(zip_path)
+
+    print(f"Same content as make_archive: {same_content}")
+    print(f"{'writer':<16}{'wall time':>12}{'size':>14}{'speedup':>10}")
+    for name, wall_time, size in results:
+        print(f"{name:<16}{wall_time:>11.2f}s{size / 1024 / 1024:>11.1f} MB{results[0][1] / wall_time:>9.2f}x")
+    if not same_content:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
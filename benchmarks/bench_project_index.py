@@ -0,0 +1,136 @@
+"""
+Benchmark of the loose matching of jars with the local project index
+
+Writes a synthetic dump of projects, builds the memory mapped index from it and times the
+lookups of jars by mod id (exact) and by a misspelt file name (trigram similarity). Then
+resolves the jars loosely against the local stand-in of the Modrinth API, once with the
+index and once with a network search per jar, the way mmc-export matches them, and prints
+the wall time, requests and matches of each.
+
+Usage: python benchmarks/bench_project_index.py [--projects 50000] [--jars 300] [--latency 0.02]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+
+from ModpackCreator.Http.HttpSession import HttpSession
+from ModpackCreator.Resolver.JarIdentity import jar_names
+from ModpackCreator.Resolver.ProjectIndex import ProjectIndex, build_index
+from ModpackCreator.Resolver.Resolver import Resolver
+from ModpackCreator.Resolver.StandInServer import StandInServer
+
+parser = argparse.ArgumentParser(description="Benchmark of the loose matching with the local project index")
+parser.add_argument("--projects", type=int, default=50_000, help="Number of projects in the dump")
+parser.add_argument("--jars", type=int, default=300, help="Number of jars to match")
+parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to each answer of the stand-in")
+
+# Made up words, some with the common words of mod names
+ONSETS = ["b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w", "z", "br", "cr", "dr", "gr", "st", "tr"]
+VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "ou"]
+CODAS = ["", "", "n", "r", "l", "x", "st", "ck"]
+COMMON_WORDS = ["craft", "mod", "api", "lib", "extra", "tweaks", "core", "plus", "utils", "more"]
+
+
+def project_name(rng, used):
+    while True:
+        words = ["".join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 2))]
+        if rng.random() < 0.3:
+            words.append(rng.choice(COMMON_WORDS))
+        name = "-".join(words)
+        if name not in used:
+            used.add(name)
+            return name
+
+
+def write_dump(path, projects):
+    with open(path, "w") as f:
+        for project_id, slug in projects:
+            f.write(json.dumps({"provider": "modrinth", "id": project_id, "slug": slug, "title": slug.replace("-", " ").title(), "mod_ids": [slug.replace("-", "_")]}) + "\n")
+
+
+# Half the jars declare their mod id, the others only have a file name with a typo in it
+def make_jar(rng, slug, number):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        if number % 2 == 0:
+            archive.writestr("fabric.mod.json", json.dumps({"id": slug.replace("-", "_"), "version": "1.0.0"}))
+            file_name = f"{slug}-fabric-1.0.{number}.jar"
+        else:
+            file_name = f"{slug.title()}x-1.0.{number}+mc1.20.1.jar"
+        archive.writestr("data.bin", rng.randbytes(2_000))
+    return file_name, buffer.getvalue()
+
+
+def print_result(label, seconds, stand_in, found, total):
+    requests = sum(stand_in.requests.values())
+    print(f"{label:<24} {seconds:8.3f}s {requests:9} {found:>6}/{total}")
+    for key, count in sorted(stand_in.requests.items()):
+        print(f"    {key}: {count}")
+
+
+def main():
+    args = parser.parse_args()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as workspace:
+        used = set()
+        projects = [(f"P{number:07d}", project_name(rng, used)) for number in range(args.projects)]
+        dump_path = os.path.join(workspace, "projects.jsonl")
+        index_path = os.path.join(workspace, "project_index.bin")
+        write_dump(dump_path, projects)
+        start = time.perf_counter()
+        build_index(dump_path, index_path)
+        build_seconds = time.perf_counter() - start
+        print(f"Index of {args.projects} projects: built in {build_seconds:.2f}s, {os.path.getsize(dump_path) / 1e6:.1f} MB of dump, {os.path.getsize(index_path) / 1e6:.1f} MB of index")
+        start = time.perf_counter()
+        index = ProjectIndex(index_path)
+        print(f"Opened in {(time.perf_counter() - start) * 1000:.3f} ms")
+
+        picked = rng.sample(projects, args.jars)
+        jars = {}
+        for number, (project_id, slug) in enumerate(picked):
+            file_name, content = make_jar(rng, slug, number)
+            jars[hashlib.sha1(content).hexdigest()] = (file_name, content, project_id)
+        for label, wanted in (("exact (mod id)", 0), ("similar (file name)", 1)):
+            timings = []
+            correct = 0
+            for number, (file_name, content, project_id) in enumerate(jars.values()):
+                if number % 2 != wanted:
+                    continue
+                start = time.perf_counter()
+                match = index.match(jar_names(file_name, content))
+                timings.append(time.perf_counter() - start)
+                correct += match is not None and match.project_id == project_id
+            timings.sort()
+            print(f"Match {label:<20} median {timings[len(timings) // 2] * 1000:.3f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.3f} ms, {correct}/{len(timings)} correct")
+        index.close()
+
+        # The published files have other bytes than the jars of the pack, with the same names
+        with StandInServer(args.latency) as stand_in:
+            for file_name, content, project_id in jars.values():
+                published = content + b"published"
+                stand_in.add_modrinth_file(hashlib.sha1(published).hexdigest(), hashlib.sha512(published).hexdigest(), file_name, len(published), project_id=project_id, title=dict(projects)[project_id].replace("-", " ").title())
+            print(f"{'':<24} {'wall':>9} {'requests':>9} {'found':>13}")
+            for label in ("network search per jar", "local index"):
+                project_index = ProjectIndex(index_path) if label == "local index" else None
+                resolver = Resolver(HttpSession(), ["modrinth"], stand_in.modrinth_url, project_index=project_index, network_search=project_index is None)
+                stand_in.reset_counters()
+                start = time.perf_counter()
+                resolved = resolver.resolve_loose(list(jars), lambda sha1: jars[sha1][:2])
+                seconds = time.perf_counter() - start
+                found = sum(1 for sha1, resolved_file in resolved.items() if resolved_file.project_id == jars[sha1][2])
+                print_result(label, seconds, stand_in, found, len(jars))
+                resolver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark of the mod resolution against the local stand-in of the Modrinth and CurseForge APIs
+
+Generates a synthetic Prism export, puts most of its jars in the catalogue of the stand-in
+server and builds both native packs with "modrinth_api_url" pointing to it. Compares with
+one request per jar on a new connection each time, the way the lookups were done before,
+and with a rebuild answered by the resolution lockfile. Prints the wall time, requests and
+connections of each. The stand-in can add latency, a rate limit and failures to check the
+retries.
+
+Usage: python benchmarks/bench_resolver.py [--mods 400] [--known 0.9] [--latency 0.02] [--rate-limit 20] [--fail-every 7]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+
+from bench_streaming_load import generate_export, load_script_module
+from ModpackCreator.Resolver.StandInServer import StandInServer
+
+parser = argparse.ArgumentParser(description="Benchmark of the mod resolution against a local stand-in server")
+parser.add_argument("--mods", type=int, default=400, help="Number of mods in the export")
+parser.add_argument("--mod-size", type=int, default=20_000, help="Size of each mod in bytes")
+parser.add_argument("--known", type=float, default=0.9, help="Part of the mods known by the stand-in")
+parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to each answer of the stand-in")
+parser.add_argument("--rate-limit", type=int, default=None, help="Requests per second allowed by the stand-in")
+parser.add_argument("--fail-every", type=int, default=None, help="Every n-th request of the stand-in fails with a 503")
+
+
+def fill_catalogue(stand_in, zip_path, known):
+    jars = []
+    with zipfile.ZipFile(zip_path) as archive:
+        for name in archive.namelist():
+            if name.endswith(".jar"):
+                content = archive.read(name)
+                jars.append((name.rsplit("/", 1)[1], hashlib.sha1(content).hexdigest(), hashlib.sha512(content).hexdigest(), len(content)))
+    for file_name, sha1, sha512, size in jars[:int(len(jars) * known)]:
+        stand_in.add_modrinth_file(sha1, sha512, file_name, size)
+    return [sha1 for _, sha1, _, _ in jars]
+
+
+def one_request_per_jar(stand_in, sha1s):
+    found = 0
+    for sha1 in sha1s:
+        try:
+            with urlopen(f"{stand_in.modrinth_url}/version_file/{sha1}") as response:
+                json.load(response)
+                found += 1
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+    return found
+
+
+def read_outputs(module):
+    with zipfile.ZipFile(f"{module.PATH_MODRINTH_OUTPUT}/Benchmark-1.0.0.mrpack") as archive:
+        index = archive.read("modrinth.index.json")
+    packwiz = {}
+    for dir_path, _, file_names in os.walk("Packwiz/1.0.0"):
+        for file_name in file_names:
+            with open(os.path.join(dir_path, file_name), "rb") as f:
+                packwiz[os.path.join(dir_path, file_name)] = f.read()
+    return index, packwiz
+
+
+def print_result(label, seconds, stand_in, found, total):
+    requests = sum(stand_in.requests.values())
+    print(f"{label:<28} {seconds:8.2f}s {requests:9} {stand_in.connections:12} {found:>6}/{total}")
+    for key, count in sorted(stand_in.requests.items()):
+        print(f"    {key}: {count}")
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        os.makedirs("exports")
+        zip_path = "exports/Benchmark-1.0.0.zip"
+        print(f"Generating export: {args.mods} mods of {args.mod_size} bytes")
+        generate_export(zip_path, args.mods, args.mod_size, 50)
+        with StandInServer(args.latency, args.rate_limit, 1.0, args.fail_every) as stand_in:
+            sha1s = fill_catalogue(stand_in, zip_path, args.known)
+            with open("config.json", "w") as f:
+                json.dump({
+                    "modpack_name": "Benchmark",
+                    "instance_includes_list": ["config", "mods", "options.txt"],
+                    "modrinth_backend": "native",
+                    "packwiz_backend": "native",
+                    "modrinth_api_url": stand_in.modrinth_url,
+                    "hash_cache": None,
+                }, f)
+            print(f"{'':<28} {'wall':>9} {'requests':>9} {'connections':>12} {'found':>13}")
+            # Before: a request per jar, a connection per request, no retries
+            if not args.rate_limit and not args.fail_every:
+                start = time.perf_counter()
+                found = one_request_per_jar(stand_in, sha1s)
+                print_result("one request per jar", time.perf_counter() - start, stand_in, found, len(sha1s))
+            # Resolver of both native writers, then a rebuild answered by the lockfile
+            module = load_script_module()
+            outputs = []
+            for label in ("resolver, both packs", "rebuild with the lockfile"):
+                with contextlib.redirect_stdout(open(os.devnull, "w")):
+                    instance = module.PrismInstance(zip_path)
+                stand_in.reset_counters()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(open(os.devnull, "w")):
+                    instance.pack_all()
+                    instance.finish_resolution()
+                seconds = time.perf_counter() - start
+                found = sum(1 for entry in instance.resolver.entries.values() if entry["provider"] is not None)
+                print_result(label, seconds, stand_in, found, len(sha1s))
+                outputs.append(read_outputs(module))
+            print(f"Same packs with the lockfile: {outputs[0] == outputs[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Stage benchmark suite of PrismInstance.load and of the old BuiltInTasks
+
+For each scale (mods x configs), generates synthetic exports with synthetic_export.py and
+times every stage of PrismInstance.load in the "unpacked", "streaming" and "incremental"
+build modes (the incremental one on a rebuild of the same export), then the preparation of
+the old BuildMMCPackFromExport, BuildPackwizPackFromExport and BuildCurseforgePackFromExport
+tasks. The external mmc-export and packwiz commands are not run. Each stage keeps its best
+time of --runs runs.
+
+The results are written as JSON. Given a baseline (the JSON of an earlier run, stored with
+--save-baseline), the stages slower than the baseline by more than --threshold, and by more
+than --min-seconds, are listed as regressions and the exit code is 1.
+
+Usage: python benchmarks/bench_stages.py [--scales 50x1000,400x1000,1000x1000,50x10000,400x10000,1000x10000]
+           [--mod-size 100000] [--runs 1] [--output stages.json] [--baseline stages-baseline.json] [--save-baseline]
+           [--threshold 0.2]
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+
+from bench_streaming_load import load_script_module
+from synthetic_export import write_synthetic_export
+
+parser = argparse.ArgumentParser(description="Stage benchmark suite of PrismInstance.load and of the old BuiltInTasks")
+parser.add_argument("--scales", default="50x1000,400x1000,1000x1000,50x10000,400x10000,1000x10000", help="Comma separated <mods>x<configs> scales")
+parser.add_argument("--mod-size", type=int, default=100_000, help="Median size of a mod in bytes")
+parser.add_argument("--layout", choices=("minecraft", ".minecraft"), default="minecraft", help="Name of the minecraft folder of the exports")
+parser.add_argument("--runs", type=int, default=1, help="Runs of each target, the best time of each stage is kept")
+parser.add_argument("--output", default=None, help="JSON file of the results")
+parser.add_argument("--baseline", default=None, help="JSON results to compare with")
+parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline instead of comparing")
+parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown over the baseline counted as a regression, 0.2 for 20%%")
+parser.add_argument("--min-seconds", type=float, default=0.05, help="Slowdowns shorter than this are noise, not regressions")
+
+MODPACK_NAME = "Synthetic"
+VERSION = "1.0.0"
+INCLUDES = ["config", "mods", "options.txt"]
+# Stages of PrismInstance.load, in the order they run; make_archive is the finalization of the prepared export
+LOAD_STAGES = ["verify_zip_validity", "remove_old_prepared_export", "create_temp_directory", "create_new_prepared_export", "remove_not_included_files",
+               "normalize_file_ending", "restage_included_files", "stream_prepared_export"]
+# Functions called by the old tasks, timed as their stages, with the module the tasks import them from when they run
+TASK_STAGES = {"unpack_archive": "shutil", "normalize_tree": "ModpackCreator.Text.Normalizer", "normalize_paths": "ModpackCreator.Text.Normalizer",
+               "make_archive": "ModpackCreator.Zip.ParallelZipWriter"}
+
+
+class StageTimer:
+    # Replaces methods and functions by timed ones, and puts them back. A timed function called by another one
+    # (normalize_tree calls normalize_paths) is part of the caller's stage, not counted twice.
+
+    def __init__(self):
+        self.seconds = {}
+        self.replaced = []
+        self.depth = 0
+
+    def wrap(self, owner, name, label=None):
+        original = getattr(owner, name)
+        label = label or name
+
+        def timed(*args, **kwargs):
+            if self.depth:
+                return original(*args, **kwargs)
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.seconds[label] = self.seconds.get(label, 0.0) + time.perf_counter() - start
+                self.depth -= 1
+
+        self.replaced.append((owner, name, original))
+        setattr(owner, name, timed)
+
+    def restore(self):
+        for owner, name, original in reversed(self.replaced):
+            setattr(owner, name, original)
+        self.replaced = []
+
+
+def run_quietly(function):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+
+
+def time_load(module, build_mode, zip_path, warm_up):
+    module.BUILD_MODE = build_mode
+    # The incremental mode is timed on a rebuild: the first build only fills the staging directory
+    if warm_up:
+        run_quietly(lambda: module.PrismInstance(zip_path))
+    instance = module.PrismInstance.__new__(module.PrismInstance)
+    instance.zip_path = zip_path
+    instance.resolver = None
+    instance.resident = None
+    instance.cancel = None
+    timer = StageTimer()
+    for stage in LOAD_STAGES:
+        timer.wrap(instance, stage)
+    timer.wrap(module, "make_archive")
+    try:
+        total = run_quietly(instance.load)
+    finally:
+        timer.restore()
+    return dict(timer.seconds, total=total)
+
+
+def time_task(task_module, config, args, steps):
+    task = task_module.Task()
+    task.config = dict(config)
+    task.args = dict(args)
+    timer = StageTimer()
+    # Imported by the task module, or inside the task methods when they run
+    for name, source in TASK_STAGES.items():
+        timer.wrap(task_module if hasattr(task_module, name) else importlib.import_module(source), name)
+    try:
+        total = 0.0
+        for step in steps:
+            total += run_quietly(getattr(task, step))
+    finally:
+        timer.restore()
+    return dict(timer.seconds, total=total)
+
+
+def run_scale(module, tasks, mods, configs, mod_size, layout, runs):
+    prism_export = f"exports/{MODPACK_NAME}-{VERSION}.zip"
+    mmc_export = f"exports/{MODPACK_NAME}-mmc-{VERSION}.zip"
+    curseforge_export = f"exports/{MODPACK_NAME}-curseforge-{VERSION}.zip"
+    write_synthetic_export(prism_export, mods, mod_size, configs, layout)
+    write_synthetic_export(mmc_export, mods, mod_size, configs, layout, instance_dir=MODPACK_NAME)
+    write_synthetic_export(curseforge_export, mods, mod_size, configs, curseforge=True)
+    task_config = {"modpack_name": MODPACK_NAME, "mmc_instance": f"/instances/{MODPACK_NAME}", "instance_includes_list": INCLUDES, "normalize_cache": None}
+    targets = {
+        "load unpacked": lambda: time_load(module, module.BUILD_MODE_UNPACKED, prism_export, False),
+        "load streaming": lambda: time_load(module, module.BUILD_MODE_STREAMING, prism_export, False),
+        "load incremental rebuild": lambda: time_load(module, module.BUILD_MODE_INCREMENTAL, prism_export, True),
+        "task BuildMMCPackFromExport": lambda: time_task(tasks["BuildMMCPackFromExport"], task_config, {"mmc_instance_export_path": os.path.basename(mmc_export), "version": "1.0.1"}, ["prepare_mmc_profile"]),
+        "task BuildPackwizPackFromExport": lambda: time_task(tasks["BuildPackwizPackFromExport"], task_config, {"mmc_instance_export_path": os.path.basename(mmc_export), "version": "1.0.1"}, ["prepare_mmc_profile"]),
+        "task BuildCurseforgePackFromExport": lambda: time_task(tasks["BuildCurseforgePackFromExport"], task_config, {"curseforge_instance_export_path": os.path.basename(curseforge_export), "version": "1.0.1"}, ["prepare_curseforge_profile", "pack_curseforge"]),
+    }
+    results = {}
+    for target, measure in targets.items():
+        best = {}
+        for _ in range(runs):
+            for stage, seconds in measure().items():
+                best[stage] = min(best.get(stage, seconds), seconds)
+        results[target] = best
+        print(f"  {target:<36} {best['total']:8.3f}s")
+    return results
+
+
+# {"<scale> / <target> / <stage>": seconds}
+def flatten(timings):
+    return {f"{scale} / {target} / {stage}": seconds for scale, targets in timings.items() for target, stages in targets.items() for stage, seconds in stages.items()}
+
+
+def compare(results, baseline, threshold, min_seconds):
+    current = flatten(results["timings"])
+    previous = flatten(baseline["timings"])
+    regressions = []
+    print(f"\n{'stage':<90} {'baseline':>9} {'now':>9} {'change':>8}")
+    for key in sorted(current.keys() & previous.keys()):
+        before, now = previous[key], current[key]
+        change = (now - before) / before if before > 0 else 0.0
+        regressed = now > before * (1 + threshold) and now - before > min_seconds
+        if regressed or key.endswith("/ total"):
+            print(f"{key:<90} {before:8.3f}s {now:8.3f}s {change:+7.0%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(key)
+    missing = sorted(previous.keys() - current.keys())
+    if missing:
+        print(f"{len(missing)} stages of the baseline were not measured")
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline")
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    scales = [tuple(int(value) for value in scale.split("x")) for scale in args.scales.split(",")]
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "mod_size": args.mod_size,
+            "layout": args.layout,
+            "runs": args.runs,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "timings": {},
+    }
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        os.makedirs("exports")
+        os.makedirs("output")
+        with open("config.json", "w") as f:
+            json.dump({"modpack_name": MODPACK_NAME, "instance_includes_list": INCLUDES, "normalize_cache": None, "hash_cache": None, "modrinth_resolve": False}, f)
+        module = load_script_module()
+        from ModpackCreator.BuiltInTasks.BuildCurseforgePackFromExport import task as curseforge_task
+        from ModpackCreator.BuiltInTasks.BuildMMCPackFromExport import task as mmc_task
+        from ModpackCreator.BuiltInTasks.BuildPackwizPackFromExport import task as packwiz_task
+        tasks = {"BuildMMCPackFromExport": mmc_task, "BuildPackwizPackFromExport": packwiz_task, "BuildCurseforgePackFromExport": curseforge_task}
+        for mods, configs in scales:
+            scale = f"{mods} mods, {configs} configs"
+            print(scale)
+            results["timings"][scale] = run_scale(module, tasks, mods, configs, args.mod_size, args.layout, args.runs)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {output}")
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {baseline_path}")
+        return
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if any(baseline["meta"].get(key) != results["meta"][key] for key in ("mod_size", "layout", "cpus")):
+            print("The baseline was measured with another mod size, layout or CPU count: the comparison is only indicative")
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        print(f"{len(regressions)} regressions over {args.threshold:.0%}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Import-time budget of the modpack-creator CLI (ModpackCreator.run)
+
+Runs the CLI with python -X importtime for --version, --list-tasks and one task (-t), in a
+temporary pack directory with an empty tasks directory. For each command it sums the import
+time of the modules the bare interpreter doesn't import, keeps the best of --runs runs, and
+lists the slowest imports. The task modules imported are checked too: --version and
+--list-tasks import none, -t imports only its own task.
+
+All the commands share one budget: a task imports its zip and text modules when it runs, not
+when it is imported. The exit code is 1 when a command goes over the budget, or over its time
+in --baseline by more than --threshold (and --min-ms), or imports a task it doesn't run.
+--save-baseline writes the results to --baseline instead of comparing.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--budget-ms 100] [--task BuildMMCPackFromExport] [--top 10]
+           [--output startup.json] [--baseline startup-baseline.json] [--save-baseline]
+           [--threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+OLD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old")
+
+parser = argparse.ArgumentParser(description="Import-time budget of the modpack-creator CLI")
+parser.add_argument("--runs", type=int, default=5, help="Runs of each command, the best one is kept")
+parser.add_argument("--budget-ms", type=float, default=100.0, help="Import time allowed to each command, in milliseconds")
+parser.add_argument("--task", default="BuildMMCPackFromExport", help="Built-in task run by the -t command")
+parser.add_argument("--top", type=int, default=10, help="Slowest imports listed per command")
+parser.add_argument("--output", default=None, help="JSON file of the results")
+parser.add_argument("--baseline", default=None, help="JSON results to compare with")
+parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline instead of comparing")
+parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown over the baseline counted as a regression, 0.2 for 20%%")
+parser.add_argument("--min-ms", type=float, default=5.0, help="Slowdowns shorter than this are noise, not regressions")
+
+# import time:  self [us] | cumulative | imported package
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+TASK_MODULE = re.compile(r"^ModpackCreator\.BuiltInTasks\.([^.]+)\.task$|^tasks\.([^.]+)\.task$")
+
+
+# {module: self time in microseconds} of the imports of a command
+def import_times(arguments, cwd):
+    environment = dict(os.environ, PYTHONPATH=os.path.abspath(OLD_DIR))
+    process = subprocess.run([sys.executable, "-X", "importtime"] + arguments, cwd=cwd, env=environment, capture_output=True, text=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(1))
+    return times, process.returncode
+
+
+def imported_tasks(modules):
+    tasks = set()
+    for module in modules:
+        match = TASK_MODULE.match(module)
+        if match:
+            tasks.add(match.group(1) or match.group(2))
+    return tasks
+
+
+def measure(name, arguments, expected_tasks, interpreter_modules, cwd, runs, top):
+    best = None
+    for _ in range(runs):
+        times, returncode = import_times(arguments, cwd)
+        if returncode != 0:
+            raise Exception(f"{' '.join(arguments)} exited with {returncode}")
+        own = {module: us for module, us in times.items() if module not in interpreter_modules}
+        total_ms = sum(own.values()) / 1000
+        if best is None or total_ms < best["ms"]:
+            best = {"ms": total_ms, "modules": len(own), "slowest": sorted(own.items(), key=lambda item: item[1], reverse=True)[:top], "tasks": sorted(imported_tasks(own))}
+    unexpected = sorted(set(best["tasks"]) - set(expected_tasks))
+    print(f"{name}: {best['ms']:.1f} ms, {best['modules']} modules, tasks imported: {', '.join(best['tasks']) or 'none'}")
+    for module, us in best["slowest"]:
+        print(f"    {us / 1000:7.1f} ms  {module}")
+    return {"ms": round(best["ms"], 3), "modules": best["modules"], "tasks": best["tasks"], "unexpected_tasks": unexpected}
+
+
+# {command: result} of --version, --list-tasks and -t task, in a temporary pack directory
+def measure_commands(task, runs, top):
+    with tempfile.TemporaryDirectory() as pack_dir:
+        os.makedirs(os.path.join(pack_dir, "tasks"))
+        interpreter_modules = set(import_times(["-c", "pass"], pack_dir)[0])
+        # Without config the task stops at its first setup variable, after its import
+        commands = {
+            "version": (["-m", "ModpackCreator.run", "--version"], []),
+            "list-tasks": (["-m", "ModpackCreator.run", "--list-tasks"], []),
+            "task": (["-m", "ModpackCreator.run", "-t", task], [task]),
+        }
+        return {name: measure(name, arguments, expected, interpreter_modules, pack_dir, runs, top) for name, (arguments, expected) in commands.items()}
+
+
+# Commands over the budget or importing a task they don't run
+def budget_failures(results, budget_ms):
+    failures = []
+    for name, result in results.items():
+        if result["ms"] > budget_ms:
+            failures.append(f"{name}: {result['ms']:.1f} ms over the budget of {budget_ms:.1f} ms")
+        if result["unexpected_tasks"]:
+            failures.append(f"{name}: imports the tasks {', '.join(result['unexpected_tasks'])}")
+    return failures
+
+
+def main():
+    args = parser.parse_args()
+    results = measure_commands(args.task, args.runs, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+        return
+    failures = budget_failures(results, args.budget_ms)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, result in results.items():
+            before = baseline.get(name, {}).get("ms")
+            if before is not None and result["ms"] > before * (1 + args.threshold) and result["ms"] - before > args.min_ms:
+                failures.append(f"{name}: {result['ms']:.1f} ms, {before:.1f} ms in the baseline")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
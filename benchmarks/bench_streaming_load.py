@@ -0,0 +1,136 @@
+"""
+Compare the "unpacked" and "streaming" build modes of PrismInstance.load
+
+Generates a synthetic Prism export in a temporary workspace, builds the prepared
+export with both modes, checks that both outputs have the same content and prints
+the wall time and the bytes read/written by each mode.
+
+Usage: python benchmarks/bench_streaming_load.py [--mods 400] [--mod-size 2000000] [--configs 2000]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+PATH_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modpack-creator.py")
+
+parser = argparse.ArgumentParser(description="Benchmark of the PrismInstance.load build modes")
+parser.add_argument("--mods", type=int, default=400, help="Number of mods in the export")
+parser.add_argument("--mod-size", type=int, default=2_000_000, help="Size of each mod in bytes")
+parser.add_argument("--configs", type=int, default=2000, help="Number of config files in the export")
+parser.add_argument("--runs", type=int, default=1, help="Number of runs of each mode, the best run is kept")
+
+
+def generate_export(zip_path, mods, mod_size, configs):
+    rng = random.Random(0)
+    # Mix of line endings, like real configs edited on several platforms
+    endings = ["\n", "\r\n", "\r"]
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("instance.cfg", "InstanceType=OneSix\nname=Pack 1.0.0\n")
+        archive.writestr("mmc-pack.json", json.dumps({"formatVersion": 1, "components": [{"uid": "net.minecraft", "version": "1.20.1"}]}, indent=4))
+        for i in range(mods):
+            # Jars are already compressed: random bytes
+            archive.writestr(f"minecraft/mods/mod-{i}.jar", rng.randbytes(mod_size), zipfile.ZIP_STORED)
+        for i in range(configs):
+            ending = endings[i % len(endings)]
+            lines = [f"option_{j} = {rng.randint(0, 1000)}" for j in range(40)]
+            archive.writestr(f"minecraft/config/mod-{i % 50}/config-{i}.toml", ending.join(lines) + ending)
+        archive.writestr("minecraft/options.txt", "fov:0.0\nrenderDistance:12\n")
+        # Not included files
+        for i in range(200):
+            archive.writestr(f"minecraft/logs/log-{i}.log", "log line\n" * 500)
+        archive.writestr("minecraft/saves/world/level.dat", rng.randbytes(100_000))
+
+
+def read_io_counters():
+    # Linux only: bytes read/written through syscalls and bytes really sent to the disk
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return {key: int(value) for key, value in counters.items()}
+    except OSError:
+        return None
+
+
+def load_script_module():
+    spec = importlib.util.spec_from_file_location("modpack_creator", PATH_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_zip_content(zip_path):
+    with zipfile.ZipFile(zip_path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def run_mode(module, build_mode, zip_path):
+    module.BUILD_MODE = build_mode
+    io_before = read_io_counters()
+    start = time.perf_counter()
+    module.PrismInstance(zip_path)
+    wall_time = time.perf_counter() - start
+    io_after = read_io_counters()
+    io = None
+    if io_before is not None and io_after is not None:
+        io = {key: io_after[key] - io_before[key] for key in ("rchar", "wchar", "read_bytes", "write_bytes")}
+    return wall_time, io
+
+
+def format_bytes(value):
+    if value is None:
+        return "n/a"
+    return f"{value / 1024 / 1024:.1f} MB"
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        os.makedirs("exports")
+        with open("config.json", "w") as f:
+            json.dump({"modpack_name": "Benchmark", "instance_includes_list": ["config", "mods", "options.txt"]}, f)
+        zip_path = "exports/Benchmark-1.0.0.zip"
+        print(f"Generating export: {args.mods} mods of {args.mod_size} bytes, {args.configs} configs")
+        generate_export(zip_path, args.mods, args.mod_size, args.configs)
+        print(f"Export size: {format_bytes(os.path.getsize(zip_path))}")
+        # The script prints a line per file, keep only the results
+        module = load_script_module()
+        results = {}
+        outputs = {}
+        for build_mode in (module.BUILD_MODE_UNPACKED, module.BUILD_MODE_STREAMING):
+            best = None
+            for _ in range(args.runs):
+                stdout = sys.stdout
+                sys.stdout = open(os.devnull, "w")
+                try:
+                    result = run_mode(module, build_mode, zip_path)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                if best is None or result[0] < best[0]:
+                    best = result
+            results[build_mode] = best
+            outputs[build_mode] = read_zip_content(module.PATH_PRISM_PREPARED_EXPORT)
+
+    same_output = outputs[module.BUILD_MODE_UNPACKED] == outputs[module.BUILD_MODE_STREAMING]
+    print(f"Same prepared export content: {same_output}")
+    print(f"{'mode':<12}{'wall time':>12}{'read':>14}{'written':>14}{'disk read':>14}{'disk written':>14}")
+    for build_mode, (wall_time, io) in results.items():
+        io = io or {}
+        print(f"{build_mode:<12}{wall_time:>11.2f}s{format_bytes(io.get('rchar')):>14}{format_bytes(io.get('wchar')):>14}{format_bytes(io.get('read_bytes')):>14}{format_bytes(io.get('write_bytes')):>14}")
+    unpacked_time = results[module.BUILD_MODE_UNPACKED][0]
+    streaming_time = results[module.BUILD_MODE_STREAMING][0]
+    print(f"Speedup: {unpacked_time / streaming_time:.2f}x")
+    if not same_output:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare two Modrinth packs, typically one written by mmc-export and one by the native writer
+
+Checks the dependencies, the downloadable files of modrinth.index.json (path, hashes, size,
+env, downloads) and the content of overrides/. Prints every difference, exits with 1 if any.
+
+Usage: python benchmarks/compare_mrpack.py output/Pack-1.0.0.mrpack native/Pack-1.0.0.mrpack [--ignore-env] [--ignore-downloads]
+"""
+
+import argparse
+import json
+import sys
+import zipfile
+
+parser = argparse.ArgumentParser(description="Compare two .mrpack files")
+parser.add_argument("reference", help="Reference pack, from mmc-export")
+parser.add_argument("candidate", help="Pack to check")
+parser.add_argument("--ignore-env", action="store_true", help="Don't compare the env of the files")
+parser.add_argument("--ignore-downloads", action="store_true", help="Don't compare the download URLs")
+
+
+def read_pack(path, args):
+    with zipfile.ZipFile(path) as archive:
+        index = json.loads(archive.read("modrinth.index.json"))
+        overrides = {info.filename: info.CRC for info in archive.infolist() if info.filename.startswith(("overrides/", "client-overrides/", "server-overrides/")) and not info.is_dir()}
+    files = {}
+    for file in index.get("files", []):
+        entry = {"hashes": {key: file["hashes"].get(key) for key in ("sha1", "sha512")}, "fileSize": file.get("fileSize")}
+        if not args.ignore_env:
+            entry["env"] = file.get("env")
+        if not args.ignore_downloads:
+            entry["downloads"] = sorted(file.get("downloads", []))
+        files[file["path"]] = entry
+    return index.get("dependencies", {}), files, overrides
+
+
+def compare_dicts(kind, reference, candidate):
+    differences = []
+    for key in sorted(set(reference) | set(candidate)):
+        if key not in candidate:
+            differences.append(f"{kind} missing: {key}")
+        elif key not in reference:
+            differences.append(f"{kind} extra: {key}")
+        elif reference[key] != candidate[key]:
+            differences.append(f"{kind} differs: {key}: {reference[key]} != {candidate[key]}")
+    return differences
+
+
+def main():
+    args = parser.parse_args()
+    reference = read_pack(args.reference, args)
+    candidate = read_pack(args.candidate, args)
+    differences = []
+    for kind, reference_part, candidate_part in zip(("dependency", "file", "override"), reference, candidate):
+        differences += compare_dicts(kind, reference_part, candidate_part)
+    for difference in differences:
+        print(difference)
+    print(f"{len(reference[1])} files and {len(reference[2])} overrides compared, {len(differences)} differences")
+    if differences:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
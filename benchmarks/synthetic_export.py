@@ -0,0 +1,129 @@
+"""
+Generator of synthetic instance exports, for the benchmarks
+
+Writes a Prism/MultiMC export (instance.cfg, mmc-pack.json and a minecraft or .minecraft
+folder, at the root like the exports read by modpack-creator.py or in an instance folder like
+the ones of the old MultiMC tasks) or a CurseForge export (manifest.json and an overrides
+folder). Mods are jars with a fabric.mod.json and incompressible classes, their sizes spread
+around --mod-size. Configs have several formats and a mix of LF, CRLF and CR line endings,
+some of them mixed in one file. Logs and a world are added too, to be left out by the
+include list. The same arguments and seed give the same bytes.
+
+Usage: python benchmarks/synthetic_export.py exports/Pack-1.0.0.zip [--mods 400] [--mod-size 200000] [--configs 2000]
+           [--layout minecraft|.minecraft] [--instance-dir NAME] [--curseforge]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import zipfile
+
+parser = argparse.ArgumentParser(description="Generator of synthetic instance exports")
+parser.add_argument("output", help="Path of the export .zip")
+parser.add_argument("--mods", type=int, default=400, help="Number of mods")
+parser.add_argument("--mod-size", type=int, default=200_000, help="Median size of a mod in bytes")
+parser.add_argument("--configs", type=int, default=2000, help="Number of config files")
+parser.add_argument("--layout", choices=("minecraft", ".minecraft"), default="minecraft", help="Name of the minecraft folder")
+parser.add_argument("--instance-dir", default=None, help="Instance folder the files are in, like the exports of the old MultiMC tasks")
+parser.add_argument("--curseforge", action="store_true", help="CurseForge export: manifest.json and overrides")
+parser.add_argument("--version", default="1.0.0", help="Version of the pack in instance.cfg and manifest.json")
+parser.add_argument("--seed", type=int, default=0, help="Seed of the generated content")
+
+MINECRAFT_VERSION = "1.20.1"
+FABRIC_LOADER_VERSION = "0.14.22"
+CONFIG_EXTENSIONS = [".toml", ".json", ".cfg", ".properties", ".txt", ".json5"]
+# LF, CRLF and CR files, and files with every ending in them
+ENDINGS = ["\n", "\r\n", "\r", None]
+
+
+def mod_sizes(rng, mods, mod_size):
+    # Log-normal spread: many small libraries, a few big content mods
+    return [max(int(rng.lognormvariate(0, 0.8) * mod_size), 1_000) for _ in range(mods)]
+
+
+def make_jar(rng, mod_id, size):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as jar:
+        jar.writestr("fabric.mod.json", json.dumps({"schemaVersion": 1, "id": mod_id, "version": "1.0.0", "name": mod_id.replace("_", " ").title()}, indent=2))
+        jar.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\r\n\r\n")
+        # Compiled classes barely compress: random bytes
+        jar.writestr(f"{mod_id}/Main.class", rng.randbytes(size), zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+def config_content(rng, number):
+    extension = CONFIG_EXTENSIONS[number % len(CONFIG_EXTENSIONS)]
+    if extension in (".json", ".json5"):
+        lines = ["{"] + [f'    "option_{j}": {rng.randint(0, 1000)},' for j in range(rng.randint(5, 80))] + ['    "enabled": true', "}"]
+    elif extension == ".toml":
+        lines = ["[general]"] + [f"option_{j} = {rng.randint(0, 1000)}" for j in range(rng.randint(5, 80))]
+    else:
+        lines = ["# Generated config", ""] + [f"option_{j}={rng.random():.6f}" for j in range(rng.randint(5, 80))]
+    ending = ENDINGS[number % len(ENDINGS)]
+    if ending is None:
+        return extension, "".join(line + rng.choice(ENDINGS[:3]) for line in lines)
+    return extension, ending.join(lines) + ending
+
+
+def instance_files(rng, mods, mod_size, configs, version):
+    # (path under the minecraft folder, content, compression)
+    files = []
+    for number, size in enumerate(mod_sizes(rng, mods, mod_size)):
+        mod_id = f"mod_{number:04d}"
+        files.append((f"mods/{mod_id.replace('_', '-')}-fabric-{version}.jar", make_jar(rng, mod_id, size), zipfile.ZIP_STORED))
+    for number in range(configs):
+        extension, content = config_content(rng, number)
+        # Most mods have a config folder, some keep a single file at the root of config
+        directory = f"config/mod-{number % max(mods, 1):04d}/" if number % 7 else "config/"
+        files.append((f"{directory}config-{number}{extension}", content.encode(), zipfile.ZIP_DEFLATED))
+    files.append(("options.txt", "version:3465\r\nfov:0.0\r\nrenderDistance:12\r\n".encode(), zipfile.ZIP_DEFLATED))
+    # Not included files
+    for number in range(50):
+        files.append((f"logs/log-{number}.log", ("[12:00:00] [main/INFO]: log line\n" * 400).encode(), zipfile.ZIP_DEFLATED))
+    files.append(("saves/world/level.dat", rng.randbytes(100_000), zipfile.ZIP_STORED))
+    return files
+
+
+def write_synthetic_export(zip_path, mods=400, mod_size=200_000, configs=2000, layout="minecraft", instance_dir=None, curseforge=False, version="1.0.0", seed=0):
+    rng = random.Random(seed)
+    files = instance_files(rng, mods, mod_size, configs, version)
+    prefix = instance_dir + "/" if instance_dir else ""
+    os.makedirs(os.path.dirname(zip_path) or ".", exist_ok=True)
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        if curseforge:
+            manifest = {
+                "minecraft": {"version": MINECRAFT_VERSION, "modLoaders": [{"id": f"fabric-{FABRIC_LOADER_VERSION}", "primary": True}]},
+                "manifestType": "minecraftModpack",
+                "manifestVersion": 1,
+                "name": "Synthetic",
+                "version": version,
+                "author": "benchmarks",
+                # Mods are downloaded by the launcher: only the references are in the export
+                "files": [{"projectID": 100_000 + number, "fileID": 4_000_000 + number, "required": True} for number in range(mods)],
+                "overrides": "overrides",
+            }
+            archive.writestr(prefix + "manifest.json", json.dumps(manifest, indent=2))
+            archive.writestr(prefix + "modlist.html", "<ul>\n" + "".join(f"<li>mod {number}</li>\n" for number in range(mods)) + "</ul>\n")
+            for path, content, compression in files:
+                if not path.startswith("mods/"):
+                    archive.writestr(f"{prefix}overrides/{path}", content, compression)
+            return
+        archive.writestr(prefix + "instance.cfg", f"InstanceType=OneSix\niconKey=default\nname=Synthetic {version}\nnotes=\n")
+        archive.writestr(prefix + "mmc-pack.json", json.dumps({"formatVersion": 1, "components": [
+            {"uid": "net.minecraft", "version": MINECRAFT_VERSION, "important": True},
+            {"uid": "net.fabricmc.fabric-loader", "version": FABRIC_LOADER_VERSION},
+        ]}, indent=4))
+        for path, content, compression in files:
+            archive.writestr(f"{prefix}{layout}/{path}", content, compression)
+
+
+def main():
+    args = parser.parse_args()
+    write_synthetic_export(args.output, args.mods, args.mod_size, args.configs, args.layout, args.instance_dir, args.curseforge, args.version, args.seed)
+    print(f"Wrote {args.output}: {os.path.getsize(args.output) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,31 @@ import zipfile
 import json
 import re
 import pathlib
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+# Modules shared with the ModpackCreator package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "old"))
+from ModpackCreator.Zip.ZipIndex import get_zip_index
+from ModpackCreator.Zip.ZipPatcher import ZipPatcher
+from ModpackCreator.Zip.ParallelZipWriter import ParallelZipWriter, make_archive
+from ModpackCreator.Zip.CompressionPolicy import load_policy
+from ModpackCreator.Zip.IncrementalStaging import IncrementalStaging, forget_staging
+from ModpackCreator.Text.Normalizer import MODE_CRLF_JOIN_LINES, SNIFF_SIZE, NormalizingReader, may_normalize, normalize_paths, normalize_tree, should_normalize
+from ModpackCreator.Text.NormalizationCache import load_cache
+from ModpackCreator.Process.ConcurrentCommands import run_concurrently
+from ModpackCreator.Modrinth.MrpackWriter import MrpackWriter
+from ModpackCreator.Hashing.HashCache import load_hash_cache
+from ModpackCreator.Resolver.Resolver import load_resolver
+from ModpackCreator.Resolver.ResolutionLock import ResolutionLock, lock_path
+from ModpackCreator.Packwiz.PackwizWriter import PackwizWriter, find_previous_version_dir
+from ModpackCreator.Tracing.BuildTracer import finish_tracing, start_tracing, trace_count, trace_stage, traced
+from ModpackCreator.Logging.BuildLog import LEVELS, configure_logging, count, finish_logging, log, log_stage_summary
+from ModpackCreator.Batch.BatchBuild import run_batch
+from ModpackCreator.Watch.ExportWatcher import ExportWatcher
+from ModpackCreator.Daemon.BuildDaemon import DEFAULT_HOST, DEFAULT_PORT, BuildDaemon
 
 """ CONFIG """
 
@@ -24,6 +49,86 @@ PATH_EXPORTS = "exports"
 PATH_PRISM_PREPARED_EXPORT = "temp/mmc_prepared_export.zip"
 PATH_UNPACKED_PRISM_BEFORE_INCLUDE = "temp/temp_mmc_export_before_includes"
 PATH_UNPACKED_PRISM_AFTER_INCLUDE = "temp/temp_mmc_export_after_includes"
+PATH_STAGING_MANIFEST = "temp/staging_manifest.json"
+PATH_MODRINTH_OUTPUT = "output"
+
+# Build modes
+# "streaming" reads the export entry by entry and writes the prepared export directly
+# "unpacked" unpacks the export in temp directories and re-zips them
+# "incremental" keeps the "after include" directory between builds and only extracts the entries that changed
+BUILD_MODE_STREAMING = "streaming"
+BUILD_MODE_UNPACKED = "unpacked"
+BUILD_MODE_INCREMENTAL = "incremental"
+BUILD_MODE = CONFIG.get("build_mode", BUILD_MODE_STREAMING)
+
+# Threads compressing the zips, all the cores by default
+ZIP_WORKERS = CONFIG.get("zip_workers", os.cpu_count())
+
+# Processes normalizing the end of lines, all the cores by default
+NORMALIZE_WORKERS = CONFIG.get("normalize_workers", os.cpu_count())
+# Also normalize the files with an unknown extension if their content looks like text
+NORMALIZE_SNIFF_UNKNOWN = CONFIG.get("normalize_sniff_unknown", False)
+# "crlf_join_lines" (default) joins the lines with CRLF and drops the final line break, like the old builds,
+# "crlf" keeps it
+NORMALIZE_MODE = CONFIG.get("normalize_mode", MODE_CRLF_JOIN_LINES)
+# The normalized files are cached in "normalize_cache" (temp/normalize_cache by default, null to disable),
+# up to "normalize_cache_size_mb" (256 by default)
+
+# Run the Modrinth and packwiz exports at the same time
+PARALLEL_EXPORTS = CONFIG.get("parallel_exports", True)
+
+# Logging: "log_level" (info) or --log-level debug|info|warning|error, debug adds a line per copied or deleted file.
+# The other levels only log a summary per stage. "log_json": a path to also append every line as a JSON event.
+
+# Batch builds: --batch builds several exports, or globs over the exports directory, in "batch_workers" processes
+# (all the cores by default, or --workers). Each worker builds in its own workspace in temp/batch, the hash cache,
+# project index and lockfile are shared.
+
+# Watch mode: --watch builds the zips written in the exports directory once they kept the same size for
+# "watch_settle_seconds" (2) and their central directory can be read, one at a time, with the hash cache and the
+# lookups kept warm between builds. inotify on Linux, a scan every "watch_poll_interval" (1) seconds elsewhere.
+WATCH_SETTLE_SECONDS = CONFIG.get("watch_settle_seconds", 2.0)
+WATCH_POLL_INTERVAL = CONFIG.get("watch_poll_interval", 1.0)
+
+# Daemon mode: --daemon serves builds over a local HTTP/JSON API on "daemon_host" (127.0.0.1) and "daemon_port"
+# (8765) or --port: submit an export, poll its status, stream its log, cancel it, read the queue metrics.
+# "daemon_max_builds" (1) or --workers builds run at the same time, each in a resident worker of temp/daemon that
+# keeps its hash cache, lookups and connections warm. "daemon_token": requests need "Authorization: Bearer <token>".
+DAEMON_HOST = CONFIG.get("daemon_host", DEFAULT_HOST)
+DAEMON_PORT = CONFIG.get("daemon_port", DEFAULT_PORT)
+DAEMON_MAX_BUILDS = CONFIG.get("daemon_max_builds", 1)
+DAEMON_TOKEN = CONFIG.get("daemon_token")
+
+# Tracing of the build stages, "trace" (false) or --trace: a Chrome trace in "trace_dir" (temp/traces) and a
+# summary table. "trace_tracemalloc": n also lists the n top allocations of each stage.
+
+# Modrinth pack backends
+# "mmc-export" runs MMC_EXPORT_TO_MODRINTH_COMMAND
+# "native" writes the .mrpack in process, the mods are looked up by hash unless "modrinth_resolve" is false.
+# "modrinth_env" sets the env of files: {"file name pattern": {"server": "unsupported"}}
+MODRINTH_BACKEND_MMC_EXPORT = "mmc-export"
+MODRINTH_BACKEND_NATIVE = "native"
+MODRINTH_BACKEND = CONFIG.get("modrinth_backend", MODRINTH_BACKEND_MMC_EXPORT)
+# Lookups of the native backends, with bulk requests on a pooled session:
+# "resolve_providers" (["modrinth"] by default, "curseforge" needs "curseforge_api_key" or CURSEFORGE_API_KEY),
+# "resolve_connections" (4), "resolve_retries" (4), "modrinth_api_url" and "curseforge_api_url" (a stand-in server)
+# The answers are kept in resolution-lock.json, next to config.json, unless "resolution_lock" is false: only the jars
+# it doesn't know are looked up. --refresh-lock looks every jar up again. The lockfile is read with the resolver, when a
+# native writer first looks a jar up, and written at the end of the build: a build that doesn't look up leaves it as is.
+# Jars not found by hash are matched by mod id and file name in a local project index, "project_index"
+# (temp/project_index.bin), rebuilt from the JSON lines of "project_index_dump" when it is newer; "loose_matching"
+# false disables it, "loose_network_search" true searches Modrinth for the names the index doesn't know.
+RESOLUTION_LOCK = CONFIG.get("resolution_lock", True)
+PATH_RESOLUTION_LOCK = lock_path(PATH_CONFIG)
+
+# Packwiz backends
+# "mmc-export" runs MMC_EXPORT_TO_PACKWIZ_COMMAND
+# "native" writes Packwiz/<version> in process, with the same lookup and "modrinth_env" as the native Modrinth backend.
+# Unchanged files are not rewritten, files of the previous version are copied instead of extracted.
+PACKWIZ_BACKEND_MMC_EXPORT = "mmc-export"
+PACKWIZ_BACKEND_NATIVE = "native"
+PACKWIZ_BACKEND = CONFIG.get("packwiz_backend", PACKWIZ_BACKEND_MMC_EXPORT)
+PATH_PACKWIZ_OUTPUT = "Packwiz"
 
 # mmc-export
 MMC_EXPORT_PROGRAM = "mmc-export"
@@ -50,88 +155,137 @@ def is_existing_zip(zip_path):
 def remove_dir(path, description):
     if os.path.isdir(path):
         shutil.rmtree(path)
-        print("Deleted " + description)
+        count("remove", "directories")
+        log.debug("Deleted " + description)
     else:
-        print("Skipped " + description + " deletion, didn't exist")
+        log.debug("Skipped " + description + " deletion, didn't exist")
 
 def remove_file(path, description):
     if os.path.isfile(path):
         os.remove(path)
-        print("Deleted " + description)
+        count("remove", "files")
+        log.debug("Deleted " + description)
     else:
-        print("Skipped " + description + " deletion, didn't exist")
+        log.debug("Skipped " + description + " deletion, didn't exist")
+
+def counted_copy(from_path, to_path):
+    # One line per copied file at debug level only, the files and bytes are summed in the "copy" stage
+    shutil.copy2(from_path, to_path)
+    count("copy", "files")
+    count("copy", "bytes", os.path.getsize(to_path))
+    log.debug("Copied %s", to_path)
 
 def copy_dir(from_path, to_path, from_desc, to_desc):
     if os.path.isdir(from_path):
-        ret = shutil.copytree(from_path, to_path, dirs_exist_ok=True)
-        print("Copied " + from_desc + " to " + to_desc)
+        shutil.copytree(from_path, to_path, dirs_exist_ok=True, copy_function=counted_copy)
+        log.debug("Copied " + from_desc + " to " + to_desc)
     else:
-        print("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
+        log.debug("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
 
 def copy_file(from_path, to_path, from_desc, to_desc):
     # Create the directory if it doesn't exist
     if not os.path.exists(os.path.dirname(to_path)):
         os.makedirs(os.path.dirname(to_path))
     if os.path.isfile(from_path):
-        shutil.copy2(from_path, to_path)
-        print("Copied " + from_desc + " to " + to_desc)
+        counted_copy(from_path, to_path)
+        log.debug("Copied " + from_desc + " to " + to_desc)
     else:
-        print("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
+        log.debug("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
 
 def zip_contains_file(zip_path, file_name):
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        if file_name in zip_ref.namelist():
-            print(file_name + " in " + zip_path + " found !")
-            return True
-    print("No " + file_name + " in " + zip_path)
+    if get_zip_index(zip_path).contains_file(file_name):
+        log.debug(file_name + " in " + zip_path + " found !")
+        return True
+    log.debug("No " + file_name + " in " + zip_path)
+    return False
 
 def zip_contains_dir(zip_path, dir_name):
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        for name in zip_ref.namelist():
-            if name.startswith(dir_name):
-                print(dir_name + " in " + zip_path + " found !")
-                return True
-    print("No " + dir_name + " in " + zip_path)
+    if get_zip_index(zip_path).contains_dir(dir_name):
+        log.debug(dir_name + " in " + zip_path + " found !")
+        return True
+    log.debug("No " + dir_name + " in " + zip_path)
     return False
 
-def copy_to_zip(from_path, to_path, archive_path):
-
-    files = []
-
-    with zipfile.ZipFile(archive_path) as archive:
-        for zipinfo in archive.infolist():
-            if zipinfo.filename != to_path:
-                files.append((zipinfo.filename, archive.read(zipinfo.filename)))
-
-    with zipfile.ZipFile(archive_path, "w") as archive:
-        for filename, content in files:
-            archive.writestr(filename, content)
-        archive.write(from_path, to_path)
+def copy_to_zip(from_path, to_path, archive_path, policy=None):
+    # Only the copied file is compressed, the other entries are copied as they are
+    patcher = ZipPatcher(archive_path, policy)
+    patcher.put_file(to_path, from_path)
+    patcher.apply()
 
 def copy_from_zip(from_path, to_path, archive_path):
     with zipfile.ZipFile(archive_path) as archive:
         with open(to_path, "wb") as file:
             file.write(archive.read(from_path))
 
+""" STREAMING UTILS """
+
+def is_included_entry(entry_name, minecraft_dir, include_list):
+    # Everything outside of the minecraft folders is kept
+    root_name = entry_name.split("/", 1)[0]
+    if root_name != ".minecraft" and root_name != "minecraft":
+        return True
+    # The other minecraft folder is never kept
+    if root_name != minecraft_dir:
+        return False
+    # Keep only the included files and directories of the minecraft folder
+    relative_name = entry_name[len(minecraft_dir) + 1:]
+    for include in include_list:
+        include = include.strip("/")
+        if relative_name == include or relative_name.startswith(include + "/"):
+            return True
+    return False
+
+def stream_zip_entry(from_archive, to_archive, zipinfo):
+    # Large entries are copied by chunks, they are never fully loaded in memory
+    with from_archive.open(zipinfo) as from_file:
+        to_archive.add_stream(zipinfo.filename, from_file, zipinfo.file_size, zipinfo.date_time, zipinfo.external_attr)
+
+def is_txt_zip_entry(archive, zipinfo):
+    # Same choice as for the files of an unpacked export: extension, then content sniffing
+    if not may_normalize(zipinfo.filename, sniff_unknown=NORMALIZE_SNIFF_UNKNOWN):
+        return False
+    with archive.open(zipinfo) as file:
+        return should_normalize(zipinfo.filename, file.read(SNIFF_SIZE), sniff_unknown=NORMALIZE_SNIFF_UNKNOWN)
+
+def stream_normalized_zip_entry(from_archive, to_archive, zipinfo):
+    # Normalized by chunks, the size can at most double
+    with from_archive.open(zipinfo) as from_file:
+        to_archive.add_stream(zipinfo.filename, NormalizingReader(from_file, NORMALIZE_MODE), zipinfo.file_size * 2, zipinfo.date_time, zipinfo.external_attr)
+
 """ PACK MAKER """
 
 # Prism instance
 
 class PrismInstance:
 
-    def __init__(self, zip_path):
+    def __init__(self, zip_path, refresh_lock=False, resident=None, cancel=None):
         # Verify that the .zip exists
         if not is_existing_zip(zip_path):
             raise Exception(f"The Prism instance zip file '{zip_path}' doesn't exist")
         # Zip path
         self.zip_path = zip_path
+        # Hash cache and lookups kept by a long-running process, None for a single build
+        self.resident = resident
+        # Event set to stop the build at the next stage, from the daemon
+        self.cancel = cancel
+        # Lookups shared by the native writers: the second one finds its answers in it. Opened by the first writer
+        # that asks for it, with the lockfile: a build with the mmc-export backends opens neither.
+        self.refresh_lock = refresh_lock
+        self.resolver = None
+        self.resolver_opened = False
+        self.resolver_lock = Lock()
         # Load
         self.load()
 
-    def create_temp_directory():
+    def check_cancelled(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise Exception("Build cancelled")
+
+    def create_temp_directory(self):
         if not os.path.exists("temp"):
             os.makedirs("temp")
 
+    @traced()
     def verify_zip_validity(self):
         # Verify that the .zip contains a minecraft or .minecraft folder
         if not zip_contains_dir(self.zip_path, "minecraft") and not zip_contains_dir(self.zip_path, ".minecraft"):
@@ -147,19 +301,24 @@ class PrismInstance:
         if self.version is None:
             raise Exception("The Prism instance zip file name doesn't contain a valid version")
 
+    @traced()
     def remove_old_prepared_export(self):
         # Remove old prepared export
         if os.path.isfile(PATH_PRISM_PREPARED_EXPORT):
             os.remove(PATH_PRISM_PREPARED_EXPORT)
 
+    @traced()
     def create_new_prepared_export(self):
         # Create new prepared export
         copy_file(self.zip_path, PATH_PRISM_PREPARED_EXPORT, "raw prism instance", "prepared export")
 
+    @traced()
     def remove_not_included_files(self):
         # Keep only the included files
         # List of files to keep
         include_list = CONFIG["instance_includes_list"]
+        # The incremental staging can't be trusted anymore
+        forget_staging(PATH_STAGING_MANIFEST)
         # If the directory already exists, delete it
         if os.path.isdir(PATH_UNPACKED_PRISM_BEFORE_INCLUDE):
             remove_dir(PATH_UNPACKED_PRISM_BEFORE_INCLUDE, "old \"before include\" directory")
@@ -180,48 +339,221 @@ class PrismInstance:
                 copy_file(PATH_UNPACKED_PRISM_BEFORE_INCLUDE + "/" + self.minecraft_dir + "/" + file, PATH_UNPACKED_PRISM_AFTER_INCLUDE + "/" + self.minecraft_dir + "/" + file, file, "prepared profile")
             if os.path.isdir(PATH_UNPACKED_PRISM_BEFORE_INCLUDE + "/" + self.minecraft_dir + "/" + file):
                 copy_dir(PATH_UNPACKED_PRISM_BEFORE_INCLUDE + "/" + self.minecraft_dir + "/" + file, PATH_UNPACKED_PRISM_AFTER_INCLUDE + "/" + self.minecraft_dir + "/" + file, file, "prepared profile")
+        log_stage_summary("copy")
 
+    @traced()
     def normalize_file_ending(self):
         # Normalize all end of lines with CRLF
-        print("Normalizing all end of lines with CRLF")
-        for root, dirs, files in os.walk(PATH_UNPACKED_PRISM_AFTER_INCLUDE):
-            for file in files:
-                list_of_txt_extensions = [".txt", ".json", ".toml", ".cfg", ".properties", ".lang", ".mcmeta", ".log", ".md", ".yml", ".yaml", ".json5"]
-                if os.path.splitext(file)[1] in list_of_txt_extensions:
-                    print("Normalizing " + file)
-                    file_path = os.path.join(root, file)
-                    with open(file_path, "r+") as f:
-                        content = f.read()
-                        content = "\r\n".join(content.splitlines())
-                        f.seek(0)
-                        f.truncate()
-                        f.write(content)
-
-
+        log.info("Normalizing all end of lines with CRLF")
+        # Files unchanged since a previous build are taken from the cache
+        cache = load_cache(CONFIG)
+        stats = normalize_tree(PATH_UNPACKED_PRISM_AFTER_INCLUDE, workers=NORMALIZE_WORKERS, mode=NORMALIZE_MODE, sniff_unknown=NORMALIZE_SNIFF_UNKNOWN, cache=cache)
+        log.info(stats.summary(), extra={"fields": {"stage": "normalize", "files": stats.files, "bytes": stats.size}})
+        trace_count("files", stats.files)
+        if cache is not None:
+            log.info(cache.summary())
+
+    @traced()
+    def restage_included_files(self):
+        # Update the "after include" directory of the previous build: only the entries that changed are extracted and normalized
+        log.info("Restaging included files")
+        include_list = CONFIG["instance_includes_list"]
+        settings = {"minecraft_dir": self.minecraft_dir, "normalize_mode": NORMALIZE_MODE, "normalize_sniff_unknown": NORMALIZE_SNIFF_UNKNOWN}
+        staging = IncrementalStaging(PATH_UNPACKED_PRISM_AFTER_INCLUDE, PATH_STAGING_MANIFEST, settings)
+        extracted_paths = staging.update(self.zip_path, lambda entry_name: is_included_entry(entry_name, self.minecraft_dir, include_list))
+        log.info(staging.stats.summary())
+        trace_count("files", staging.stats.extracted)
+        # Normalize the extracted files
+        log.info("Normalizing end of lines of the extracted files with CRLF")
+        cache = load_cache(CONFIG)
+        stats = normalize_paths(extracted_paths, workers=NORMALIZE_WORKERS, mode=NORMALIZE_MODE, sniff_unknown=NORMALIZE_SNIFF_UNKNOWN, cache=cache)
+        log.info(stats.summary(), extra={"fields": {"stage": "normalize", "files": stats.files, "bytes": stats.size}})
+        if cache is not None:
+            log.info(cache.summary())
+        # The directory is complete
+        staging.commit()
+
+    @traced()
+    def stream_prepared_export(self):
+        # Build the prepared export in one pass over the raw export, nothing is unpacked to disk
+        log.info("Streaming raw prism instance to prepared export")
+        include_list = CONFIG["instance_includes_list"]
+        policy = load_policy(CONFIG, "prepared_export")
+        # Directories already written in the prepared export
+        written_dirs = set()
+        streamed_files = 0
+        streamed_bytes = 0
+        normalized_files = 0
+        with zipfile.ZipFile(self.zip_path) as from_archive, ParallelZipWriter(PATH_PRISM_PREPARED_EXPORT, ZIP_WORKERS, policy) as to_archive:
+            for zipinfo in from_archive.infolist():
+                # Skip not included entries
+                if not is_included_entry(zipinfo.filename, self.minecraft_dir, include_list):
+                    continue
+                # Write the parent directories first, with the same attributes as shutil.make_archive
+                parts = zipinfo.filename.rstrip("/").split("/")
+                dirs_count = len(parts) if zipinfo.is_dir() else len(parts) - 1
+                for i in range(1, dirs_count + 1):
+                    dir_name = "/".join(parts[:i])
+                    if dir_name not in written_dirs:
+                        written_dirs.add(dir_name)
+                        to_archive.add_dir(dir_name, zipinfo.date_time)
+                if zipinfo.is_dir():
+                    continue
+                # Normalize text files, copy the others as they are
+                if is_txt_zip_entry(from_archive, zipinfo):
+                    stream_normalized_zip_entry(from_archive, to_archive, zipinfo)
+                    normalized_files += 1
+                else:
+                    stream_zip_entry(from_archive, to_archive, zipinfo)
+                streamed_files += 1
+                streamed_bytes += zipinfo.file_size
+        trace_count("files", streamed_files)
+        count("stream", "files", streamed_files)
+        count("stream", "bytes", streamed_bytes)
+        count("stream", "normalized", normalized_files)
+        log_stage_summary("stream")
+        log.info(policy.report())
+
+    @traced()
     def load(self):
         # Verify zip validity
         self.verify_zip_validity()
         # Remove old prepared export
         self.remove_old_prepared_export()
-        # Create new prepared export
-        self.create_new_prepared_export()
-        # Remove not included files
-        self.remove_not_included_files()
-        # Normalize files
-        self.normalize_file_ending()
+        self.check_cancelled()
+        # Streaming build: one pass from the raw export to the prepared export
+        if BUILD_MODE == BUILD_MODE_STREAMING:
+            self.create_temp_directory()
+            self.stream_prepared_export()
+            return
+        # Incremental build: update the directory of the previous build
+        if BUILD_MODE == BUILD_MODE_INCREMENTAL:
+            self.create_temp_directory()
+            self.restage_included_files()
+        else:
+            # Create new prepared export
+            self.create_new_prepared_export()
+            # Remove not included files
+            self.remove_not_included_files()
+            self.check_cancelled()
+            # Normalize files
+            self.normalize_file_ending()
+        self.check_cancelled()
         # Finalize prepared pack
-        shutil.make_archive(PATH_PRISM_PREPARED_EXPORT.split(".")[0], "zip", PATH_UNPACKED_PRISM_AFTER_INCLUDE)
+        policy = load_policy(CONFIG, "prepared_export")
+        with trace_stage("make_archive"):
+            make_archive(PATH_PRISM_PREPARED_EXPORT.split(".")[0], PATH_UNPACKED_PRISM_AFTER_INCLUDE, ZIP_WORKERS, policy)
+        log.info(policy.report())
 
-    def pack_modrinth(self):
-        cmd = MMC_EXPORT_TO_MODRINTH_COMMAND.format(self.get_version(), self.get_version())
-        print(cmd)
-        os.system(cmd)
+    def get_modrinth_command(self):
+        return shlex.split(MMC_EXPORT_TO_MODRINTH_COMMAND.format(self.get_version(), self.get_version()))
 
-    def pack_packwiz(self):
-        cmd = MMC_EXPORT_TO_PACKWIZ_COMMAND.format(self.get_version(), self.get_version())
-        print(cmd)
-        os.system(cmd)
+    def get_packwiz_command(self):
+        return shlex.split(MMC_EXPORT_TO_PACKWIZ_COMMAND.format(self.get_version(), self.get_version()))
 
+    @traced()
+    def pack_modrinth(self):
+        self.check_cancelled()
+        if MODRINTH_BACKEND == MODRINTH_BACKEND_NATIVE:
+            self.write_mrpack()
+            return
+        run_concurrently({"modrinth": self.get_modrinth_command()}, self.cancel)
+
+    # The native writers of pack_all ask for it from two threads
+    def get_resolver(self):
+        with self.resolver_lock:
+            if not self.resolver_opened:
+                self.resolver = self.resident.get_resolver() if self.resident is not None else open_resolver(self.refresh_lock)
+                self.resolver_opened = True
+            return self.resolver
+
+    # Save the lockfile of the lookups of the build, if there were some
+    @traced()
+    def finish_resolution(self):
+        if self.resolver is None:
+            return
+        if isinstance(self.resolver, ResolutionLock):
+            self.resolver.save()
+            log.info(self.resolver.summary())
+        elif self.resolver.known:
+            log.info(self.resolver.summary())
+        # The resident resolver answers the next builds
+        if self.resident is None:
+            self.resolver.close()
+
+    def open_hash_cache(self):
+        if self.resident is not None:
+            return self.resident.hash_cache
+        return load_hash_cache(CONFIG)
+
+    def close_hash_cache(self, hash_cache):
+        if hash_cache is None or self.resident is not None:
+            return
+        log.info(hash_cache.summary())
+        hash_cache.close()
+
+    @traced()
+    def write_mrpack(self):
+        # Same pack as mmc-export, without starting it
+        log.info("Writing Modrinth pack")
+        policy = load_policy(CONFIG, "modrinth_pack")
+        # The jars hashed by a previous build are not hashed again
+        hash_cache = self.open_hash_cache()
+        writer = MrpackWriter(MODPACK_NAME, self.get_version(), ZIP_WORKERS, self.get_resolver(), policy, CONFIG.get("modrinth_env"), hash_cache)
+        mrpack_path = f"{PATH_MODRINTH_OUTPUT}/{FORMAT_MODPACK_FILE_NAME.format(self.get_version())}.mrpack"
+        stats = writer.write(PATH_PRISM_PREPARED_EXPORT, self.minecraft_dir, mrpack_path)
+        log.info(stats.summary())
+        trace_count("files", stats.files)
+        self.close_hash_cache(hash_cache)
+        log.info(policy.report())
+
+    @traced()
+    def pack_packwiz(self):
+        self.check_cancelled()
+        if PACKWIZ_BACKEND == PACKWIZ_BACKEND_NATIVE:
+            self.write_packwiz()
+            return
+        run_concurrently({"packwiz": self.get_packwiz_command()}, self.cancel)
+        self.unpack_packwiz_output()
+
+    @traced()
+    def write_packwiz(self):
+        # Updates Packwiz/<version> in place instead of unpacking a new mmc-export output
+        log.info("Writing packwiz pack")
+        hash_cache = self.open_hash_cache()
+        writer = PackwizWriter(MODPACK_NAME, self.get_version(), ZIP_WORKERS, self.get_resolver(), CONFIG.get("modrinth_env"), hash_cache)
+        output_dir = str(pathlib.Path(PATH_PACKWIZ_OUTPUT) / self.get_version())
+        stats = writer.write(PATH_PRISM_PREPARED_EXPORT, self.minecraft_dir, output_dir, find_previous_version_dir(PATH_PACKWIZ_OUTPUT, self.get_version()))
+        log.info(stats.summary())
+        trace_count("files", stats.files)
+        self.close_hash_cache(hash_cache)
+
+    @traced()
+    def pack_all(self):
+        # Both exports only read the prepared export and write to different paths (./output and ./temp or ./Packwiz)
+        native = []
+        commands = {}
+        if MODRINTH_BACKEND == MODRINTH_BACKEND_NATIVE:
+            native.append(self.write_mrpack)
+        else:
+            commands["modrinth"] = self.get_modrinth_command()
+        if PACKWIZ_BACKEND == PACKWIZ_BACKEND_NATIVE:
+            native.append(self.write_packwiz)
+        else:
+            commands["packwiz"] = self.get_packwiz_command()
+        self.check_cancelled()
+        # The native writers run in threads while the commands run
+        with ThreadPoolExecutor(max_workers=max(len(native), 1)) as pool:
+            futures = [pool.submit(write) for write in native]
+            if commands:
+                run_concurrently(commands, self.cancel)
+            for future in futures:
+                future.result()
+        if PACKWIZ_BACKEND != PACKWIZ_BACKEND_NATIVE:
+            self.unpack_packwiz_output()
+
+    @traced()
+    def unpack_packwiz_output(self):
         # Unzip and put packiz output in the right directory
 
         # Packwiz zip path
@@ -249,13 +581,159 @@ class PrismInstance:
     def get_zip_path(self):
         return self.zip_path
 
+# Lookups of the native backends, through the lockfile unless it is disabled. None without native backend.
+def open_resolver(refresh_lock=False):
+    if MODRINTH_BACKEND != MODRINTH_BACKEND_NATIVE and PACKWIZ_BACKEND != PACKWIZ_BACKEND_NATIVE:
+        return None
+    resolver = load_resolver(CONFIG)
+    if resolver is not None and RESOLUTION_LOCK:
+        resolver = ResolutionLock(PATH_RESOLUTION_LOCK, resolver, refresh_lock)
+    return resolver
+
+class ResidentState:
+    # Hash cache and lookups of a long-running process, warm for its next builds: the rows of the hash cache stay
+    # in memory, the lockfile entries and answers of the providers too, the HTTP connections stay open
+
+    def __init__(self, refresh_lock=False):
+        self.hash_cache = load_hash_cache(CONFIG, keep_in_memory=True)
+        # Opened by the first build that looks a jar up
+        self.refresh_lock = refresh_lock
+        self.resolver = None
+        self.resolver_opened = False
+        self.resolver_lock = Lock()
+
+    def get_resolver(self):
+        with self.resolver_lock:
+            if not self.resolver_opened:
+                self.resolver = open_resolver(self.refresh_lock)
+                self.resolver_opened = True
+            return self.resolver
+
+    # Summary of the build that ended, and counters reset for the next one
+    def finish_build(self):
+        if self.hash_cache is not None:
+            log.info(self.hash_cache.summary())
+            self.hash_cache.reset_counters()
+            # Written at close() by a single build
+            self.hash_cache.flush_used()
+        if isinstance(self.resolver, ResolutionLock):
+            self.resolver.reset_counters()
+
+    def close(self):
+        if self.hash_cache is not None:
+            self.hash_cache.close()
+        if self.resolver is not None:
+            self.resolver.close()
+
+def print_cache_stats():
+    hash_cache = load_hash_cache(CONFIG)
+    if hash_cache is None:
+        print("The hash cache is disabled")
+        return
+    print(hash_cache.stats())
+    hash_cache.close()
+
+# Value of an option of the command line, removed from the arguments
+def pop_option(arguments, name, choices=None):
+    if name not in arguments:
+        return None
+    position = arguments.index(name)
+    if position + 1 >= len(arguments) or (choices is not None and arguments[position + 1] not in choices):
+        raise Exception(f"{name} expects " + (f"one of {', '.join(choices)}" if choices is not None else "a value"))
+    value = arguments.pop(position + 1)
+    arguments.pop(position)
+    return value
+
+# Build the packs of an export of the exports directory
+def build(zip_name, refresh_lock=False, trace=False, log_level=None, log_stream=None, resident=None, cancel=None):
+    configure_logging(CONFIG, log_level, log_stream)
+    start_tracing(CONFIG, trace)
+    try:
+        instance = PrismInstance(PATH_EXPORTS + "/" + zip_name, refresh_lock, resident, cancel)
+        if PARALLEL_EXPORTS:
+            instance.pack_all()
+        else:
+            instance.pack_modrinth()
+            instance.pack_packwiz()
+        instance.finish_resolution()
+    finally:
+        if resident is not None:
+            resident.finish_build()
+        # Also the trace of a failed build: the failing stage has an "error"
+        finish_tracing(CONFIG, pathlib.Path(zip_name).stem)
+        finish_logging()
+
+# Build the exports written in the exports directory, one at a time, until interrupted
+def watch(refresh_lock=False, trace=False, log_level=None):
+    configure_logging(CONFIG, log_level)
+    resident = ResidentState(refresh_lock)
+    watcher = ExportWatcher(PATH_EXPORTS, REGEX_VERSION_NAME, WATCH_SETTLE_SECONDS, WATCH_POLL_INTERVAL)
+    watcher.start()
+    try:
+        while True:
+            zip_name = watcher.next_export()
+            log.info(f"Building {zip_name}")
+            start = time.perf_counter()
+            try:
+                build(zip_name, False, trace, log_level, resident=resident)
+                log.info(f"Built {zip_name} in {time.perf_counter() - start:.1f}s, {len(watcher.queued())} export(s) queued")
+            except Exception as e:
+                log.error(f"Build of {zip_name} failed: {e}")
+            finish_logging()
+    except KeyboardInterrupt:
+        log.info("Stopped watching")
+    finally:
+        watcher.stop()
+        resident.close()
+        finish_logging()
+
+# Serve builds over the local API until interrupted
+def daemon(port=None, workers=None, log_level=None):
+    configure_logging(CONFIG, log_level)
+    try:
+        BuildDaemon(os.path.abspath(__file__), CONFIG, REGEX_VERSION_NAME, DAEMON_HOST, port or DAEMON_PORT, workers or DAEMON_MAX_BUILDS, DAEMON_TOKEN).start().serve_forever()
+    finally:
+        finish_logging()
+
 def run():
-    zip_name = " ".join(sys.argv[1:])
+    # modpack-creator.py --cache-stats: print the content of the hash cache
+    if sys.argv[1:] == ["--cache-stats"]:
+        print_cache_stats()
+        return
+    # modpack-creator.py --refresh-lock <export>: look every jar up again
+    # modpack-creator.py --trace <export>: trace the stages of the build, like "trace": true in the config
+    arguments = sys.argv[1:]
+    refresh_lock = "--refresh-lock" in arguments
+    if refresh_lock:
+        arguments.remove("--refresh-lock")
+    trace = "--trace" in arguments
+    if trace:
+        arguments.remove("--trace")
+    # modpack-creator.py --log-level debug <export>: a line per copied or deleted file
+    log_level = pop_option(arguments, "--log-level", list(LEVELS))
+    # modpack-creator.py --watch: build the exports written in the exports directory
+    if "--watch" in arguments:
+        watch(refresh_lock, trace, log_level)
+        return
+    # modpack-creator.py --daemon [--port 8765] [--workers 2]: serve builds over a local HTTP/JSON API
+    if "--daemon" in arguments:
+        port = pop_option(arguments, "--port")
+        workers = pop_option(arguments, "--workers")
+        daemon(int(port) if port else None, int(workers) if workers else None, log_level)
+        return
+    # modpack-creator.py --batch [--workers 4] <export or glob> ...: build several exports at the same time
+    if "--batch" in arguments:
+        arguments.remove("--batch")
+        workers = pop_option(arguments, "--workers")
+        options = {"refresh_lock": refresh_lock, "trace": trace, "log_level": log_level}
+        results = run_batch(os.path.abspath(__file__), CONFIG, arguments, REGEX_VERSION_NAME, int(workers) if workers else None, options)
+        if any(result.failed() for result in results):
+            sys.exit(1)
+        return
+    zip_name = " ".join(arguments)
     zip_name = zip_name.removeprefix("'")
     zip_name = zip_name.removesuffix("'")
-    instance = PrismInstance(PATH_EXPORTS + "/" + zip_name)
-    instance.pack_modrinth()
-    instance.pack_packwiz()
+    build(zip_name, refresh_lock, trace, log_level)
 
 if __name__ == '__main__':
     run()
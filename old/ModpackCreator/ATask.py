@@ -1,7 +1,8 @@
 from typing import List
-import json
 
-from ModpackCreator.const import CONFIG_PATH
+from ModpackCreator.Config.ConfigStore import config_store
+from ModpackCreator.Tracing.BuildTracer import trace_stage
+from ModpackCreator.Logging.BuildLog import flush_log, log
 
 class AVarDef:
     # Name of the variable. Should be overriden by subclasses. Should be set on init.
@@ -32,13 +33,11 @@ class AVarDef:
     def setup_value(self):
         # Final value
         final_value = None
-        # Open the config file as json
-        try:
-            with open(CONFIG_PATH, "r") as f:
-                config = json.load(f)
-        except FileNotFoundError:
-            config = {}
+        # Config of the run, parsed once for all the variables
+        config = config_store().snapshot()
         while final_value is None:
+            # The buffered log lines, the ones of the validation too, come before the prompt
+            flush_log()
             # If the config is not in the config file
             if self.name not in config.keys():
                 # If the config has a default value
@@ -101,11 +100,8 @@ class AVarDef:
                         print(self.format_feedback)
             else:
                 final_value = config[self.name]
-        # Set the value in the config file
-        config[self.name] = final_value
-        # Save the config file
-        with open(CONFIG_PATH, "w") as f:
-            json.dump(config, f, indent=4)
+        # Set the value in the config, saved at the end of the setup batch
+        config_store().set(self.name, final_value)
 
     # Prompt the value of the variable and return it. Should not be overriden by subclasses.
     def prompt_value(self):
@@ -113,6 +109,7 @@ class AVarDef:
         final_value = None
         # While final value not validated
         while final_value is None:
+            flush_log()
             # If the config has a default value
             if self.default is not None:
                 # Input with default value prompt
@@ -153,9 +150,10 @@ class ATask:
 
     # Public method to setup the action. Should not be overriden by subclasses.
     def setup(self):
-        # Setup the config file
-        for config in self.setup_configs:
-            config.setup_value()
+        # Setup the config file, written once with all the values
+        with config_store().batch():
+            for config in self.setup_configs:
+                config.setup_value()
 
     # Private method to run the action. Should be overriden by subclasses.
     def _run(self):
@@ -163,25 +161,28 @@ class ATask:
 
     # Public method to run the action. Should not be overriden by subclasses.
     def run(self):
-        # Get configs
-        try:
-            with open(CONFIG_PATH, "r") as f:
-                self.config = json.load(f)
-        except FileNotFoundError:
-            self.config = {}
+        # Get configs, a copy of the config of the run
+        self.config = config_store().snapshot()
+        # Keys of the config when the task started: the ones it removes from self.config are removed on save
+        self.config_keys = set(self.config)
         # Verify if the config is set
         for config in self.setup_configs:
             if config.name not in self.config.keys():
-                print(f"{config.name} is not set. Please run the setup command.")
+                log.error(f"{config.name} is not set. Please run the setup command.")
                 return
         self.args = {}
         # Get run variables
         for arg in self.run_args:
             self.args[arg.name] = arg.prompt_value()
-        # Run the action
-        self._run()
+        # Run the action, traced under the name of the task package
+        with trace_stage(type(self).__module__.split(".")[-2] + "._run"):
+            self._run()
 
+    # Save self.config over the current config file: the values that changed, and the keys removed since the start
     def save_config(self):
-        with open(CONFIG_PATH, "w") as f:
-            json.dump(self.config, f, indent=4)
+        store = config_store()
+        with store.batch():
+            store.update(self.config)
+            store.delete(self.config_keys - set(self.config))
+        self.config_keys = set(self.config)
             
\ No newline at end of file
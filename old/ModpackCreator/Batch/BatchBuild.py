@@ -0,0 +1,178 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Queue
+from typing import Dict, List, Optional
+import glob
+import importlib.util
+import json
+import os
+import re
+import shutil
+import time
+
+from ModpackCreator.Hashing.HashCache import DEFAULT_CACHE_PATH
+from ModpackCreator.Logging.BuildLog import close_logging
+from ModpackCreator.Resolver.ResolutionLock import LOCK_FILE_NAME, merge_lock
+from ModpackCreator.Resolver.Resolver import DEFAULT_PROJECT_INDEX
+
+# Workspaces of the workers and logs of the builds, under the directory of the pack
+BATCH_DIR = "temp/batch"
+# Directories of the pack seen from every workspace: the exports are read from it, the packs written to it
+LINKED_DIRS = ("exports", "output", "Packwiz")
+# Paths of the config shared by the workspaces, with their defaults: the hash cache (SQLite, safe between processes),
+# the project index (read only) and the outputs of the builds. The other caches (normalization, incremental staging)
+# stay in the workspace of each worker and are warm for the next build of that worker.
+SHARED_PATHS = {"hash_cache": DEFAULT_CACHE_PATH, "project_index": DEFAULT_PROJECT_INDEX, "project_index_dump": None, "trace_dir": "temp/traces", "log_json": None}
+
+# Workspace of the worker process, claimed when it starts
+workspace: Optional[str] = None
+
+class BuildResult:
+    # Status of a build of the batch
+    def __init__(self, zip_name: str, worker: str, seconds: float, error: Optional[str], log_path: str, lock_path: Optional[str]):
+        self.zip_name = zip_name
+        self.worker = worker
+        self.seconds = seconds
+        self.error = error
+        self.log_path = log_path
+        # Lockfile of the build, to merge in the lockfile of the pack
+        self.lock_path = lock_path
+
+    def failed(self) -> bool:
+        return self.error is not None
+
+# Names relative to the exports directory: file names, or glob patterns like "Pack-1.2.*.zip". Largest exports first,
+# the longest builds are started first and the pool isn't left waiting on one at the end.
+def expand_exports(patterns: List[str], exports_dir: str) -> List[str]:
+    zip_names = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(os.path.relpath(path, exports_dir) for path in glob.glob(os.path.join(exports_dir, pattern)) if os.path.isfile(path))
+            if not matches:
+                raise Exception(f"No export in {exports_dir} matches {pattern}")
+            zip_names += matches
+        elif os.path.isfile(os.path.join(exports_dir, pattern)):
+            zip_names.append(pattern)
+        else:
+            raise Exception(f"The export '{pattern}' doesn't exist in {exports_dir}")
+    zip_names = list(dict.fromkeys(zip_names))
+    return sorted(zip_names, key=lambda zip_name: os.path.getsize(os.path.join(exports_dir, zip_name)), reverse=True)
+
+# Two builds of the same version would write the same packs
+def check_versions(zip_names: List[str], version_pattern: str):
+    exports_by_version: Dict[str, str] = {}
+    for zip_name in zip_names:
+        match = re.search(version_pattern, zip_name)
+        if match is None:
+            continue
+        other = exports_by_version.setdefault(match.group(0), zip_name)
+        if other != zip_name:
+            raise Exception(f"{other} and {zip_name} have the same version {match.group(0)}, they can't be built in the same batch")
+
+# Config of the workspaces: the shared paths made absolute, the cores split between the workers
+def workspace_config(config: Dict, root: str, workers: int) -> Dict:
+    config = dict(config)
+    for key, default in SHARED_PATHS.items():
+        path = config.get(key, default)
+        if path is not None:
+            config[key] = os.path.join(root, path)
+    cores = max((os.cpu_count() or 1) // workers, 1)
+    config.setdefault("zip_workers", cores)
+    config.setdefault("normalize_workers", cores)
+    return config
+
+def prepare_workspace(path: str, root: str, config: Dict):
+    os.makedirs(os.path.join(path, "temp"), exist_ok=True)
+    for name in LINKED_DIRS:
+        link = os.path.join(path, name)
+        target = os.path.join(root, name)
+        os.makedirs(target, exist_ok=True)
+        if os.path.islink(link) and os.readlink(link) == target:
+            continue
+        if os.path.islink(link):
+            os.remove(link)
+        try:
+            os.symlink(target, link, target_is_directory=True)
+        except OSError as e:
+            raise Exception(f"Can't link {link} to {target}, the workspaces of a batch need symbolic links: {e}")
+    with open(os.path.join(path, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+def claim_workspace(slots: Queue):
+    global workspace
+    workspace = slots.get()
+
+# A fresh module per build: the script reads config.json of the current directory when it is loaded
+def load_script(script_path: str):
+    spec = importlib.util.spec_from_file_location("modpack_creator_batch_build", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Build an export in the workspace of this worker. The build starts from the lockfile of the pack, its lockfile is moved
+# out of the workspace for the main process to merge: the next build of the worker can start before the merge.
+def build_in_workspace(script_path: str, root: str, zip_name: str, options: Dict) -> BuildResult:
+    label = os.path.splitext(os.path.basename(zip_name))[0]
+    log_path = os.path.join(root, BATCH_DIR, "logs", label + ".log")
+    lock_path = None
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    start = time.perf_counter()
+    error = None
+    os.chdir(workspace)
+    try:
+        if os.path.isfile(os.path.join(root, LOCK_FILE_NAME)):
+            shutil.copyfile(os.path.join(root, LOCK_FILE_NAME), LOCK_FILE_NAME)
+        elif os.path.isfile(LOCK_FILE_NAME):
+            os.remove(LOCK_FILE_NAME)
+        with open(log_path, "w") as log_file:
+            try:
+                load_script(script_path).build(zip_name, options.get("refresh_lock", False), options.get("trace", False), options.get("log_level"), log_file)
+            finally:
+                close_logging()
+        if os.path.isfile(LOCK_FILE_NAME):
+            lock_path = os.path.join(root, BATCH_DIR, "locks", label + ".json")
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            os.replace(LOCK_FILE_NAME, lock_path)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        os.chdir(root)
+    return BuildResult(zip_name, os.path.basename(workspace), time.perf_counter() - start, error, log_path, lock_path)
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    return f"{int(seconds // 60)}m{seconds % 60:02.0f}s"
+
+# Build several exports at the same time, each in the workspace of a worker process. Prints the status of each build
+# when it ends and the throughput of the batch. Returns the results, in the order the builds ended.
+def run_batch(script_path: str, config: Dict, patterns: List[str], version_pattern: str, workers: Optional[int] = None, options: Optional[Dict] = None) -> List[BuildResult]:
+    root = os.getcwd()
+    zip_names = expand_exports(patterns, os.path.join(root, "exports"))
+    check_versions(zip_names, version_pattern)
+    workers = max(min(workers or config.get("batch_workers") or os.cpu_count() or 1, len(zip_names)), 1)
+    slots = Queue()
+    shared_config = workspace_config(config, root, workers)
+    for number in range(workers):
+        path = os.path.join(root, BATCH_DIR, f"worker-{number}")
+        prepare_workspace(path, root, shared_config)
+        slots.put(path)
+    print(f"Building {len(zip_names)} exports with {workers} workers")
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=claim_workspace, initargs=(slots,)) as pool:
+        futures = [pool.submit(build_in_workspace, script_path, root, zip_name, options or {}) for zip_name in zip_names]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            # Merged one build at a time: the workers never write the lockfile of the pack
+            if result.lock_path is not None:
+                merge_lock(result.lock_path, os.path.join(root, LOCK_FILE_NAME))
+                os.remove(result.lock_path)
+            status = "failed" if result.failed() else "done"
+            print(f"[{len(results)}/{len(zip_names)}] {result.zip_name} {status} in {format_duration(result.seconds)} ({result.worker}, log in {os.path.relpath(result.log_path, root)})", flush=True)
+            if result.failed():
+                print(f"    {result.error}", flush=True)
+    seconds = time.perf_counter() - start
+    done = sum(1 for result in results if not result.failed())
+    print(f"{len(results)} builds in {format_duration(seconds)}: {done} done, {len(results) - done} failed, {done / seconds * 3600:.1f} builds/hour")
+    return results
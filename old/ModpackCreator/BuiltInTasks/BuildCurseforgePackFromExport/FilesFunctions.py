@@ -1,66 +1,71 @@
 import os
 import shutil
-import zipfile
+
+from ModpackCreator.Logging.BuildLog import count, log
 
 def remove_dir(path, description):
     if os.path.isdir(path):
         shutil.rmtree(path)
-        print("Deleted " + description)
+        count("remove", "directories")
+        log.debug("Deleted " + description)
     else:
-        print("Skipped " + description + " deletion, didn't exist")
+        log.debug("Skipped " + description + " deletion, didn't exist")
 
 def remove_file(path, description):
     if os.path.isfile(path):
         os.remove(path)
-        print("Deleted " + description)
+        count("remove", "files")
+        log.debug("Deleted " + description)
     else:
-        print("Skipped " + description + " deletion, didn't exist")
+        log.debug("Skipped " + description + " deletion, didn't exist")
+
+def counted_copy(from_path, to_path):
+    # One line per copied file at debug level only, the files and bytes are summed in the "copy" stage
+    shutil.copy2(from_path, to_path)
+    count("copy", "files")
+    count("copy", "bytes", os.path.getsize(to_path))
+    log.debug("Copied %s", to_path)
 
 def copy_dir(from_path, to_path, from_desc, to_desc):
     if os.path.isdir(from_path):
-        ret = shutil.copytree(from_path, to_path, dirs_exist_ok=True)
-        print("Copied " + from_desc + " to " + to_desc)
+        shutil.copytree(from_path, to_path, dirs_exist_ok=True, copy_function=counted_copy)
+        log.debug("Copied " + from_desc + " to " + to_desc)
     else:
-        print("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
+        log.debug("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
 
 def copy_file(from_path, to_path, from_desc, to_desc):
     if os.path.isfile(from_path):
-        shutil.copy2(from_path, to_path)
-        print("Copied " + from_desc + " to " + to_desc)
+        counted_copy(from_path, to_path)
+        log.debug("Copied " + from_desc + " to " + to_desc)
     else:
-        print("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
+        log.debug("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
 
+# The zip modules are imported on the first zip operation, not with the task
 def zip_contains_file(zip_path, file_name):
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        if file_name in zip_ref.namelist():
-            print(file_name + " in " + zip_path + " found !")
-            return True
-    print("No " + file_name + " in " + zip_path)
+    from ModpackCreator.Zip.ZipIndex import get_zip_index
+    if get_zip_index(zip_path).contains_file(file_name):
+        log.debug(file_name + " in " + zip_path + " found !")
+        return True
+    log.debug("No " + file_name + " in " + zip_path)
+    return False
 
 def zip_contains_dir(zip_path, dir_name):
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        for name in zip_ref.namelist():
-            if name.startswith(dir_name):
-                print(dir_name + " in " + zip_path + " found !")
-                return True
-    print("No " + dir_name + " in " + zip_path)
+    from ModpackCreator.Zip.ZipIndex import get_zip_index
+    if get_zip_index(zip_path).contains_dir(dir_name):
+        log.debug(dir_name + " in " + zip_path + " found !")
+        return True
+    log.debug("No " + dir_name + " in " + zip_path)
     return False
 
-def copy_to_zip(from_path, to_path, archive_path):
-
-    files = []
-
-    with zipfile.ZipFile(archive_path) as archive:
-        for zipinfo in archive.infolist():
-            if zipinfo.filename != to_path:
-                files.append((zipinfo.filename, archive.read(zipinfo.filename)))
-
-    with zipfile.ZipFile(archive_path, "w") as archive:
-        for filename, content in files:
-            archive.writestr(filename, content)
-        archive.write(from_path, to_path)
+def copy_to_zip(from_path, to_path, archive_path, policy=None):
+    from ModpackCreator.Zip.ZipPatcher import ZipPatcher
+    # Only the copied file is compressed, the other entries are copied as they are
+    patcher = ZipPatcher(archive_path, policy)
+    patcher.put_file(to_path, from_path)
+    patcher.apply()
 
 def copy_from_zip(from_path, to_path, archive_path):
+    import zipfile
     with zipfile.ZipFile(archive_path) as archive:
         with open(to_path, "wb") as file:
             file.write(archive.read(from_path))
\ No newline at end of file
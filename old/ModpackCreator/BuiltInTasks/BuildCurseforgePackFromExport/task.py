@@ -3,9 +3,11 @@ from ModpackCreator.ATask import AVarDef
 from ModpackCreator.InputVarTypes.PathVar import RelativeToPathVar
 import os
 import re
-from ..CurseForgeToMultiMC.task import MultiMCInstancePathVar
+from ModpackCreator.InputVarTypes.InstanceVar import ModpackNameVar, MultiMCInstancePathVar
 
 from . import FilesFunctions
+from ModpackCreator.Tracing.BuildTracer import traced
+from ModpackCreator.Logging.BuildLog import log, log_stage_summary
 import json
 
 class CurseforgeInstanceExportPathVar(RelativeToPathVar):
@@ -46,18 +48,6 @@ class VersionVar(AVarDef):
             return False
         return True
 
-class ModpackNameVar(AVarDef):
-    format_feedback = "Invalid modpack name. Expected a valid modpack name (sould not conain any path forbidden characters)."
-
-    # Verify that the value is a valid absolute path
-    def _validate(self, value: str):
-        # Should not contain aany path forbidden characters
-        if not re.match(r"^[^\\/:*?\"<>|]+$", value):
-            print("Invalid modpack name")
-            return False
-        return True
-
-
 class Task(ATask):
 
     # Prepared export paths
@@ -75,8 +65,9 @@ class Task(ATask):
         VersionVar("version", "New version of the pack")
     ]
 
+    @traced("BuildCurseforgePackFromExport.prepare_curseforge_profile")
     def prepare_curseforge_profile(self):
-        print("Preparing curseforge profile")
+        log.info("Preparing curseforge profile")
         # Get the raw export path
         raw_export_path = "./exports/" + self.args["curseforge_instance_export_path"]
         # Remove old prepared export
@@ -98,12 +89,17 @@ class Task(ATask):
             manifest_file.truncate()
             manifest_file.write(json.dumps(content_json, indent=4))
         # Copy manifest.json from temp to zip
-        FilesFunctions.copy_to_zip("temp/manifest.json", "manifest.json", self.curseforge_prepared_export_path)
+        from ModpackCreator.Zip.CompressionPolicy import load_policy
+        policy = load_policy(self.config, "curseforge_pack")
+        FilesFunctions.copy_to_zip("temp/manifest.json", "manifest.json", self.curseforge_prepared_export_path, policy)
+        log.info(policy.report())
 
+    @traced("BuildCurseforgePackFromExport.pack_curseforge")
     def pack_curseforge(self):
-        print("Packing curseforge")
+        log.info("Packing curseforge")
         # Copy the prepared export to the output directory
         FilesFunctions.copy_file(self.curseforge_prepared_export_path, "output/" + self.config["modpack_name"] + "-" + self.args["version"] + ".zip", "prepared curseforge export", "output pack")
+        log_stage_summary("copy")
         
     # Run the task
     def _run(self):
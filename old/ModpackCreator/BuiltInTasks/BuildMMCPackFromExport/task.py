@@ -3,13 +3,14 @@ from ModpackCreator.ATask import AVarDef
 from ModpackCreator.InputVarTypes.PathVar import RelativeToPathVar
 import os
 import re
-from ..CurseForgeToMultiMC.task import MultiMCInstancePathVar
-from ..BuildCurseforgePackFromExport.task import ModpackNameVar
+from ModpackCreator.InputVarTypes.InstanceVar import ModpackNameVar, MultiMCInstancePathVar
 
 from . import FilesFunctions
 import json
 
-from shutil import unpack_archive, make_archive
+from shutil import unpack_archive
+from ModpackCreator.Tracing.BuildTracer import trace_stage, traced
+from ModpackCreator.Logging.BuildLog import flush_log, log, log_stage_summary
 
 
 class MultiMCInstanceExportPathVar(RelativeToPathVar):
@@ -58,6 +59,8 @@ class Task(ATask):
     # Prepared export paths
     curseforge_prepared_export_path = "temp/curseforge_prepared_export.zip"
     mmc_prepared_export_path = "temp/mmc_prepared_export.zip"
+    # Manifest of the after includes directory kept by the incremental build mode
+    staging_manifest_path = "temp/staging_manifest.json"
 
     # Setup configs list
     setup_configs = [
@@ -71,8 +74,14 @@ class Task(ATask):
         VersionVar("version", "New version of the pack")
     ]
 
+    @traced("BuildMMCPackFromExport.prepare_mmc_profile")
     def prepare_mmc_profile(self):
-        print("Preparing MultiMC profile")
+        log.info("Preparing MultiMC profile")
+        # Imported when the task runs: listing or setting up the tasks doesn't load the zip and text modules
+        from ModpackCreator.Zip.CompressionPolicy import load_policy
+        from ModpackCreator.Zip.ParallelZipWriter import make_archive
+        # Compression of the prepared export
+        policy = load_policy(self.config, "prepared_export")
         # Name value regex
         name_value_regex = re.compile(r"\d+\.\d+\.\d+-?\w*\.?\d*")
         # Get instance name
@@ -97,7 +106,7 @@ class Task(ATask):
             instance_cfg_file.truncate()
             instance_cfg_file.write(content)
         # Copy instance.cfg from temp to zip
-        FilesFunctions.copy_to_zip("temp/instance.cfg", instance_name + "/instance.cfg", self.mmc_prepared_export_path)
+        FilesFunctions.copy_to_zip("temp/instance.cfg", instance_name + "/instance.cfg", self.mmc_prepared_export_path, policy)
 
         # Find minecraft folder name
         if FilesFunctions.zip_contains_dir(self.mmc_prepared_export_path, instance_name + "/.minecraft"):
@@ -111,9 +120,29 @@ class Task(ATask):
         if os.path.isfile("temp/instance.cfg"):
             os.remove("temp/instance.cfg")
 
+        # Keep only the included files, normalized
+        if self.config.get("build_mode") == "incremental":
+            self.restage_included_files(instance_name, minecraft_folder_name)
+        else:
+            self.unpack_included_files(instance_name, minecraft_folder_name)
+
+        # temp/temp_mmc_export_after_includes is now ready to be packed
+        # Pack the zip
+        log.info("Packing zip prepared for export")
+        with trace_stage("make_archive"):
+            make_archive("temp/mmc_prepared_export", "temp/temp_mmc_export_after_includes", self.config.get("zip_workers"), policy)
+        log.info(policy.report())
+
+    @traced("BuildMMCPackFromExport.unpack_included_files")
+    def unpack_included_files(self, instance_name: str, minecraft_folder_name: str):
+        from ModpackCreator.Text.NormalizationCache import load_cache
+        from ModpackCreator.Text.Normalizer import MODE_CRLF_JOIN_LINES, normalize_tree
+        from ModpackCreator.Zip.IncrementalStaging import forget_staging
         # Keep only the included files
         # Get the list of files to include
         included_files = self.config["instance_includes_list"]
+        # The incremental staging can't be trusted anymore
+        forget_staging(self.staging_manifest_path)
         # If the directory already exists, delete it
         if os.path.isdir("temp/temp_mmc_export_before_includes"):
             FilesFunctions.remove_dir("temp/temp_mmc_export_before_includes", "old before includes")
@@ -125,14 +154,14 @@ class Task(ATask):
         # create after includes directory
         os.mkdir("temp/temp_mmc_export_after_includes")
         # Copy all the files except .minecraft folder
-        print("Copying all files except .minecraft folder")
+        log.info("Copying all files except .minecraft folder")
         for file in os.listdir("temp/temp_mmc_export_before_includes" + "/" + instance_name):
             if file != minecraft_folder_name:
                 if os.path.isfile("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file):
                     FilesFunctions.copy_file("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file, "temp/temp_mmc_export_after_includes/" + instance_name + "/" + file, "included file", "prepare profile")
                 if os.path.isdir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file):
                     FilesFunctions.copy_dir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file, "temp/temp_mmc_export_after_includes/" + instance_name + "/" + file, "included file", "prepare profile")
-        print("Copying included files in .minecraft folder")
+        log.info("Copying included files in .minecraft folder")
         # Copy only the included files in the <instance_name> folder
         for file in included_files:
             if os.path.isfile("temp/temp_mmc_export_before_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file):
@@ -140,28 +169,55 @@ class Task(ATask):
             if os.path.isdir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file):
                 FilesFunctions.copy_dir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file, "temp/temp_mmc_export_after_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file, "included file", "prepare profile")
 
+        log_stage_summary("copy")
         # Normalize all end of lines with CRLF
-        print("Normalizing all end of lines with CRLF")
-        for root, dirs, files in os.walk("temp/temp_mmc_export_after_includes/" + instance_name):
-            for file in files:
-                list_of_txt_extensions = [".txt", ".json", ".toml", ".cfg", ".properties", ".lang", ".mcmeta", ".log", ".md", ".yml", ".yaml", ".json5"]
-                if os.path.splitext(file)[1] in list_of_txt_extensions:
-                    print("Normalizing " + file)
-                    file_path = os.path.join(root, file)
-                    with open(file_path, "r+") as f:
-                        content = f.read()
-                        content = "\r\n".join(content.splitlines())
-                        f.seek(0)
-                        f.truncate()
-                        f.write(content)
-
-        # temp/temp_mmc_export_after_includes is now ready to be packed
-        # Pack the zip
-        print("Packing zip prepared for export")
-        make_archive("temp/mmc_prepared_export", "zip", "temp/temp_mmc_export_after_includes")
-
+        log.info("Normalizing all end of lines with CRLF")
+        # Files unchanged since a previous build are taken from the cache
+        cache = load_cache(self.config)
+        stats = normalize_tree("temp/temp_mmc_export_after_includes/" + instance_name, workers=self.config.get("normalize_workers"), mode=self.config.get("normalize_mode", MODE_CRLF_JOIN_LINES), sniff_unknown=self.config.get("normalize_sniff_unknown", False), cache=cache)
+        log.info(stats.summary())
+        if cache is not None:
+            log.info(cache.summary())
+
+    @traced("BuildMMCPackFromExport.restage_included_files")
+    def restage_included_files(self, instance_name: str, minecraft_folder_name: str):
+        # Update the after includes directory of the previous build: only the entries that changed are extracted and normalized
+        log.info("Restaging included files")
+        from ModpackCreator.Text.NormalizationCache import load_cache
+        from ModpackCreator.Text.Normalizer import MODE_CRLF_JOIN_LINES, normalize_paths
+        from ModpackCreator.Zip.IncrementalStaging import IncrementalStaging
+        included_files = [file.strip("/") for file in self.config["instance_includes_list"]]
+        instance_prefix = instance_name + "/"
+        minecraft_prefix = instance_prefix + minecraft_folder_name + "/"
+
+        # Same files as the ones copied by unpack_included_files
+        def is_included(entry_name: str) -> bool:
+            if not entry_name.startswith(instance_prefix) or entry_name == instance_prefix:
+                return False
+            if not entry_name.startswith(minecraft_prefix):
+                return entry_name[len(instance_prefix):].split("/", 1)[0] != minecraft_folder_name
+            relative_name = entry_name[len(minecraft_prefix):]
+            return any(relative_name == file or relative_name.startswith(file + "/") for file in included_files)
+
+        mode = self.config.get("normalize_mode", MODE_CRLF_JOIN_LINES)
+        sniff_unknown = self.config.get("normalize_sniff_unknown", False)
+        settings = {"minecraft_dir": minecraft_folder_name, "normalize_mode": mode, "normalize_sniff_unknown": sniff_unknown}
+        staging = IncrementalStaging("temp/temp_mmc_export_after_includes", self.staging_manifest_path, settings)
+        extracted_paths = staging.update(self.mmc_prepared_export_path, is_included)
+        log.info(staging.stats.summary())
+        # Normalize the extracted files
+        log.info("Normalizing end of lines of the extracted files with CRLF")
+        cache = load_cache(self.config)
+        stats = normalize_paths(extracted_paths, workers=self.config.get("normalize_workers"), mode=mode, sniff_unknown=sniff_unknown, cache=cache)
+        log.info(stats.summary())
+        if cache is not None:
+            log.info(cache.summary())
+        # The directory is complete
+        staging.commit()
+
+    @traced("BuildMMCPackFromExport.pack_mmc")
     def pack_mmc(self):
-        print("Packing MultiMC profile")
+        log.info("Packing MultiMC profile")
 
         # Preparing command
         program = "mmc-export"
@@ -175,9 +231,10 @@ class Task(ATask):
 
         # Concatenate command
         cmd = f"{program} {from_zip} {output_format} {search_mod} {output_directory} {toml_file} {pack_version} {scheme}  --exclude-providers GitHub"
-        print(cmd)
+        log.info(cmd)
 
-        # Run command
+        # Run command, after the buffered lines
+        flush_log()
         os.system(cmd)
         
 
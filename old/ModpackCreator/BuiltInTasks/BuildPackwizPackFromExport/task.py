@@ -3,14 +3,15 @@ from ModpackCreator.ATask import AVarDef
 from ModpackCreator.InputVarTypes.PathVar import RelativeToPathVar
 import os
 import re
-from ..CurseForgeToMultiMC.task import MultiMCInstancePathVar
-from ..BuildCurseforgePackFromExport.task import ModpackNameVar
+from ModpackCreator.InputVarTypes.InstanceVar import ModpackNameVar, MultiMCInstancePathVar
 
 from . import FilesFunctions
 import json
 
 from pathlib import Path
-from shutil import unpack_archive, make_archive
+from shutil import unpack_archive
+from ModpackCreator.Tracing.BuildTracer import trace_stage, traced
+from ModpackCreator.Logging.BuildLog import flush_log, log, log_stage_summary
 
 default_instance_includes_list = [
     "config",
@@ -79,8 +80,16 @@ class Task(ATask):
         VersionVar("version", "New version of the pack")
     ]
 
+    @traced("BuildPackwizPackFromExport.prepare_mmc_profile")
     def prepare_mmc_profile(self):
-        print("Preparing MultiMC profile")
+        log.info("Preparing MultiMC profile")
+        # Imported when the task runs: listing or setting up the tasks doesn't load the zip and text modules
+        from ModpackCreator.Text.Normalizer import MODE_CRLF_COLLAPSE_BLANK_LINES, normalize_tree
+        from ModpackCreator.Zip.CompressionPolicy import load_policy
+        from ModpackCreator.Zip.IncrementalStaging import forget_staging
+        from ModpackCreator.Zip.ParallelZipWriter import make_archive
+        # Compression of the prepared export
+        policy = load_policy(self.config, "prepared_export")
         # Name value regex
         name_value_regex = re.compile(r"\d+\.\d+\.\d+-?\w*\.?\d*")
         # Get instance name
@@ -105,7 +114,7 @@ class Task(ATask):
             instance_cfg_file.truncate()
             instance_cfg_file.write(content)
         # Copy instance.cfg from temp to zip
-        FilesFunctions.copy_to_zip("temp/instance.cfg", instance_name + "/instance.cfg", self.mmc_prepared_export_path)
+        FilesFunctions.copy_to_zip("temp/instance.cfg", instance_name + "/instance.cfg", self.mmc_prepared_export_path, policy)
 
         # Find minecraft folder name
         if FilesFunctions.zip_contains_dir(self.mmc_prepared_export_path, instance_name + "/.minecraft"):
@@ -122,6 +131,8 @@ class Task(ATask):
         # Keep only the included files
         # Get the list of files to include
         included_files = self.config["instance_includes_list"]
+        # The incremental staging of the MultiMC task can't be trusted anymore
+        forget_staging("temp/staging_manifest.json")
         # If the directory already exists, delete it
         if os.path.isdir("temp/temp_mmc_export_before_includes"):
             FilesFunctions.remove_dir("temp/temp_mmc_export_before_includes", "old before includes")
@@ -133,14 +144,14 @@ class Task(ATask):
         # create after includes directory
         os.mkdir("temp/temp_mmc_export_after_includes")
         # Copy all the files except .minecraft folder
-        print("Copying all files except .minecraft folder")
+        log.info("Copying all files except .minecraft folder")
         for file in os.listdir("temp/temp_mmc_export_before_includes" + "/" + instance_name):
             if file != minecraft_folder_name:
                 if os.path.isfile("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file):
                     FilesFunctions.copy_file("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file, "temp/temp_mmc_export_after_includes/" + instance_name + "/" + file, "included file", "prepare profile")
                 if os.path.isdir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file):
                     FilesFunctions.copy_dir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + file, "temp/temp_mmc_export_after_includes/" + instance_name + "/" + file, "included file", "prepare profile")
-        print("Copying included files in .minecraft folder")
+        log.info("Copying included files in .minecraft folder")
         # Copy only the included files in the <instance_name> folder
         for file in included_files:
             if os.path.isfile("temp/temp_mmc_export_before_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file):
@@ -148,31 +159,23 @@ class Task(ATask):
             if os.path.isdir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file):
                 FilesFunctions.copy_dir("temp/temp_mmc_export_before_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file, "temp/temp_mmc_export_after_includes/" + instance_name + "/" + minecraft_folder_name + "/" + file, "included file", "prepare profile")
         
+        log_stage_summary("copy")
         # Normalize all end of lines with CRLF
-        print("Normalizing all end of lines with CRLF")
-        for root, dirs, files in os.walk("temp/temp_mmc_export_after_includes/" + instance_name):
-            for file in files:
-                list_of_txt_extensions = [".txt", ".json", ".toml", ".cfg", ".properties", ".lang", ".mcmeta", ".log", ".md", ".yml", ".yaml", ".json5"]
-                if os.path.splitext(file)[1] in list_of_txt_extensions:
-                    print("Normalizing " + file)
-                    file_path = os.path.join(root, file)
-                    with open(file_path, "r+") as f:
-                        content = f.read()
-                        content = content.replace("\r", "\n")
-                        content = content.replace("\n\n", "\n")
-                        content = content.replace("\n", "\r\n")
-                        f.seek(0)
-                        f.truncate()
-                        f.write(content)
+        log.info("Normalizing all end of lines with CRLF")
+        stats = normalize_tree("temp/temp_mmc_export_after_includes/" + instance_name, workers=self.config.get("normalize_workers"), sniff_unknown=self.config.get("normalize_sniff_unknown", False), mode=MODE_CRLF_COLLAPSE_BLANK_LINES)
+        log.info(stats.summary())
 
         # temp/temp_mmc_export_after_includes is now ready to be packed
         # Pack the zip
-        print("Packing zip prepared for export")
-        make_archive("temp/mmc_prepared_export", "zip", "temp/temp_mmc_export_after_includes")
+        log.info("Packing zip prepared for export")
+        with trace_stage("make_archive"):
+            make_archive("temp/mmc_prepared_export", "temp/temp_mmc_export_after_includes", self.config.get("zip_workers"), policy)
+        log.info(policy.report())
 
 
+    @traced("BuildPackwizPackFromExport.pack_packwiz")
     def pack_packwiz(self):
-        print("Packing Packwiz profile")
+        log.info("Packing Packwiz profile")
 
         # Preparing command
         program = "mmc-export"
@@ -187,9 +190,10 @@ class Task(ATask):
 
         # Concatenate command
         cmd = f"{program} {from_zip} {output_format} {search_mod} {output_directory} {toml_file} {pack_version} {provider_priority} {scheme} --exclude-providers GitHub"
-        print(cmd)
+        log.info(cmd)
 
-        # Run command
+        # Run command, after the buffered lines
+        flush_log()
         os.system(cmd)
 
         # Packwiz zip path
@@ -218,7 +222,7 @@ class Task(ATask):
             # Save the configuration
             self.save_config()
             # Advise the user
-            print("No instance includes list found in the configuration file. Set config with defaults includes. You can change it in the configuration file.")
+            log.warning("No instance includes list found in the configuration file. Set config with defaults includes. You can change it in the configuration file.")
 
         self.prepare_mmc_profile()
         self.pack_packwiz()
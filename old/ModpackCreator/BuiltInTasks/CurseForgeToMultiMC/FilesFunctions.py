@@ -1,30 +1,41 @@
 import os
 import shutil
 
+from ModpackCreator.Logging.BuildLog import count, log
+
 def remove_dir(path, description):
     if os.path.isdir(path):
         shutil.rmtree(path)
-        print("Deleted " + description)
+        count("remove", "directories")
+        log.debug("Deleted " + description)
     else:
-        print("Skipped " + description + " deletion, didn't exist")
+        log.debug("Skipped " + description + " deletion, didn't exist")
 
 def remove_file(path, description):
     if os.path.isfile(path):
         os.remove(path)
-        print("Deleted " + description)
+        count("remove", "files")
+        log.debug("Deleted " + description)
     else:
-        print("Skipped " + description + " deletion, didn't exist")
+        log.debug("Skipped " + description + " deletion, didn't exist")
+
+def counted_copy(from_path, to_path):
+    # One line per copied file at debug level only, the files and bytes are summed in the "copy" stage
+    shutil.copy2(from_path, to_path)
+    count("copy", "files")
+    count("copy", "bytes", os.path.getsize(to_path))
+    log.debug("Copied %s", to_path)
 
 def copy_dir(from_path, to_path, from_desc, to_desc):
     if os.path.isdir(from_path):
-        ret = shutil.copytree(from_path, to_path, dirs_exist_ok=True)
-        print("Copied " + from_desc + " to " + to_desc)
+        shutil.copytree(from_path, to_path, dirs_exist_ok=True, copy_function=counted_copy)
+        log.debug("Copied " + from_desc + " to " + to_desc)
     else:
-        print("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
+        log.debug("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
 
 def copy_file(from_path, to_path, from_desc, to_desc):
     if os.path.isfile(from_path):
-        shutil.copy2(from_path, to_path)
-        print("Copied " + from_desc + " to " + to_desc)
+        counted_copy(from_path, to_path)
+        log.debug("Copied " + from_desc + " to " + to_desc)
     else:
-        print("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
\ No newline at end of file
+        log.debug("Skipped " + from_desc + " copying to " + to_desc + ", didn't exist")
\ No newline at end of file
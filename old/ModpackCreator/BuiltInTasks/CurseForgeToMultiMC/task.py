@@ -1,8 +1,9 @@
 from ModpackCreator.ATask import ATask
-from ModpackCreator.InputVarTypes.PathVar import DirectoryAbsolutePathVar
+from ModpackCreator.InputVarTypes.InstanceVar import CurseForgeInstancePathVar, MultiMCInstancePathVar
 import os
 
 from . import FilesFunctions
+from ModpackCreator.Logging.BuildLog import log, log_stage_summary
 
 default_instance_includes_list = [
     "config",
@@ -11,32 +12,6 @@ default_instance_includes_list = [
     "options.txt"
 ]
 
-class MultiMCInstancePathVar(DirectoryAbsolutePathVar):
-    format_feedback = "Invalid path format. Expected a valid absolute Unix path. The target path must exist. The target path must be a MultiMC instance folder and contain a .minecraft folder."
-
-    # Verify that the value is a valid absolute path
-    def _validate(self, value: str):
-        # Verify DirectoryAbsolutePathVar validation
-        if not super()._validate(value):
-            return False
-        # Verify that the path contains a .minecraft folder or a minecraft folder
-        if not os.path.isdir(value + "/.minecraft") and not os.path.isdir(value + "/minecraft"):
-            return False
-        return True
-
-class CurseForgeInstancePathVar(DirectoryAbsolutePathVar):
-    format_feedback = "Invalid path format. Expected a valid absolute Unix path. The target path must exist. The target path must be a CurseForge instance folder and contain a manifest.json file."
-
-    # Verify that the value is a valid absolute path
-    def _validate(self, value: str):
-        # Verify DirectoryAbsolutePathVar validation
-        if not super()._validate(value):
-            return False
-        # Verify that the path contains a manifest.json file
-        if not os.path.isfile(value + "/manifest.json"):
-            return False
-        return True
-
 class Task(ATask):
     # Setup configs list
     setup_configs = [
@@ -61,7 +36,7 @@ class Task(ATask):
             # Save the configuration
             self.save_config()
             # Advise the user
-            print("No instance includes list found in the configuration file. Set config with defaults includes. You can change it in the configuration file.")
+            log.warning("No instance includes list found in the configuration file. Set config with defaults includes. You can change it in the configuration file.")
         
         # Get the instance includes list
         instance_includes_list = self.config["instance_includes_list"]
@@ -89,6 +64,7 @@ class Task(ATask):
         FilesFunctions.remove_dir(mmc_minecraft_path + "/resourcepacks", "resourcepacks")
         # Always remove the shaderpacks folder
         FilesFunctions.remove_dir(mmc_minecraft_path + "/shaderpacks", "shaderpacks")
+        log_stage_summary("remove")
 
         # Copy the files from the CurseForge instance to the MultiMC instance
         for included_file in instance_includes_list:
@@ -103,3 +79,4 @@ class Task(ATask):
             elif os.path.isfile(from_path):
                 # Copy the file
                 FilesFunctions.copy_file(from_path, to_path, included_file, included_file)
+        log_stage_summary("copy")
@@ -0,0 +1,180 @@
+from contextlib import contextmanager
+from threading import RLock
+from typing import Any, Dict, Optional, Tuple
+import copy
+import json
+import os
+
+from ModpackCreator.const import CONFIG_PATH
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Lock file of a config, next to it: the config itself is replaced on every write, a lock on it would be lost
+LOCK_SUFFIX = ".lock"
+# Pending value of a deleted key
+DELETED = object()
+
+# Exclusive lock between processes, held while the config is read, changed and written back
+@contextmanager
+def file_lock(path: str):
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Write a config atomically, under its lock: a reader sees the old file or the new one, never a partial one.
+# No tempfile: the CLI imports this module on every start. The usual permissions, the umask applies.
+def write_config(path: str, config: Dict):
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(config, f, indent=4)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class ConfigStore:
+    # config.json of a run, parsed once and parsed again only when its mtime or size changes. The changes are kept
+    # until they are saved, right away or at the end of a batch(). A save locks the config, reads it again if another
+    # process wrote it, applies the changes over it and replaces the file atomically: two processes changing
+    # different keys don't lose each other's changes.
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self.lock = RLock()
+        self.config: Dict[str, Any] = {}
+        # (mtime_ns, size) of the file parsed, None before the first load or without file
+        self.signature: Optional[Tuple[int, int]] = None
+        self.loaded = False
+        # {name: value or DELETED} set and not saved yet
+        self.pending: Dict[str, Any] = {}
+        self.batch_depth = 0
+        self.reads = 0
+        self.writes = 0
+
+    def file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    # Parse the config again if the file changed since the last parse
+    def refresh(self):
+        signature = self.file_signature()
+        if self.loaded and signature == self.signature:
+            return
+        if signature is None:
+            config = {}
+        else:
+            with open(self.path, "r") as f:
+                config = json.load(f)
+            self.reads += 1
+        self.config = config
+        self.signature = signature
+        self.loaded = True
+
+    # Copy of the config, with the changes not saved yet
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            self.refresh()
+            return copy.deepcopy(self.applied())
+
+    # Config with the pending changes applied, not copied. Under the lock.
+    def applied(self) -> Dict[str, Any]:
+        config = dict(self.config)
+        for name, value in self.pending.items():
+            if value is DELETED:
+                config.pop(name, None)
+            else:
+                config[name] = value
+        return config
+
+    def get(self, name: str, default: Any = None) -> Any:
+        with self.lock:
+            if name in self.pending:
+                return default if self.pending[name] is DELETED else self.pending[name]
+            self.refresh()
+            return self.config.get(name, default)
+
+    def __contains__(self, name: str) -> bool:
+        with self.lock:
+            self.refresh()
+            if name in self.pending:
+                return self.pending[name] is not DELETED
+            return name in self.config
+
+    def set(self, name: str, value: Any):
+        self.update({name: value})
+
+    # Set the values that changed, saved now unless in a batch
+    def update(self, values: Dict[str, Any]):
+        with self.lock:
+            self.refresh()
+            for name, value in values.items():
+                if name in self.pending or self.config.get(name, object()) != value:
+                    self.pending[name] = copy.deepcopy(value)
+            if self.batch_depth == 0:
+                self.save()
+
+    # Remove keys from the config, saved now unless in a batch
+    def delete(self, names):
+        with self.lock:
+            self.refresh()
+            for name in names:
+                if name in self.config or name in self.pending:
+                    self.pending[name] = DELETED
+            if self.batch_depth == 0:
+                self.save()
+
+    def save(self):
+        with self.lock:
+            if not self.pending:
+                return
+            with file_lock(self.path + LOCK_SUFFIX):
+                self.refresh()
+                config = self.applied()
+                write_config(self.path, config)
+                self.writes += 1
+                self.config = config
+                self.signature = self.file_signature()
+                self.pending = {}
+
+    # Changes of the block saved once, at its end. Also when the block raises: the values set are valid ones.
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.save()
+
+# Store shared by the tasks of a run, per config path
+stores: Dict[str, ConfigStore] = {}
+
+def config_store(path: str = CONFIG_PATH) -> ConfigStore:
+    key = os.path.abspath(path)
+    if key not in stores:
+        stores[key] = ConfigStore(path)
+    return stores[key]
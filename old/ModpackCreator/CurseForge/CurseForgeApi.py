@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional
+
+from ModpackCreator.Http.HttpSession import HttpSession
+from ModpackCreator.Modrinth.ModrinthApi import ResolvedFile, map_requests
+
+# Official API, needs a key (https://console.curseforge.com)
+DEFAULT_BASE_URL = "https://api.curseforge.com"
+MINECRAFT_GAME_ID = 432
+# Fingerprints and mod ids sent per request
+FINGERPRINTS_PER_REQUEST = 500
+# Latest files of a mod listed for the loose matching
+FILES_PER_REQUEST = 50
+# Algorithm ids of file hashes
+HASH_ALGO_SHA1 = 1
+
+PROVIDER_CURSEFORGE = "curseforge"
+
+# Sides are not published by CurseForge
+DEFAULT_ENV = {"client": "required", "server": "required"}
+
+# Find the CurseForge files with these fingerprints, {fingerprint: sha1} -> {sha1: ResolvedFile}.
+# Files without a download URL (the author disabled third party downloads) are not resolved.
+def resolve_fingerprints(sha1_by_fingerprint: Dict[int, str], api_key: str, base_url: str = DEFAULT_BASE_URL, session: Optional[HttpSession] = None) -> Dict[str, ResolvedFile]:
+    session = session or HttpSession()
+    headers = {"x-api-key": api_key}
+    fingerprints = sorted(sha1_by_fingerprint)
+    batches = [fingerprints[i:i + FINGERPRINTS_PER_REQUEST] for i in range(0, len(fingerprints), FINGERPRINTS_PER_REQUEST)]
+    files = {}
+    for answer in map_requests(session, lambda batch: session.request_json("POST", f"{base_url}/v1/fingerprints/{MINECRAFT_GAME_ID}", {"fingerprints": batch}, headers), batches):
+        for match in answer["data"].get("exactMatches", []):
+            file = match["file"]
+            if file.get("fileFingerprint") in sha1_by_fingerprint and file.get("downloadUrl"):
+                files[file["fileFingerprint"]] = file
+    mod_ids = sorted({file["modId"] for file in files.values()})
+    batches = [mod_ids[i:i + FINGERPRINTS_PER_REQUEST] for i in range(0, len(mod_ids), FINGERPRINTS_PER_REQUEST)]
+    mods = {}
+    for answer in map_requests(session, lambda batch: session.request_json("POST", f"{base_url}/v1/mods", {"modIds": batch}, headers), batches):
+        for mod in answer["data"]:
+            mods[mod["id"]] = mod
+    resolved = {}
+    for fingerprint, file in files.items():
+        sha1 = sha1_by_fingerprint[fingerprint]
+        # The fingerprint ignores whitespace bytes: the sha1, when given, must match too
+        file_sha1s = [file_hash["value"] for file_hash in file.get("hashes", []) if file_hash.get("algo") == HASH_ALGO_SHA1]
+        if file_sha1s and sha1 not in file_sha1s:
+            continue
+        title = mods.get(file["modId"], {}).get("name", file["fileName"])
+        resolved[sha1] = ResolvedFile(sha1, "", file["downloadUrl"], file["fileLength"], str(file["modId"]), str(file["id"]), title, dict(DEFAULT_ENV), PROVIDER_CURSEFORGE)
+    return resolved
+
+# Files of mods found by name: {(mod id, file name): ResolvedFile}, with the sha1 of the published file.
+# A request per mod for its latest files, at the same time.
+def resolve_file_names(file_names_by_mod: Dict[str, List[str]], api_key: str, base_url: str = DEFAULT_BASE_URL, session: Optional[HttpSession] = None) -> Dict[tuple, ResolvedFile]:
+    session = session or HttpSession()
+    headers = {"x-api-key": api_key}
+    mod_ids = sorted(file_names_by_mod)
+    answers = map_requests(session, lambda mod_id: session.request_json("GET", f"{base_url}/v1/mods/{mod_id}/files?pageSize={FILES_PER_REQUEST}", None, headers, True), mod_ids)
+    resolved = {}
+    for mod_id, answer in zip(mod_ids, answers):
+        if answer is None:
+            continue
+        wanted = set(file_names_by_mod[mod_id])
+        for file in answer["data"]:
+            sha1s = [file_hash["value"] for file_hash in file.get("hashes", []) if file_hash.get("algo") == HASH_ALGO_SHA1]
+            key = (mod_id, file["fileName"])
+            if file["fileName"] in wanted and file.get("downloadUrl") and sha1s and key not in resolved:
+                resolved[key] = ResolvedFile(sha1s[0], "", file["downloadUrl"], file["fileLength"], str(mod_id), str(file["id"]), file["fileName"], dict(DEFAULT_ENV), PROVIDER_CURSEFORGE)
+    return resolved
@@ -0,0 +1,396 @@
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Event, Process, Queue
+from threading import Lock, Thread
+from typing import Deque, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+import json
+import os
+import re
+import shutil
+import signal
+import time
+
+from ModpackCreator.Batch.BatchBuild import load_script, prepare_workspace, workspace_config
+from ModpackCreator.Logging.BuildLog import LEVELS, close_logging, log
+from ModpackCreator.Resolver.ResolutionLock import LOCK_FILE_NAME, merge_lock
+
+# Workspaces of the workers, logs and lockfiles of the builds, under the directory of the pack
+DAEMON_DIR = "temp/daemon"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Finished builds kept for the status requests, and durations kept for the latency metrics
+HISTORY = 500
+LATENCY_SAMPLES = 200
+# Seconds between two reads of the log of a running build, for the log stream
+LOG_POLL_INTERVAL = 0.2
+# Seconds given to the workers to finish their build when the daemon stops
+STOP_TIMEOUT = 30
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+BUILD_PATH = re.compile(r"^/builds/(\d+)(/log|/cancel)?$")
+
+class DaemonBuild:
+    # A build submitted to the daemon, from the queue to its end
+
+    def __init__(self, build_id: str, zip_name: str, version: str, options: Dict, log_path: str):
+        self.id = build_id
+        self.zip_name = zip_name
+        self.version = version
+        self.options = options
+        self.log_path = log_path
+        self.status = QUEUED
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+        self.worker: Optional[int] = None
+        self.error: Optional[str] = None
+        self.cancel_requested = False
+
+    def to_json(self) -> Dict:
+        return {
+            "id": self.id,
+            "export": self.zip_name,
+            "version": self.version,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "ended": self.ended,
+            "queue_seconds": round(self.started - self.submitted, 3) if self.started else round(time.time() - self.submitted, 3) if self.status == QUEUED else None,
+            "build_seconds": round((self.ended or time.time()) - self.started, 3) if self.started else None,
+            "worker": self.worker,
+            "error": self.error,
+        }
+
+def percentiles(samples: Deque[float]) -> Dict:
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {"count": len(ordered), "p50": round(ordered[len(ordered) // 2], 3), "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3), "max": round(ordered[-1], 3)}
+
+# Process building the jobs of one workspace, one at a time. The script is loaded once: its config, hash cache,
+# lookups, ZipIndex and HTTP connections stay warm from one build to the next.
+def worker_main(number: int, script_path: str, workspace: str, root: str, jobs: Queue, results: Queue, cancel):
+    # Ctrl-C stops the daemon, which stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.chdir(workspace)
+    if os.path.isfile(os.path.join(root, LOCK_FILE_NAME)):
+        shutil.copyfile(os.path.join(root, LOCK_FILE_NAME), LOCK_FILE_NAME)
+    module = load_script(script_path)
+    resident = module.ResidentState()
+    try:
+        # The event is cleared by the daemon when it dispatches a job, never here: a cancel sent before the job is
+        # taken from the queue would be lost
+        for build_id, zip_name, options, log_path in iter(jobs.get, None):
+            start = time.perf_counter()
+            error = None
+            with open(log_path, "w") as log_file:
+                try:
+                    module.build(zip_name, False, options.get("trace", False), options.get("log_level"), log_file, resident, cancel)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                finally:
+                    close_logging()
+            # Copied for the daemon to merge: the resident lockfile rewrites it whole on the next build
+            lock_path = None
+            if os.path.isfile(LOCK_FILE_NAME):
+                lock_path = os.path.join(root, DAEMON_DIR, "locks", build_id + ".json")
+                os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+                shutil.copyfile(LOCK_FILE_NAME, lock_path)
+            results.put((number, build_id, error, time.perf_counter() - start, lock_path))
+    finally:
+        resident.close()
+
+class BuildDaemon:
+    # Builds submitted through a local HTTP/JSON API, by at most max_builds resident worker processes. Each worker
+    # builds in its own workspace (like the batch mode) and keeps its caches warm between builds. Two builds of the
+    # same version never run at the same time. The lockfile entries found by a build are merged in the lockfile of
+    # the pack when it ends.
+    #
+    # POST /builds {"export": "Pack-1.2.0.zip", "log_level": "debug", "trace": true}   submit, 202 and the build
+    # GET  /builds, GET /builds/<id>                                                   status
+    # GET  /builds/<id>/log[?follow=0]                                                 log, streamed until the end
+    # POST /builds/<id>/cancel                                                         cancel, at the next stage
+    # GET  /metrics                                                                    queue depth, latencies
+
+    def __init__(self, script_path: str, config: Dict, version_pattern: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, max_builds: int = 1, token: Optional[str] = None):
+        self.script_path = script_path
+        self.config = config
+        self.version_pattern = version_pattern
+        self.host = host
+        self.port = port
+        self.max_builds = max(max_builds, 1)
+        self.token = token
+        self.root = os.getcwd()
+        self.lock = Lock()
+        self.builds: "OrderedDict[str, DaemonBuild]" = OrderedDict()
+        self.queue: Deque[DaemonBuild] = deque()
+        self.next_id = 1
+        # Build running on each worker, None when idle
+        self.running: List[Optional[DaemonBuild]] = [None] * self.max_builds
+        self.queue_seconds: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.build_seconds: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.counts = {status: 0 for status in FINISHED}
+        self.started = time.time()
+        self.workers: List[Process] = []
+        self.jobs: List[Queue] = []
+        self.cancels = []
+        self.results = Queue()
+        self.collector = Thread(target=self.collect_results, name="build-results", daemon=True)
+        self.server = None
+
+    def start(self) -> "BuildDaemon":
+        os.makedirs(os.path.join(self.root, DAEMON_DIR, "logs"), exist_ok=True)
+        shared_config = workspace_config(self.config, self.root, self.max_builds)
+        for number in range(self.max_builds):
+            workspace = os.path.join(self.root, DAEMON_DIR, f"worker-{number}")
+            prepare_workspace(workspace, self.root, shared_config)
+            jobs = Queue()
+            cancel = Event()
+            worker = Process(target=worker_main, args=(number, self.script_path, workspace, self.root, jobs, self.results, cancel), name=f"build-worker-{number}", daemon=False)
+            worker.start()
+            self.workers.append(worker)
+            self.jobs.append(jobs)
+            self.cancels.append(cancel)
+        self.collector.start()
+        self.server = ThreadingHTTPServer((self.host, self.port), make_handler(self))
+        self.server.daemon_threads = True
+        log.info(f"Build daemon listening on http://{self.host}:{self.server.server_address[1]}, {self.max_builds} concurrent build(s)")
+        return self
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            log.info("Stopping the build daemon")
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            for build in self.queue:
+                build.status = CANCELLED
+                build.ended = time.time()
+            self.queue.clear()
+            for number, build in enumerate(self.running):
+                if build is not None:
+                    build.cancel_requested = True
+                    self.cancels[number].set()
+        for jobs in self.jobs:
+            jobs.put(None)
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for worker in self.workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        # After the results of the last builds
+        self.results.put(None)
+        self.collector.join()
+
+    # Validate and queue an export of the exports directory
+    def submit(self, zip_name: str, options: Dict) -> DaemonBuild:
+        if not isinstance(zip_name, str) or not zip_name:
+            raise ValueError("\"export\" is required: the name of a zip in the exports directory")
+        path = os.path.normpath(os.path.join(self.root, "exports", zip_name))
+        if os.path.dirname(path) != os.path.join(self.root, "exports") and not path.startswith(os.path.join(self.root, "exports") + os.sep):
+            raise ValueError(f"{zip_name} isn't in the exports directory")
+        if not os.path.isfile(path):
+            raise ValueError(f"The export '{zip_name}' doesn't exist")
+        version = re.search(self.version_pattern, zip_name)
+        if version is None:
+            raise ValueError(f"{zip_name} has no version in its name")
+        if options.get("log_level") is not None and options["log_level"] not in LEVELS:
+            raise ValueError(f"\"log_level\" expects one of {', '.join(LEVELS)}")
+        with self.lock:
+            build_id = str(self.next_id)
+            self.next_id += 1
+            build = DaemonBuild(build_id, zip_name, version.group(0), {"log_level": options.get("log_level"), "trace": bool(options.get("trace", False))}, os.path.join(self.root, DAEMON_DIR, "logs", build_id + ".log"))
+            self.builds[build_id] = build
+            self.queue.append(build)
+            self.forget_old_builds()
+            self.dispatch()
+        log.info(f"Build {build.id} of {zip_name} submitted, {len(self.queue)} queued")
+        return build
+
+    def get(self, build_id: str) -> Optional[DaemonBuild]:
+        with self.lock:
+            return self.builds.get(build_id)
+
+    def list(self) -> List[Dict]:
+        with self.lock:
+            return [build.to_json() for build in self.builds.values()]
+
+    # A queued build is removed from the queue, a running one is stopped at its next stage
+    def cancel(self, build_id: str) -> Optional[DaemonBuild]:
+        with self.lock:
+            build = self.builds.get(build_id)
+            if build is None or build.status in FINISHED:
+                return build
+            build.cancel_requested = True
+            if build.status == QUEUED:
+                self.queue.remove(build)
+                build.status = CANCELLED
+                build.ended = time.time()
+                self.counts[CANCELLED] += 1
+            else:
+                self.cancels[build.worker].set()
+        log.info(f"Build {build_id} cancelled")
+        return build
+
+    # Start the queued builds on the idle workers, in order, skipping the versions already being built. Under the lock.
+    def dispatch(self):
+        for number, running in enumerate(self.running):
+            if running is not None:
+                continue
+            busy_versions = {build.version for build in self.running if build is not None}
+            build = next((build for build in self.queue if build.version not in busy_versions), None)
+            if build is None:
+                return
+            self.queue.remove(build)
+            build.status = RUNNING
+            build.started = time.time()
+            build.worker = number
+            self.running[number] = build
+            self.queue_seconds.append(build.started - build.submitted)
+            # Before the job is queued: a cancel of this build from now on stops it
+            self.cancels[number].clear()
+            self.jobs[number].put((build.id, build.zip_name, build.options, build.log_path))
+
+    def collect_results(self):
+        for number, build_id, error, seconds, lock_path in iter(self.results.get, None):
+            if lock_path is not None:
+                try:
+                    merge_lock(lock_path, os.path.join(self.root, LOCK_FILE_NAME))
+                finally:
+                    os.remove(lock_path)
+            with self.lock:
+                build = self.builds.get(build_id) or self.running[number]
+                build.ended = time.time()
+                build.error = error
+                build.status = DONE if error is None else CANCELLED if build.cancel_requested else FAILED
+                self.counts[build.status] += 1
+                self.build_seconds.append(seconds)
+                self.running[number] = None
+                self.dispatch()
+            log.info(f"Build {build.id} of {build.zip_name} {build.status} in {seconds:.1f}s" + (f": {error}" if error and build.status == FAILED else ""))
+
+    # Under the lock
+    def forget_old_builds(self):
+        finished = [build_id for build_id, build in self.builds.items() if build.status in FINISHED]
+        for build_id in finished[:max(len(finished) - HISTORY, 0)]:
+            del self.builds[build_id]
+
+    def metrics(self) -> Dict:
+        with self.lock:
+            return {
+                "queue_depth": len(self.queue),
+                "running": sum(1 for build in self.running if build is not None),
+                "max_builds": self.max_builds,
+                "finished": dict(self.counts),
+                "queue_seconds": percentiles(self.queue_seconds),
+                "build_seconds": percentiles(self.build_seconds),
+                "uptime_seconds": round(time.time() - self.started, 3),
+            }
+
+def make_handler(daemon: BuildDaemon):
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            log.debug(f"{self.address_string()} {format % args}")
+
+        def send_json(self, status: int, content):
+            data = json.dumps(content).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def authorized(self) -> bool:
+            if daemon.token is None or self.headers.get("Authorization") == f"Bearer {daemon.token}":
+                return True
+            self.send_json(401, {"error": "unauthorized"})
+            return False
+
+        def stream_log(self, build: DaemonBuild, follow: bool):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.end_headers()
+            offset = 0
+            while True:
+                # Read after the status: the last read of a finished build has all its lines
+                finished = build.status in FINISHED
+                if os.path.isfile(build.log_path):
+                    with open(build.log_path, "rb") as f:
+                        f.seek(offset)
+                        data = f.read()
+                    if data:
+                        self.wfile.write(data)
+                        self.wfile.flush()
+                        offset += len(data)
+                if finished or not follow:
+                    return
+                time.sleep(LOG_POLL_INTERVAL)
+
+        def do_GET(self):
+            if not self.authorized():
+                return
+            parts = urlsplit(self.path)
+            if parts.path == "/metrics":
+                self.send_json(200, daemon.metrics())
+                return
+            if parts.path == "/builds":
+                self.send_json(200, {"builds": daemon.list()})
+                return
+            match = BUILD_PATH.match(parts.path)
+            build = daemon.get(match.group(1)) if match and match.group(2) != "/cancel" else None
+            if build is None:
+                self.send_json(404, {"error": "not_found"})
+                return
+            if match.group(2) == "/log":
+                self.stream_log(build, parse_qs(parts.query).get("follow", ["1"])[0] != "0")
+                return
+            self.send_json(200, build.to_json())
+
+        def do_POST(self):
+            if not self.authorized():
+                return
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length)) if length else {}
+            except ValueError:
+                self.send_json(400, {"error": "the body isn't JSON"})
+                return
+            if not isinstance(body, dict):
+                self.send_json(400, {"error": "the body isn't a JSON object"})
+                return
+            if parts.path == "/builds":
+                try:
+                    build = daemon.submit(body.get("export"), body)
+                except ValueError as e:
+                    self.send_json(400, {"error": str(e)})
+                    return
+                self.send_json(202, build.to_json())
+                return
+            match = BUILD_PATH.match(parts.path)
+            if match is None or match.group(2) != "/cancel":
+                self.send_json(404, {"error": "not_found"})
+                return
+            build = daemon.cancel(match.group(1))
+            if build is None:
+                self.send_json(404, {"error": "not_found"})
+                return
+            self.send_json(200 if build.cancel_requested else 409, build.to_json())
+
+    return Handler
@@ -0,0 +1,163 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+from array import array
+import os
+import sys
+
+# Optional: vectorized fingerprints. Without NumPy, the pure Python version gives the same values, slower.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# CurseForge fingerprint: MurmurHash2, seed 1, of the file without these bytes (tab, LF, CR, space)
+WHITESPACE = b"\t\n\r "
+SEED = 1
+M = 0x5BD1E995
+MASK = 0xFFFFFFFF
+# Below this size the NumPy version costs more than it saves
+NUMPY_MIN_SIZE = 64 * 1024
+# Blocks of 4 bytes processed together by the NumPy version: 4 MB of data, 8 MB of bit planes
+NUMPY_CHUNK_BLOCKS = 1 << 20
+
+def finalize(h: int, tail: bytes) -> int:
+    # Last 1 to 3 bytes, then the final mix
+    if len(tail) == 3:
+        h ^= tail[2] << 16
+    if len(tail) >= 2:
+        h ^= tail[1] << 8
+    if len(tail) >= 1:
+        h ^= tail[0]
+        h = (h * M) & MASK
+    h ^= h >> 13
+    h = (h * M) & MASK
+    h ^= h >> 15
+    return h
+
+def murmur2_python(data: bytes, seed: int = SEED) -> int:
+    h = (seed ^ len(data)) & MASK
+    block_end = len(data) - len(data) % 4
+    blocks = array("I", data[:block_end])
+    if sys.byteorder == "big":
+        blocks.byteswap()
+    for k in blocks:
+        k = (k * M) & MASK
+        k ^= k >> 24
+        h = ((h * M) & MASK) ^ ((k * M) & MASK)
+    return finalize(h, data[block_end:])
+
+def murmur2_numpy(data: bytes, seed: int = SEED) -> int:
+    # h(i + 1) = h(i) * M ^ k(i) is sequential, but bit j of h(i + 1) only depends on the bits 0..j of h(i). M being odd:
+    #   bit j of h(i + 1) = bit j of (M * (h(i) mod 2^j)) ^ bit j of h(i) ^ bit j of k(i)
+    # Once the lower bits of every h(i) are known, bit j of all of them is a prefix XOR. The blocks are processed
+    # bit sliced: plane t holds bit t of every value, 64 blocks per uint64, and M * (h(i) mod 2^j) is kept up to
+    # date with a bit sliced addition after each bit.
+    h = (seed ^ len(data)) & MASK
+    block_end = len(data) - len(data) % 4
+    blocks = numpy.frombuffer(data, dtype="<u4", count=block_end // 4)
+    m = numpy.uint32(M)
+    one = numpy.uint64(1)
+    top = numpy.uint64(63)
+    prefix_shifts = [numpy.uint64(1 << s) for s in range(6)]
+    for start in range(0, len(blocks), NUMPY_CHUNK_BLOCKS):
+        count = min(NUMPY_CHUNK_BLOCKS, len(blocks) - start)
+        words = -(-count // 64)
+        # k of each block, padded to whole words: the padding comes after the last block and doesn't change it
+        k = numpy.zeros(words * 64, dtype="<u4")
+        k[:count] = blocks[start:start + count]
+        k *= m
+        k ^= k >> numpy.uint32(24)
+        k *= m
+        # Planes of k
+        k_bytes = numpy.ascontiguousarray(k.view(numpy.uint8).reshape(-1, 4).T)
+        k_planes = numpy.empty((32, words), dtype="<u8")
+        flags = numpy.empty(words * 64, dtype=bool)
+        for t in range(32):
+            numpy.bitwise_and(k_bytes[t // 8], numpy.uint8(1 << (t % 8)), out=flags, casting="unsafe")
+            k_planes[t] = numpy.packbits(flags, bitorder="little").view("<u8")
+        # Planes of M * (h(i) mod 2^j)
+        product = numpy.zeros((32, words), dtype="<u8")
+        bits = numpy.empty(words, dtype="<u8")
+        previous = numpy.empty(words, dtype="<u8")
+        temp = numpy.empty(words, dtype="<u8")
+        carry = numpy.empty(words, dtype="<u8")
+        next_carry = numpy.empty(words, dtype="<u8")
+        last_word, last_bit = divmod(count - 1, 64)
+        new_h = 0
+        for j in range(32):
+            first_bit = (h >> j) & 1
+            # bits: bit j of h(i + 1), prefix XOR inside each word then across the words
+            numpy.bitwise_xor(product[j], k_planes[j], out=bits)
+            for shift in prefix_shifts:
+                numpy.left_shift(bits, shift, out=temp)
+                bits ^= temp
+            temp[0] = first_bit
+            if words > 1:
+                numpy.right_shift(bits[:-1], top, out=temp[1:])
+                numpy.bitwise_xor.accumulate(temp, out=temp)
+            # 0 or all ones
+            numpy.negative(temp, out=temp)
+            bits ^= temp
+            new_h |= ((int(bits[last_word]) >> last_bit) & 1) << j
+            if j == 31:
+                break
+            # previous: bit j of h(i), the bits shifted by one block
+            numpy.left_shift(bits, one, out=previous)
+            if words > 1:
+                numpy.right_shift(bits[:-1], top, out=temp[:-1])
+                previous[1:] |= temp[:-1]
+            previous[0] |= numpy.uint64(first_bit)
+            # product += (M << j) where previous is set, planes j + 1..31; plane j (bit 0 of M) only gives a carry
+            added = (M << j) & MASK
+            numpy.bitwise_and(product[j], previous, out=carry)
+            for t in range(j + 1, 32):
+                plane = product[t]
+                if t == 31:
+                    # No carry out of the last plane
+                    if (added >> t) & 1:
+                        plane ^= previous
+                    plane ^= carry
+                elif (added >> t) & 1:
+                    # Full adder, carry = majority(plane, previous, carry) = plane ^ ((plane ^ carry) & (plane ^ previous))
+                    numpy.bitwise_xor(plane, previous, out=temp)
+                    numpy.bitwise_xor(plane, carry, out=next_carry)
+                    next_carry &= temp
+                    next_carry ^= plane
+                    numpy.bitwise_xor(temp, carry, out=plane)
+                    carry, next_carry = next_carry, carry
+                else:
+                    numpy.bitwise_and(plane, carry, out=next_carry)
+                    plane ^= carry
+                    carry, next_carry = next_carry, carry
+        h = new_h
+    return finalize(h, data[block_end:])
+
+def murmur2(data: bytes, seed: int = SEED) -> int:
+    if numpy is not None and len(data) >= NUMPY_MIN_SIZE:
+        return murmur2_numpy(data, seed)
+    return murmur2_python(data, seed)
+
+# CurseForge fingerprint of a file content
+def fingerprint(content: bytes) -> int:
+    return murmur2(content.translate(None, WHITESPACE))
+
+def fingerprint_path(path: str) -> int:
+    with open(path, "rb") as f:
+        return fingerprint(f.read())
+
+# Fingerprints of several contents, in a process pool: the pure Python version holds the GIL
+def fingerprint_contents(contents: Iterable[bytes], workers: Optional[int] = None) -> List[int]:
+    contents = list(contents)
+    workers = min(workers or os.cpu_count() or 1, len(contents))
+    if workers <= 1:
+        return [fingerprint(content) for content in contents]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fingerprint, contents))
+
+def fingerprint_paths(paths: Iterable[str], workers: Optional[int] = None) -> List[int]:
+    paths = list(paths)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        return [fingerprint_path(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fingerprint_path, paths))
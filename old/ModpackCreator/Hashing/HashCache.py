@@ -0,0 +1,254 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import time
+import zipfile
+
+from ModpackCreator.Hashing.Fingerprint import fingerprint
+
+# Default location of the cache
+DEFAULT_CACHE_PATH = "temp/hash_cache.sqlite"
+# Digests stored for each file, as hex strings
+ALGORITHMS = ("sha1", "sha512", "sha256")
+# Keys per query, below the SQLite variable limit
+KEYS_PER_QUERY = 400
+# Seconds a writer waits for another process holding the database
+BUSY_TIMEOUT = 30
+# Seconds the last use of a row can lag behind: prune() keeps rows for days, a lookup doesn't write a more recent use
+USED_RESOLUTION = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL, sha512 TEXT NOT NULL, sha256 TEXT NOT NULL, murmur2 INTEGER,
+    used REAL NOT NULL,
+    PRIMARY KEY (path, size, mtime_ns)
+);
+CREATE TABLE IF NOT EXISTS entry_hashes (
+    crc32 INTEGER NOT NULL, size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL, sha512 TEXT NOT NULL, sha256 TEXT NOT NULL, murmur2 INTEGER,
+    used REAL NOT NULL,
+    PRIMARY KEY (crc32, size)
+);
+"""
+
+class Hashes:
+    # Digests of a content
+    __slots__ = ("sha1", "sha512", "sha256", "murmur2")
+
+    def __init__(self, sha1: str, sha512: str, sha256: str, murmur2: Optional[int] = None):
+        self.sha1 = sha1
+        self.sha512 = sha512
+        self.sha256 = sha256
+        # CurseForge fingerprint, only computed when asked for
+        self.murmur2 = murmur2
+
+def hash_content(content: bytes) -> Hashes:
+    # hashlib releases the GIL on big buffers, the threads of a pool hash in parallel
+    return Hashes(hashlib.sha1(content).hexdigest(), hashlib.sha512(content).hexdigest(), hashlib.sha256(content).hexdigest())
+
+def hash_path(path: str) -> Hashes:
+    with open(path, "rb") as f:
+        return hash_content(f.read())
+
+# (zipinfo, Hashes) of an entry read by hash_zip_entries: the cached digests or the computed ones, and the fingerprint
+def collect_hashes(zipinfo: zipfile.ZipInfo, known: Optional[Hashes], hashes_future: Optional[Future], fingerprint_future: Optional[Future]) -> Tuple[zipfile.ZipInfo, Hashes]:
+    hashes = known if hashes_future is None else hashes_future.result()
+    if fingerprint_future is not None:
+        hashes = Hashes(hashes.sha1, hashes.sha512, hashes.sha256, fingerprint_future.result())
+    return zipinfo, hashes
+
+class HashCache:
+    # SQLite cache of the digests of files, keyed by (path, size, mtime) for files on disk and by (CRC32, size)
+    # for zip entries. Several processes can use the same database: WAL journal, writers wait for each other.
+    # A long-running process keeps the rows it read or wrote in memory, its next builds don't query them again.
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, keep_in_memory: bool = False):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.lock = Lock()
+        # {(table, key): Hashes} of the rows already read or written
+        self.memory: Optional[Dict[Tuple, Hashes]] = {} if keep_in_memory else None
+        # {(table, key): last use} of the rows read or written, and of the uses not written yet. The uses are
+        # written at once by flush_used(), not by each lookup: the workers of a batch don't wait for each other.
+        self.last_used: Dict[Tuple, float] = {}
+        self.pending_used: Dict[Tuple, float] = {}
+        self.reset_counters()
+
+    # Counters of this process, or of the current build of a long-running one
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.hashed_size = 0
+
+    def close(self):
+        self.flush_used()
+        self.connection.close()
+
+    # Write the last use of the rows looked up, in one transaction
+    def flush_used(self):
+        with self.lock:
+            if not self.pending_used:
+                return
+            for table, columns in (("file_hashes", ("path", "size", "mtime_ns")), ("entry_hashes", ("crc32", "size"))):
+                key_condition = "(" + ", ".join(columns) + ")"
+                row_values = "(" + ", ".join("?" * len(columns)) + ")"
+                self.connection.executemany(f"UPDATE {table} SET used = ? WHERE {key_condition} = {row_values}",
+                                            [(used, *key) for (row_table, key), used in self.pending_used.items() if row_table == table])
+            self.connection.commit()
+            self.pending_used = {}
+
+    def _select(self, table: str, columns: Tuple[str, ...], keys: List[Tuple]) -> Dict[Tuple, Hashes]:
+        found = {}
+        key_condition = "(" + ", ".join(columns) + ")"
+        row_values = "(" + ", ".join("?" * len(columns)) + ")"
+        with self.lock:
+            if self.memory is not None:
+                for key in keys:
+                    hashes = self.memory.get((table, key))
+                    if hashes is not None:
+                        found[key] = hashes
+                keys = [key for key in keys if key not in found]
+            for i in range(0, len(keys), KEYS_PER_QUERY):
+                batch = keys[i:i + KEYS_PER_QUERY]
+                query = f"SELECT {', '.join(columns)}, sha1, sha512, sha256, murmur2, used FROM {table} WHERE {key_condition} IN (VALUES {', '.join([row_values] * len(batch))})"
+                for row in self.connection.execute(query, [value for key in batch for value in key]):
+                    key = tuple(row[:len(columns)])
+                    found[key] = Hashes(*row[len(columns):-1])
+                    self.last_used[(table, key)] = row[-1]
+                    if self.memory is not None:
+                        self.memory[(table, key)] = found[key]
+            # Last use, to prune the old rows, written later and only once a day per row
+            now = time.time()
+            for key in found:
+                if now - self.last_used.get((table, key), 0) > USED_RESOLUTION:
+                    self.last_used[(table, key)] = now
+                    self.pending_used[(table, key)] = now
+        return found
+
+    def _insert(self, table: str, columns: Tuple[str, ...], rows: List[Tuple[Tuple, Hashes]]):
+        if not rows:
+            return
+        placeholders = ", ".join("?" * (len(columns) + 5))
+        now = time.time()
+        with self.lock:
+            # One transaction per batch: other processes wait BUSY_TIMEOUT at most
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}, sha1, sha512, sha256, murmur2, used) VALUES ({placeholders})",
+                [(*key, hashes.sha1, hashes.sha512, hashes.sha256, hashes.murmur2, now) for key, hashes in rows])
+            self.connection.commit()
+            for key, _ in rows:
+                self.last_used[(table, key)] = now
+                self.pending_used.pop((table, key), None)
+            if self.memory is not None:
+                self.memory.update(((table, key), hashes) for key, hashes in rows)
+
+    # Digests of files on disk, {path: Hashes}. Only the files not in the cache are read.
+    def hash_files(self, paths: Iterable[str], workers: Optional[int] = None) -> Dict[str, Hashes]:
+        keys = {}
+        for path in paths:
+            st = os.stat(path)
+            keys[path] = (os.path.normcase(os.path.abspath(path)), st.st_size, st.st_mtime_ns)
+        found = self._select("file_hashes", ("path", "size", "mtime_ns"), list(set(keys.values())))
+        missing = [path for path, key in keys.items() if key not in found]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+                hashed = list(zip(missing, pool.map(hash_path, missing)))
+            self.hashed_size += sum(keys[path][1] for path in missing)
+            self._insert("file_hashes", ("path", "size", "mtime_ns"), [(keys[path], hashes) for path, hashes in hashed])
+            for path, hashes in hashed:
+                found[keys[path]] = hashes
+        return {path: found[key] for path, key in keys.items()}
+
+    # Record the digests of files just written, {path: Hashes}: they won't be read by the next lookup
+    def add_files(self, hashes_by_path: Dict[str, Hashes]):
+        rows = []
+        for path, hashes in hashes_by_path.items():
+            st = os.stat(path)
+            rows.append(((os.path.normcase(os.path.abspath(path)), st.st_size, st.st_mtime_ns), hashes))
+        self._insert("file_hashes", ("path", "size", "mtime_ns"), rows)
+
+    # Digests of zip entries, {entry name: Hashes}. Only the entries not in the cache are read.
+    # With fingerprints, the CurseForge fingerprint (murmur2) is computed too, in a process pool, and the entries
+    # cached without one are read again for it.
+    # on_read(zipinfo, content) is called with the content of each entry read, so that it can be reused.
+    def hash_zip_entries(self, archive: zipfile.ZipFile, zipinfos: List[zipfile.ZipInfo], workers: Optional[int] = None, on_read: Optional[Callable] = None, fingerprints: bool = False) -> Dict[str, Hashes]:
+        workers = workers or os.cpu_count() or 1
+        keys = {zipinfo.filename: (zipinfo.CRC, zipinfo.file_size) for zipinfo in zipinfos}
+        found = self._select("entry_hashes", ("crc32", "size"), list(set(keys.values())))
+        missing = [zipinfo for zipinfo in zipinfos if keys[zipinfo.filename] not in found or (fingerprints and found[keys[zipinfo.filename]].murmur2 is None)]
+        self.hits += len(zipinfos) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            hashed = []
+            # Fingerprints hold the GIL without NumPy: processes, unless there is a single worker
+            process_pool = ProcessPoolExecutor(max_workers=workers) if fingerprints and workers > 1 else None
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = []
+                    for zipinfo in missing:
+                        # Read on this thread, zipfile isn't thread safe; hashed in the pool
+                        content = archive.read(zipinfo)
+                        if on_read is not None:
+                            on_read(zipinfo, content)
+                        known = found.get(keys[zipinfo.filename])
+                        hashes_future = pool.submit(hash_content, content) if known is None else None
+                        fingerprint_future = None
+                        if fingerprints:
+                            fingerprint_future = (process_pool or pool).submit(fingerprint, content)
+                        futures.append((zipinfo, known, hashes_future, fingerprint_future))
+                        # Wait for the oldest hashes, the contents don't pile up in memory
+                        while len(futures) > 2 * workers:
+                            hashed.append(collect_hashes(*futures.pop(0)))
+                    hashed += [collect_hashes(*future) for future in futures]
+            finally:
+                if process_pool is not None:
+                    process_pool.shutdown()
+            self.hashed_size += sum(zipinfo.file_size for zipinfo in missing)
+            self._insert("entry_hashes", ("crc32", "size"), [(keys[zipinfo.filename], hashes) for zipinfo, hashes in hashed])
+            for zipinfo, hashes in hashed:
+                found[keys[zipinfo.filename]] = hashes
+        return {name: found[key] for name, key in keys.items()}
+
+    # Remove the rows not used since max_age seconds
+    def prune(self, max_age: float) -> int:
+        self.flush_used()
+        limit = time.time() - max_age
+        with self.lock:
+            removed = sum(self.connection.execute(f"DELETE FROM {table} WHERE used < ?", (limit,)).rowcount for table in ("file_hashes", "entry_hashes"))
+            self.connection.commit()
+            if self.memory is not None:
+                self.memory.clear()
+        return removed
+
+    def summary(self) -> str:
+        return f"Hash cache: {self.hits} hits, {self.misses} misses, {self.hashed_size / 1024 / 1024:.1f} MB hashed"
+
+    # Content of the database, for the cache-stats command
+    def stats(self) -> str:
+        with self.lock:
+            file_rows = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(murmur2) FROM file_hashes").fetchone()
+            entry_rows = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(murmur2) FROM entry_hashes").fetchone()
+        database_size = sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal") if os.path.isfile(self.path + suffix))
+        return "\n".join([
+            f"Hash cache {self.path} ({database_size / 1024 / 1024:.1f} MB)",
+            f"  files on disk: {file_rows[0]} ({file_rows[1] / 1024 / 1024:.1f} MB hashed, {file_rows[2]} with a CurseForge fingerprint)",
+            f"  zip entries:   {entry_rows[0]} ({entry_rows[1] / 1024 / 1024:.1f} MB hashed, {entry_rows[2]} with a CurseForge fingerprint)",
+        ])
+
+# Cache of the config: {"hash_cache": "temp/hash_cache.sqlite"}. None if disabled with "hash_cache": null.
+def load_hash_cache(config: Dict, keep_in_memory: bool = False) -> Optional[HashCache]:
+    path = config.get("hash_cache", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    return HashCache(path, keep_in_memory)
@@ -0,0 +1,151 @@
+from http.client import HTTPConnection, HTTPException, HTTPResponse, HTTPSConnection
+from threading import Lock, Semaphore
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import json
+import random
+import time
+
+USER_AGENT = "HB-Modding-Crew/modpack-creator"
+# Answers worth another try: rate limited or a server having a bad time
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Seconds to wait given by the rate limit headers of a response, None if it doesn't ask to wait
+def rate_limit_delay(response: HTTPResponse) -> Optional[float]:
+    retry_after = response.getheader("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            return None
+    # Modrinth: X-Ratelimit-Remaining requests until X-Ratelimit-Reset seconds
+    remaining = response.getheader("X-Ratelimit-Remaining")
+    reset = response.getheader("X-Ratelimit-Reset")
+    if remaining is not None and reset is not None and remaining.strip() == "0":
+        try:
+            return max(float(reset), 0.0)
+        except ValueError:
+            return None
+    return None
+
+class HttpSession:
+    # JSON over HTTP with keep-alive connections shared by threads.
+    # At most max_connections requests run at the same time, each on its own connection, and a connection is reused
+    # by the next request to the same host. Failed requests are retried with an exponential backoff; when a server
+    # asks to wait (429, Retry-After, X-Ratelimit-*), every request of the session waits.
+
+    def __init__(self, max_connections: int = 4, retries: int = 4, backoff: float = 0.5, timeout: float = 30, headers: Optional[Dict[str, str]] = None):
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = {"User-Agent": USER_AGENT, "Accept": "application/json", **(headers or {})}
+        self.slots = Semaphore(max_connections)
+        self.lock = Lock()
+        # Idle connections by (scheme, host)
+        self.idle: Dict[Tuple[str, str], List[HTTPConnection]] = {}
+        # time.monotonic() before which no request is sent
+        self.blocked_until = 0.0
+        # Counters
+        self.requests = 0
+        self.connections = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connection(self, key: Tuple[str, str]) -> HTTPConnection:
+        with self.lock:
+            if self.idle.get(key):
+                return self.idle[key].pop()
+            self.connections += 1
+        scheme, host = key
+        if scheme == "https":
+            return HTTPSConnection(host, timeout=self.timeout)
+        return HTTPConnection(host, timeout=self.timeout)
+
+    def _release(self, key: Tuple[str, str], connection: HTTPConnection):
+        with self.lock:
+            self.idle.setdefault(key, []).append(connection)
+
+    def _wait_until_allowed(self):
+        while True:
+            with self.lock:
+                delay = self.blocked_until - time.monotonic()
+                if delay <= 0:
+                    return
+                self.waited += delay
+            time.sleep(delay)
+
+    def _block(self, delay: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    # JSON answer of a request, None for a 404 when not_found_ok (a project deleted since the dump of the index)
+    def request_json(self, method: str, url: str, data=None, headers: Optional[Dict[str, str]] = None, not_found_ok: bool = False):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        target = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        body = None if data is None else json.dumps(data).encode()
+        request_headers = dict(self.headers, **(headers or {}))
+        if body is not None:
+            request_headers["Content-Type"] = "application/json"
+        for attempt in range(self.retries + 1):
+            self._wait_until_allowed()
+            # Backoff of this attempt, the server may ask for another delay
+            delay = self.backoff * 2 ** attempt * (0.5 + random.random() / 2)
+            with self.slots:
+                connection = self._connection(key)
+                with self.lock:
+                    self.requests += 1
+                try:
+                    connection.request(method, target, body, request_headers)
+                    response = connection.getresponse()
+                    content = response.read()
+                except (OSError, HTTPException) as e:
+                    # Also the keep-alive connections closed by the server in the meantime
+                    connection.close()
+                    error = f"{method} {url}: {e!r}"
+                else:
+                    if response.will_close:
+                        connection.close()
+                    else:
+                        self._release(key, connection)
+                    server_delay = rate_limit_delay(response)
+                    if response.status < 300:
+                        # Last request allowed before the reset: the next ones wait for it
+                        if server_delay is not None:
+                            self._block(server_delay)
+                        return json.loads(content) if content else None
+                    if response.status == 404 and not_found_ok:
+                        return None
+                    if response.status not in RETRY_STATUSES:
+                        raise Exception(f"{method} {url}: HTTP {response.status} {content[:200]!r}")
+                    error = f"{method} {url}: HTTP {response.status}"
+                    if response.status == 429:
+                        with self.lock:
+                            self.rate_limited += 1
+                        self._block(server_delay if server_delay is not None else delay)
+                        delay = 0.0
+                    elif server_delay is not None:
+                        delay = server_delay
+            if attempt == self.retries:
+                raise Exception(f"{error}, given up after {self.retries} retries")
+            with self.lock:
+                self.retried += 1
+            time.sleep(delay)
+
+    def summary(self) -> str:
+        return f"HTTP: {self.requests} requests on {self.connections} connections, {self.retried} retries, {self.rate_limited} rate limited, {self.waited:.2f}s waiting for rate limits"
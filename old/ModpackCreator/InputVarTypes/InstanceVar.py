@@ -0,0 +1,43 @@
+from ModpackCreator.ATask import AVarDef
+from ModpackCreator.InputVarTypes.PathVar import DirectoryAbsolutePathVar
+import os
+import re
+
+# Variables shared by the built-in tasks: a task doesn't import another task for them
+
+class MultiMCInstancePathVar(DirectoryAbsolutePathVar):
+    format_feedback = "Invalid path format. Expected a valid absolute Unix path. The target path must exist. The target path must be a MultiMC instance folder and contain a .minecraft folder."
+
+    # Verify that the value is a valid absolute path
+    def _validate(self, value: str):
+        # Verify DirectoryAbsolutePathVar validation
+        if not super()._validate(value):
+            return False
+        # Verify that the path contains a .minecraft folder or a minecraft folder
+        if not os.path.isdir(value + "/.minecraft") and not os.path.isdir(value + "/minecraft"):
+            return False
+        return True
+
+class CurseForgeInstancePathVar(DirectoryAbsolutePathVar):
+    format_feedback = "Invalid path format. Expected a valid absolute Unix path. The target path must exist. The target path must be a CurseForge instance folder and contain a manifest.json file."
+
+    # Verify that the value is a valid absolute path
+    def _validate(self, value: str):
+        # Verify DirectoryAbsolutePathVar validation
+        if not super()._validate(value):
+            return False
+        # Verify that the path contains a manifest.json file
+        if not os.path.isfile(value + "/manifest.json"):
+            return False
+        return True
+
+class ModpackNameVar(AVarDef):
+    format_feedback = "Invalid modpack name. Expected a valid modpack name (sould not conain any path forbidden characters)."
+
+    # Verify that the value is a valid absolute path
+    def _validate(self, value: str):
+        # Should not contain aany path forbidden characters
+        if not re.match(r"^[^\\/:*?\"<>|]+$", value):
+            print("Invalid modpack name")
+            return False
+        return True
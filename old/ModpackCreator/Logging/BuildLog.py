@@ -0,0 +1,141 @@
+from threading import Lock
+from typing import Dict, Optional
+import json
+import logging
+import os
+import sys
+import time
+
+# Logger of the builds, for modpack-creator.py and the package
+LOGGER_NAME = "modpack_creator"
+log = logging.getLogger(LOGGER_NAME)
+
+LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+# Characters kept before a write to the terminal, and the longest time a line waits
+BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.5
+
+class BufferedStreamHandler(logging.StreamHandler):
+    # Writes the records in blocks: one write and flush per BUFFER_SIZE characters or FLUSH_INTERVAL seconds instead of
+    # one per line. Warnings and errors are written at once, with what was buffered before them.
+
+    def __init__(self, stream=None, buffer_size: int = BUFFER_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(stream)
+        self.buffer = []
+        self.buffered = 0
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self.buffer.append(message)
+            self.buffered += len(message)
+            if self.buffered >= self.buffer_size or record.levelno >= logging.WARNING or time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.buffer:
+                # Taken first: lines are never written twice, even if the write is interrupted
+                lines, self.buffer, self.buffered = self.buffer, [], 0
+                self.stream.write("".join(lines))
+            if self.stream and hasattr(self.stream, "flush"):
+                self.stream.flush()
+            self.last_flush = time.monotonic()
+
+class JsonLinesFormatter(logging.Formatter):
+    # One JSON object per record: time, level, message and the fields given with extra={"fields": {...}}
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {"time": round(record.created, 6), "level": record.levelname.lower(), "message": record.getMessage()}
+        event.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            event["exception"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str)
+
+# Handlers installed by configure_logging, replaced when it is called again
+installed_handlers = []
+
+# Set the logging of a build up from the config: "log_level" (info; debug adds a line per file), "log_json" (a path to
+# also write every record as JSON lines, null by default). level wins over the config, from the command line.
+def configure_logging(config: Dict, level: Optional[str] = None, stream=None):
+    level_name = (level or config.get("log_level", "info")).lower()
+    if level_name not in LEVELS:
+        raise Exception(f"Unknown log level {level_name}, expected one of {', '.join(LEVELS)}")
+    close_logging()
+    handler = BufferedStreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    installed_handlers.append(handler)
+    json_path = config.get("log_json")
+    if json_path:
+        os.makedirs(os.path.dirname(json_path) or ".", exist_ok=True)
+        json_handler = logging.FileHandler(json_path, "a", encoding="utf-8")
+        json_handler.setFormatter(JsonLinesFormatter())
+        installed_handlers.append(json_handler)
+    for installed in installed_handlers:
+        log.addHandler(installed)
+    log.setLevel(LEVELS[level_name])
+    log.propagate = False
+
+# Write what is buffered: before a prompt, or before the output of another writer
+def flush_log():
+    for handler in log.handlers:
+        handler.flush()
+
+def format_counter(name: str, value: int) -> str:
+    if name == "bytes":
+        return f"{value / 1024 / 1024:,.1f} MB"
+    return f"{value:,} {name}"
+
+class StageCounters:
+    # Counters of the stages of a build, logged in one line per stage instead of one line per file:
+    # "copy: 8,412 files, 37.0 MB"
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def add(self, stage: str, name: str, value: int = 1):
+        with self.lock:
+            counters = self.counters.setdefault(stage, {})
+            counters[name] = counters.get(name, 0) + value
+
+    # Log the counters of a stage and reset them, nothing if the stage counted nothing
+    def log_summary(self, stage: str):
+        with self.lock:
+            counters = self.counters.pop(stage, None)
+        if counters:
+            log.info(f"{stage}: " + ", ".join(format_counter(name, value) for name, value in counters.items()), extra={"fields": {"stage": stage, "counters": counters}})
+
+    def log_all(self):
+        with self.lock:
+            stages = list(self.counters)
+        for stage in stages:
+            self.log_summary(stage)
+
+COUNTERS = StageCounters()
+
+def count(stage: str, name: str, value: int = 1):
+    COUNTERS.add(stage, name, value)
+
+def log_stage_summary(stage: str):
+    COUNTERS.log_summary(stage)
+
+# End of a build: the stages not summarized yet, then everything buffered
+def finish_logging():
+    COUNTERS.log_all()
+    flush_log()
+
+# Remove the handlers of configure_logging, before their stream is closed: the builds of a batch log to their own files
+def close_logging():
+    for handler in installed_handlers:
+        handler.flush()
+        log.removeHandler(handler)
+        handler.close()
+    installed_handlers.clear()
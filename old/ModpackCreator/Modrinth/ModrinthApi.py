@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import quote
+import json
+
+from ModpackCreator.Http.HttpSession import HttpSession
+
+# Public API
+DEFAULT_BASE_URL = "https://api.modrinth.com/v2"
+# Hashes sent per request
+HASHES_PER_REQUEST = 500
+# Env value of a side the project doesn't declare
+DEFAULT_SIDE = "required"
+
+PROVIDER_MODRINTH = "modrinth"
+
+class ResolvedFile:
+    # A file of a provider, identified by its hash
+    __slots__ = ("sha1", "sha512", "url", "size", "project_id", "version_id", "title", "env", "provider")
+
+    def __init__(self, sha1: str, sha512: str, url: str, size: int, project_id: str, version_id: str, title: str, env: Dict[str, str], provider: str = PROVIDER_MODRINTH):
+        self.sha1 = sha1
+        # Empty when the provider doesn't give it (CurseForge)
+        self.sha512 = sha512
+        self.url = url
+        self.size = size
+        # Project and version on Modrinth, mod and file ids on CurseForge
+        self.project_id = project_id
+        self.version_id = version_id
+        # Project title, the file name if unknown
+        self.title = title
+        self.env = env
+        self.provider = provider
+
+# mrpack env of a project, from its client_side and server_side
+def project_env(project: Dict) -> Dict[str, str]:
+    env = {}
+    for side in ("client", "server"):
+        value = project.get(side + "_side")
+        env[side] = value if value in ("required", "optional", "unsupported") else DEFAULT_SIDE
+    return env
+
+# Run the requests of batches at the same time, up to the connections of the session
+def map_requests(session: HttpSession, function, batches: List) -> List:
+    if len(batches) <= 1:
+        return [function(batch) for batch in batches]
+    with ThreadPoolExecutor(max_workers=min(session.max_connections, len(batches))) as pool:
+        return list(pool.map(function, batches))
+
+# Find the Modrinth files with these sha1 hashes. Unknown hashes are not in the result.
+# Two bulk requests per HASHES_PER_REQUEST hashes: the versions, then their projects for the titles and sides.
+def resolve_sha1(sha1s: List[str], base_url: str = DEFAULT_BASE_URL, session: Optional[HttpSession] = None) -> Dict[str, ResolvedFile]:
+    session = session or HttpSession()
+    versions = {}
+    hash_batches = [sha1s[i:i + HASHES_PER_REQUEST] for i in range(0, len(sha1s), HASHES_PER_REQUEST)]
+    for batch_versions in map_requests(session, lambda batch: session.request_json("POST", base_url + "/version_files", {"hashes": batch, "algorithm": "sha1"}), hash_batches):
+        versions.update(batch_versions)
+    project_ids = sorted({version["project_id"] for version in versions.values()})
+    projects = {}
+    id_batches = [project_ids[i:i + HASHES_PER_REQUEST] for i in range(0, len(project_ids), HASHES_PER_REQUEST)]
+    for batch_projects in map_requests(session, lambda batch: session.request_json("GET", base_url + "/projects?ids=" + quote(json.dumps(batch), safe="")), id_batches):
+        for project in batch_projects:
+            projects[project["id"]] = project
+    resolved = {}
+    for sha1, version in versions.items():
+        for file in version["files"]:
+            if file["hashes"].get("sha1") == sha1:
+                project = projects.get(version["project_id"], {})
+                resolved[sha1] = ResolvedFile(sha1, file["hashes"].get("sha512", ""), file["url"], file["size"], version["project_id"], version["id"], project.get("title", file["filename"]), project_env(project))
+                break
+    return resolved
+
+# Project ids found by the search for a name, best first: the network fallback of the loose matching
+def search_projects(query: str, base_url: str = DEFAULT_BASE_URL, session: Optional[HttpSession] = None, limit: int = 3) -> List[str]:
+    session = session or HttpSession()
+    answer = session.request_json("GET", f"{base_url}/search?query={quote(query, safe='')}&limit={limit}")
+    return [hit["project_id"] for hit in answer.get("hits", [])]
+
+# Files of projects found by name: {(project_id, file name): ResolvedFile}, with the hashes of the published file.
+# A request per project for its versions, at the same time, then one for the titles and sides.
+def resolve_file_names(file_names_by_project: Dict[str, List[str]], base_url: str = DEFAULT_BASE_URL, session: Optional[HttpSession] = None) -> Dict[tuple, ResolvedFile]:
+    session = session or HttpSession()
+    project_ids = sorted(file_names_by_project)
+    versions_by_project = dict(zip(project_ids, map_requests(session, lambda project_id: session.request_json("GET", f"{base_url}/project/{quote(project_id, safe='')}/version", not_found_ok=True), project_ids)))
+    found = {}
+    for project_id, versions in versions_by_project.items():
+        wanted = set(file_names_by_project[project_id])
+        # Versions are listed newest first: the newest version publishing a file name wins
+        for version in versions or []:
+            for file in version["files"]:
+                if file["filename"] in wanted and (project_id, file["filename"]) not in found:
+                    found[(project_id, file["filename"])] = (version, file)
+    projects = {}
+    found_ids = sorted({project_id for project_id, _ in found})
+    id_batches = [found_ids[i:i + HASHES_PER_REQUEST] for i in range(0, len(found_ids), HASHES_PER_REQUEST)]
+    for batch_projects in map_requests(session, lambda batch: session.request_json("GET", base_url + "/projects?ids=" + quote(json.dumps(batch), safe="")), id_batches):
+        for project in batch_projects:
+            projects[project["id"]] = project
+    resolved = {}
+    for (project_id, file_name), (version, file) in found.items():
+        project = projects.get(project_id, {})
+        resolved[(project_id, file_name)] = ResolvedFile(file["hashes"]["sha1"], file["hashes"].get("sha512", ""), file["url"], file["size"], project_id, version["id"], project.get("title", file_name), project_env(project))
+    return resolved
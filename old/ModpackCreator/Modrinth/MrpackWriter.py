@@ -0,0 +1,167 @@
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import time
+import zipfile
+
+from ModpackCreator.Hashing.HashCache import HashCache
+from ModpackCreator.Resolver.Resolver import resolve, wants_fingerprints
+from ModpackCreator.Zip.CompressionPolicy import CompressionPolicy
+from ModpackCreator.Zip.ParallelZipWriter import ParallelZipWriter
+
+# Component uids of mmc-pack.json and their name in the mrpack dependencies
+DEPENDENCY_UIDS = {
+    "net.minecraft": "minecraft",
+    "net.minecraftforge": "forge",
+    "net.neoforged": "neoforge",
+    "net.fabricmc.fabric-loader": "fabric-loader",
+    "org.quiltmc.quilt-loader": "quilt-loader",
+}
+# Files that can be downloaded instead of being shipped in overrides/, like mmc-export looks them up
+DOWNLOADABLE_DIRS = ("mods/", "resourcepacks/", "shaderpacks/")
+DOWNLOADABLE_EXTENSIONS = (".jar", ".zip")
+# Env of a file when neither the config nor the resolver give one
+DEFAULT_ENV = {"client": "required", "server": "required"}
+# Bytes of downloadable files kept in memory after hashing, to write the unresolved ones without reading them again
+MAX_KEPT_SIZE = 256 * 1024 * 1024
+
+class PackFile:
+    # A downloadable file of the pack and its hashes
+    __slots__ = ("name", "path", "size", "sha1", "sha512", "murmur2", "content")
+
+    def __init__(self, name: str, path: str, size: int, sha1: str, sha512: str, murmur2: Optional[int], content: Optional[bytes]):
+        # Entry name in the prepared export and path in the instance
+        self.name = name
+        self.path = path
+        self.size = size
+        self.sha1 = sha1
+        self.sha512 = sha512
+        # CurseForge fingerprint, only computed when the resolver looks files up on CurseForge
+        self.murmur2 = murmur2
+        # Kept for the files that end up in overrides/, None if it didn't fit in MAX_KEPT_SIZE
+        self.content = content
+
+def is_downloadable(path: str) -> bool:
+    return path.startswith(DOWNLOADABLE_DIRS) and path.lower().endswith(DOWNLOADABLE_EXTENSIONS)
+
+# Instance files of a prepared export are under the minecraft folder, which may be in an instance folder
+def find_minecraft_prefix(archive: zipfile.ZipFile, minecraft_dir: str) -> str:
+    for name in archive.namelist():
+        parts = name.split("/")
+        if minecraft_dir in parts[:2]:
+            return "/".join(parts[:parts.index(minecraft_dir) + 1]) + "/"
+    raise Exception(f"No {minecraft_dir} folder in {archive.filename}")
+
+# Files of the minecraft folder: (downloadable files, other files), as (zipinfo, path in the instance)
+def list_instance_files(archive: zipfile.ZipFile, prefix: str) -> Tuple[List[Tuple[zipfile.ZipInfo, str]], List[Tuple[zipfile.ZipInfo, str]]]:
+    downloadable = []
+    others = []
+    for zipinfo in archive.infolist():
+        if zipinfo.is_dir() or not zipinfo.filename.startswith(prefix):
+            continue
+        path = zipinfo.filename[len(prefix):]
+        (downloadable if is_downloadable(path) else others).append((zipinfo, path))
+    return downloadable, others
+
+# mrpack dependencies from the mmc-pack.json of an export
+def read_dependencies(archive: zipfile.ZipFile, mmc_pack_name: str) -> Dict[str, str]:
+    dependencies = {}
+    if mmc_pack_name in archive.namelist():
+        for component in json.loads(archive.read(mmc_pack_name)).get("components", []):
+            if component.get("uid") in DEPENDENCY_UIDS and "version" in component:
+                dependencies[DEPENDENCY_UIDS[component["uid"]]] = component["version"]
+    if "minecraft" not in dependencies:
+        raise Exception(f"No Minecraft version in {mmc_pack_name}")
+    return dependencies
+
+class MrpackStats:
+    def __init__(self, files: int, resolved: int, overrides: int, hashed_size: int, seconds: float):
+        self.files = files
+        self.resolved = resolved
+        self.overrides = overrides
+        self.hashed_size = hashed_size
+        self.seconds = seconds
+
+    def summary(self) -> str:
+        return f"Modrinth pack: {self.resolved}/{self.files} downloadable files resolved, {self.overrides} files in overrides, {self.hashed_size / 1024 / 1024:.1f} MB of downloadable files in {self.seconds:.2f}s"
+
+class MrpackWriter:
+    # Writes a Modrinth pack (.mrpack) from a prepared export, in process.
+    # Downloadable files are hashed in a thread pool, through the hash cache, and looked up with the resolver: {sha1: ResolvedFile} of the known hashes.
+    # The files it doesn't know, and all the other files of the minecraft folder, are shipped in overrides/.
+
+    def __init__(self, name: str, version: str, workers: Optional[int] = None, resolver: Optional[Callable] = None, policy: Optional[CompressionPolicy] = None, env_overrides: Optional[Dict[str, Dict[str, str]]] = None, hash_cache: Optional[HashCache] = None):
+        self.name = name
+        self.version = version
+        self.workers = workers or os.cpu_count() or 1
+        self.resolver = resolver
+        self.policy = policy
+        # {file name pattern: env}, wins over the env given by the resolver
+        self.env_overrides = env_overrides or {}
+        # Without a persistent cache, an in memory one: every file is hashed once
+        self.hash_cache = hash_cache or HashCache(":memory:")
+
+    def file_env(self, path: str, resolved_env: Optional[Dict[str, str]]) -> Dict[str, str]:
+        file_name = path.rsplit("/", 1)[-1]
+        for pattern, env in self.env_overrides.items():
+            if fnmatchcase(file_name, pattern) or fnmatchcase(path, pattern):
+                return dict(DEFAULT_ENV, **env)
+        return resolved_env or dict(DEFAULT_ENV)
+
+    # Hash the downloadable files of the minecraft folder, the ones already in the hash cache are not even read
+    def hash_files(self, archive: zipfile.ZipFile, entries: List[Tuple[zipfile.ZipInfo, str]]) -> List[PackFile]:
+        kept = {}
+        kept_size = 0
+
+        def keep(zipinfo: zipfile.ZipInfo, content: bytes):
+            nonlocal kept_size
+            if kept_size + len(content) <= MAX_KEPT_SIZE:
+                kept[zipinfo.filename] = content
+                kept_size += len(content)
+
+        hashes = self.hash_cache.hash_zip_entries(archive, [zipinfo for zipinfo, _ in entries], self.workers, keep, wants_fingerprints(self.resolver))
+        return [PackFile(zipinfo.filename, path, zipinfo.file_size, hashes[zipinfo.filename].sha1, hashes[zipinfo.filename].sha512, hashes[zipinfo.filename].murmur2, kept.get(zipinfo.filename)) for zipinfo, path in entries]
+
+    def write(self, prepared_export_path: str, minecraft_dir: str, output_path: str) -> MrpackStats:
+        start = time.perf_counter()
+        # Instance files of the prepared export are under the minecraft folder, which may be in an instance folder
+        with zipfile.ZipFile(prepared_export_path) as archive:
+            prefix = find_minecraft_prefix(archive, minecraft_dir)
+            dependencies = read_dependencies(archive, prefix[:-len(minecraft_dir) - 1] + "mmc-pack.json")
+            downloadable, overrides = list_instance_files(archive, prefix)
+            pack_files = self.hash_files(archive, downloadable)
+            by_sha1 = {pack_file.sha1: pack_file for pack_file in pack_files}
+
+            # Name and content of a file not found by hash, for the loose matching
+            def read_jar(sha1: str) -> Tuple[str, bytes]:
+                pack_file = by_sha1[sha1]
+                return pack_file.path.rsplit("/", 1)[-1], pack_file.content if pack_file.content is not None else archive.read(pack_file.name)
+
+            resolved = resolve(self.resolver, {pack_file.sha1: pack_file.murmur2 for pack_file in pack_files}, read_jar)
+            index = {"formatVersion": 1, "game": "minecraft", "versionId": self.version, "name": self.name, "files": [], "dependencies": dependencies}
+            overrides_count = len(overrides)
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            with ParallelZipWriter(output_path, self.workers, self.policy) as writer:
+                for pack_file in pack_files:
+                    resolved_file = resolved.get(pack_file.sha1)
+                    # A loose match is another file than the jar: its sha512 must be known (not on CurseForge)
+                    if resolved_file is not None and (resolved_file.sha1 == pack_file.sha1 or resolved_file.sha512):
+                        index["files"].append({
+                            "path": pack_file.path,
+                            "hashes": {"sha1": resolved_file.sha1, "sha512": resolved_file.sha512 or pack_file.sha512},
+                            "env": self.file_env(pack_file.path, resolved_file.env),
+                            "downloads": [resolved_file.url],
+                            "fileSize": resolved_file.size,
+                        })
+                        continue
+                    # Unknown file: shipped in the pack, with the bytes read for hashing when they were kept
+                    overrides_count += 1
+                    content = pack_file.content if pack_file.content is not None else archive.read(pack_file.name)
+                    writer.add_bytes("overrides/" + pack_file.path, content, archive.getinfo(pack_file.name).date_time)
+                for zipinfo, path in overrides:
+                    with archive.open(zipinfo) as reader:
+                        writer.add_stream("overrides/" + path, reader, zipinfo.file_size, zipinfo.date_time)
+                writer.add_bytes("modrinth.index.json", json.dumps(index, indent=4).encode())
+        hashed_size = sum(pack_file.size for pack_file in pack_files)
+        return MrpackStats(len(pack_files), len(index["files"]), overrides_count, hashed_size, time.perf_counter() - start)
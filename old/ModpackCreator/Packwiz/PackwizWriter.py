@@ -0,0 +1,256 @@
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from ModpackCreator.CurseForge.CurseForgeApi import PROVIDER_CURSEFORGE
+from ModpackCreator.Hashing.HashCache import HashCache, Hashes
+from ModpackCreator.Modrinth.MrpackWriter import DEFAULT_ENV, find_minecraft_prefix, list_instance_files, read_dependencies
+from ModpackCreator.Resolver.Resolver import resolve, wants_fingerprints
+from ModpackCreator.Zip.ZipPatcher import current_umask
+
+PACK_FORMAT = "packwiz:1.1.0"
+# Names of the mrpack dependencies in the [versions] table of pack.toml
+VERSION_NAMES = {
+    "minecraft": "minecraft",
+    "forge": "forge",
+    "neoforge": "neoforge",
+    "fabric-loader": "fabric",
+    "quilt-loader": "quilt",
+}
+# Files of the output directory written by the writer itself, never in the index
+PACK_FILES = ("pack.toml", "index.toml")
+
+# TOML basic string: JSON string escapes are valid TOML escapes
+def toml_string(value: str) -> str:
+    return json.dumps(value)
+
+# packwiz side of a file, from its mrpack env
+def env_side(env: Dict[str, str]) -> str:
+    if env.get("server") == "unsupported":
+        return "client"
+    if env.get("client") == "unsupported":
+        return "server"
+    return "both"
+
+def metafile_name(path: str) -> str:
+    # mods/sodium-0.5.jar -> mods/sodium-0.5.pw.toml
+    return path.rsplit(".", 1)[0] + ".pw.toml"
+
+class PackwizStats:
+    def __init__(self, files: int, metafiles: int, written: int, reused: int, unchanged: int, deleted: int, seconds: float):
+        self.files = files
+        self.metafiles = metafiles
+        self.written = written
+        self.reused = reused
+        self.unchanged = unchanged
+        self.deleted = deleted
+        self.seconds = seconds
+
+    def summary(self) -> str:
+        return f"Packwiz pack: {self.files} files ({self.metafiles} .pw.toml), {self.written} written, {self.reused} copied from the previous version, {self.unchanged} unchanged, {self.deleted} deleted in {self.seconds:.2f}s"
+
+class PackwizWriter:
+    # Writes a packwiz pack directory (pack.toml, index.toml, .pw.toml metafiles and the other files) from a prepared export.
+    # Downloadable files are hashed through the hash cache, in a thread pool, and looked up with the resolver like in MrpackWriter.
+    # Files whose content is already in the output directory are not written; the ones found in the directory of the
+    # previous version are copied from it instead of being extracted.
+
+    def __init__(self, name: str, version: str, workers: Optional[int] = None, resolver: Optional[Callable] = None, env_overrides: Optional[Dict[str, Dict[str, str]]] = None, hash_cache: Optional[HashCache] = None):
+        self.name = name
+        self.version = version
+        self.workers = workers or os.cpu_count() or 1
+        self.resolver = resolver
+        # {file name pattern: env}, wins over the env given by the resolver
+        self.env_overrides = env_overrides or {}
+        self.hash_cache = hash_cache or HashCache(":memory:")
+
+    def file_side(self, path: str, resolved_env: Optional[Dict[str, str]]) -> str:
+        file_name = path.rsplit("/", 1)[-1]
+        for pattern, env in self.env_overrides.items():
+            if fnmatchcase(file_name, pattern) or fnmatchcase(path, pattern):
+                return env_side(dict(DEFAULT_ENV, **env))
+        return env_side(resolved_env or DEFAULT_ENV)
+
+    def metafile(self, path: str, resolved_file) -> bytes:
+        lines = [
+            f"name = {toml_string(resolved_file.title)}",
+            f"filename = {toml_string(path.rsplit('/', 1)[-1])}",
+            f"side = {toml_string(self.file_side(path, resolved_file.env))}",
+            "",
+            "[download]",
+            f"url = {toml_string(resolved_file.url)}",
+        ]
+        if resolved_file.provider == PROVIDER_CURSEFORGE:
+            # No sha512 on CurseForge, ids are integers
+            lines += [
+                "hash-format = \"sha1\"",
+                f"hash = {toml_string(resolved_file.sha1)}",
+                "",
+                "[update]",
+                "[update.curseforge]",
+                f"file-id = {int(resolved_file.version_id)}",
+                f"project-id = {int(resolved_file.project_id)}",
+            ]
+        else:
+            lines += [
+                "hash-format = \"sha512\"",
+                f"hash = {toml_string(resolved_file.sha512)}",
+                "",
+                "[update]",
+                "[update.modrinth]",
+                f"mod-id = {toml_string(resolved_file.project_id)}",
+                f"version = {toml_string(resolved_file.version_id)}",
+            ]
+        return ("\n".join(lines) + "\n").encode()
+
+    def pack_toml(self, index_content: bytes, dependencies: Dict[str, str]) -> bytes:
+        lines = [
+            f"name = {toml_string(self.name)}",
+            f"version = {toml_string(self.version)}",
+            f"pack-format = {toml_string(PACK_FORMAT)}",
+            "",
+            "[index]",
+            "file = \"index.toml\"",
+            "hash-format = \"sha256\"",
+            f"hash = {toml_string(hashlib.sha256(index_content).hexdigest())}",
+            "",
+            "[versions]",
+        ]
+        lines += [f"{VERSION_NAMES[name]} = {toml_string(version)}" for name, version in dependencies.items() if name in VERSION_NAMES]
+        return ("\n".join(lines) + "\n").encode()
+
+    def write(self, prepared_export_path: str, minecraft_dir: str, output_dir: str, previous_dir: Optional[str] = None) -> PackwizStats:
+        start = time.perf_counter()
+        with zipfile.ZipFile(prepared_export_path) as archive:
+            prefix = find_minecraft_prefix(archive, minecraft_dir)
+            dependencies = read_dependencies(archive, prefix[:-len(minecraft_dir) - 1] + "mmc-pack.json")
+            downloadable, others = list_instance_files(archive, prefix)
+            # Every file is hashed: sha256 for index.toml, sha1 for the lookup. Cached by (CRC32, size).
+            hashes = self.hash_cache.hash_zip_entries(archive, [zipinfo for zipinfo, _ in downloadable], self.workers, fingerprints=wants_fingerprints(self.resolver))
+            hashes.update(self.hash_cache.hash_zip_entries(archive, [zipinfo for zipinfo, _ in others], self.workers))
+            by_sha1 = {hashes[zipinfo.filename].sha1: (zipinfo, path) for zipinfo, path in downloadable}
+
+            # Name and content of a file not found by hash, for the loose matching
+            def read_jar(sha1: str) -> Tuple[str, bytes]:
+                zipinfo, path = by_sha1[sha1]
+                return path.rsplit("/", 1)[-1], archive.read(zipinfo)
+
+            resolved = resolve(self.resolver, {hashes[zipinfo.filename].sha1: hashes[zipinfo.filename].murmur2 for zipinfo, _ in downloadable}, read_jar)
+            # Generated files: {path: content}, files from the export: {path: (zipinfo, hashes)}
+            generated: Dict[str, bytes] = {}
+            extracted: Dict[str, Tuple[zipfile.ZipInfo, Hashes]] = {}
+            for zipinfo, path in downloadable:
+                resolved_file = resolved.get(hashes[zipinfo.filename].sha1)
+                if resolved_file is not None:
+                    generated[metafile_name(path)] = self.metafile(path, resolved_file)
+                else:
+                    extracted[path] = (zipinfo, hashes[zipinfo.filename])
+            for zipinfo, path in others:
+                extracted[path] = (zipinfo, hashes[zipinfo.filename])
+            # index.toml lists everything but itself and pack.toml
+            index_lines = ["hash-format = \"sha256\"", ""]
+            for path in sorted(set(generated) | set(extracted)):
+                sha256 = hashlib.sha256(generated[path]).hexdigest() if path in generated else extracted[path][1].sha256
+                index_lines += ["[[files]]", f"file = {toml_string(path)}", f"hash = {toml_string(sha256)}"]
+                if path in generated:
+                    index_lines.append("metafile = true")
+                index_lines.append("")
+            index_content = "\n".join(index_lines).encode()
+            generated["index.toml"] = index_content
+            generated["pack.toml"] = self.pack_toml(index_content, dependencies)
+            written, reused, unchanged, deleted = self.update_directory(archive, output_dir, previous_dir, generated, extracted)
+        return PackwizStats(len(generated) + len(extracted) - len(PACK_FILES), len(generated) - len(PACK_FILES), written, reused, unchanged, deleted, time.perf_counter() - start)
+
+    # Bring the output directory to the new content, touching only the files that differ
+    def update_directory(self, archive: zipfile.ZipFile, output_dir: str, previous_dir: Optional[str], generated: Dict[str, bytes], extracted: Dict[str, Tuple[zipfile.ZipInfo, Hashes]]) -> Tuple[int, int, int, int]:
+        os.makedirs(output_dir, exist_ok=True)
+        existing = []
+        for dir_path, _, file_names in os.walk(output_dir):
+            existing += [os.path.relpath(os.path.join(dir_path, file_name), output_dir).replace(os.sep, "/") for file_name in file_names]
+        # Stale files first
+        deleted = 0
+        for path in existing:
+            if path not in generated and path not in extracted:
+                os.remove(local_path(output_dir, path))
+                deleted += 1
+        for dir_path, _, _ in sorted(os.walk(output_dir), reverse=True):
+            if dir_path != output_dir and not os.listdir(dir_path):
+                os.rmdir(dir_path)
+        # sha256 of the files already there, and of the previous version, through the cache: no read on a warm build
+        candidates = [local_path(output_dir, path) for path in extracted if os.path.isfile(local_path(output_dir, path))]
+        if previous_dir is not None:
+            candidates += [local_path(previous_dir, path) for path in extracted if os.path.isfile(local_path(previous_dir, path))]
+        on_disk = self.hash_cache.hash_files(candidates, self.workers)
+        # Digests of the files written, known without reading them back
+        written_hashes = {}
+        written = 0
+        reused = 0
+        unchanged = 0
+        for path, content in generated.items():
+            target = local_path(output_dir, path)
+            if os.path.isfile(target) and os.path.getsize(target) == len(content):
+                with open(target, "rb") as f:
+                    if f.read() == content:
+                        unchanged += 1
+                        continue
+            write_file(target, content)
+            written += 1
+        for path, (zipinfo, hashes) in extracted.items():
+            target = local_path(output_dir, path)
+            if target in on_disk and on_disk[target].sha256 == hashes.sha256:
+                unchanged += 1
+                continue
+            previous = local_path(previous_dir, path) if previous_dir is not None else None
+            if previous in on_disk and on_disk[previous].sha256 == hashes.sha256:
+                # Same file in the previous version: a copy, the export isn't read
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(previous, target)
+                reused += 1
+            else:
+                with archive.open(zipinfo) as reader:
+                    write_file(target, reader)
+                written += 1
+            written_hashes[target] = hashes
+        self.hash_cache.add_files(written_hashes)
+        return written, reused, unchanged, deleted
+
+def local_path(root: str, path: str) -> str:
+    return os.path.join(root, *path.split("/"))
+
+def write_file(path: str, content):
+    # Bytes or a readable file object, written next to the file then renamed
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".packwiz-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(content, bytes):
+                f.write(content)
+            else:
+                shutil.copyfileobj(content, f, 1024 * 1024)
+        os.chmod(temp_path, 0o666 & ~current_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# Directory of the most recent other version in the packwiz directory, the one whose index.toml was written last
+def find_previous_version_dir(packwiz_dir: str, version: str) -> Optional[str]:
+    previous = None
+    previous_mtime = None
+    if not os.path.isdir(packwiz_dir):
+        return None
+    for name in os.listdir(packwiz_dir):
+        index_path = os.path.join(packwiz_dir, name, "index.toml")
+        if name == version or not os.path.isfile(index_path):
+            continue
+        mtime = os.path.getmtime(index_path)
+        if previous_mtime is None or mtime > previous_mtime:
+            previous, previous_mtime = os.path.join(packwiz_dir, name), mtime
+    return previous
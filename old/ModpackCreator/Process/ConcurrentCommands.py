@@ -0,0 +1,102 @@
+from subprocess import PIPE, Popen
+from threading import Lock, Thread
+from typing import BinaryIO, Dict, List, Optional
+import time
+
+from ModpackCreator.Logging.BuildLog import log
+from ModpackCreator.Tracing.BuildTracer import TRACER
+
+# Seconds between two checks of the running commands
+POLL_INTERVAL = 0.05
+# Seconds given to a command to stop before it is killed
+TERMINATE_TIMEOUT = 5
+# Last output lines kept per command, shown in the error of a failed command
+KEPT_LINES = 20
+
+# Lines of several commands are logged whole, never mixed
+output_lock = Lock()
+
+class CommandResult:
+    # Exit code, duration and last output lines of a command
+    def __init__(self, label: str, args: List[str]):
+        self.label = label
+        self.args = args
+        self.returncode = None
+        self.seconds = 0.0
+        self.lines: List[str] = []
+
+    def failed(self) -> bool:
+        return self.returncode != 0
+
+def forward_output(result: CommandResult, stream: BinaryIO, prefix: str):
+    # Print each line of the stream with the label of its command
+    for line in iter(stream.readline, b""):
+        line = line.decode(errors="replace").rstrip("\r\n")
+        with output_lock:
+            log.info(f"{prefix} {line}", extra={"fields": {"command": result.label}})
+            result.lines = (result.lines + [line])[-KEPT_LINES:]
+    stream.close()
+
+def stop(process: Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(TERMINATE_TIMEOUT)
+        except Exception:
+            process.kill()
+            process.wait()
+
+# Run commands at the same time, {label: args}. Their output is logged line by line, prefixed by their label.
+# When a command fails the others are stopped: no command outlives the call. Raises an Exception if any failed.
+# cancel is an Event (threading or multiprocessing): once set, the commands are stopped and an Exception is raised.
+def run_concurrently(commands: Dict[str, List[str]], cancel: Optional[object] = None) -> Dict[str, CommandResult]:
+    results = {label: CommandResult(label, args) for label, args in commands.items()}
+    processes: Dict[str, Popen] = {}
+    readers: List[Thread] = []
+    starts: Dict[str, float] = {}
+    try:
+        for label, args in commands.items():
+            log.info(f"[{label}] {' '.join(args)}")
+            try:
+                processes[label] = Popen(args, stdout=PIPE, stderr=PIPE)
+            except FileNotFoundError:
+                raise Exception(f"Can't run {label}: '{args[0]}' not found")
+            starts[label] = time.perf_counter()
+            for stream, prefix in ((processes[label].stdout, f"[{label}]"), (processes[label].stderr, f"[{label} stderr]")):
+                reader = Thread(target=forward_output, args=(results[label], stream, prefix), daemon=True)
+                reader.start()
+                readers.append(reader)
+        running = dict(processes)
+        while running:
+            if cancel is not None and cancel.is_set():
+                for label in running:
+                    log.warning(f"[{label}] stopped, build cancelled")
+                raise Exception("Build cancelled")
+            for label, process in list(running.items()):
+                returncode = process.poll()
+                if returncode is None:
+                    continue
+                del running[label]
+                results[label].returncode = returncode
+                results[label].seconds = time.perf_counter() - starts[label]
+                TRACER.record(f"command {label}", starts[label], starts[label] + results[label].seconds, {"returncode": returncode})
+                if returncode != 0:
+                    # No need to wait for the others, the build failed
+                    for other_label, other in running.items():
+                        log.warning(f"[{other_label}] stopped, {label} failed")
+                        stop(other)
+                    running = {}
+                    break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        for process in processes.values():
+            stop(process)
+        for reader in readers:
+            reader.join()
+    failed = [result for result in results.values() if result.returncode not in (None, 0)]
+    if failed:
+        details = "\n".join(f"{result.label} exited with code {result.returncode}:\n  " + "\n  ".join(result.lines) for result in failed)
+        raise Exception(f"Command failed: {details}")
+    for result in results.values():
+        log.info(f"[{result.label}] done in {result.seconds:.1f}s", extra={"fields": {"command": result.label, "seconds": round(result.seconds, 3)}})
+    return results
@@ -0,0 +1,92 @@
+from typing import Dict, List, Optional, Type
+import importlib
+import json
+import os
+
+# Names of the task packages of the tasks directory, with the mtime of the directory they were listed at. Written only
+# if the temp directory of the pack exists: a --version or --list-tasks run elsewhere leaves nothing behind.
+DEFAULT_MANIFEST_PATH = "temp/task_manifest.json"
+MANIFEST_VERSION = 1
+# Shared modules of the tasks of a directory, not a task
+COMMON_DIR = "common"
+
+def is_task_dir(entry: os.DirEntry) -> bool:
+    return entry.is_dir() and entry.name != COMMON_DIR and not entry.name.startswith(("_", "."))
+
+def scan_dir(dir_path: str) -> List[str]:
+    with os.scandir(dir_path) as entries:
+        return sorted(entry.name for entry in entries if is_task_dir(entry))
+
+class TaskRegistry:
+    # Task names of the built-in and added task directories, without importing them: a listing of each directory.
+    # The listing of the added tasks is kept in a manifest until the mtime of the directory changes, the built-in
+    # directory is part of the installed package and is only listed. A task package is imported when its Task is asked,
+    # only the tasks that run are imported. An added task hides the built-in task of the same name.
+
+    def __init__(self, builtin_dir: str, builtin_package: str, added_dir: str, manifest_path: str = DEFAULT_MANIFEST_PATH):
+        # Verify that the directory exists
+        if not os.path.isdir(added_dir):
+            raise Exception(f"Directory {added_dir} does not exist")
+        self.manifest_path = manifest_path
+        self.manifest = self.read_manifest()
+        self.changed = False
+        # {name: package of the task}
+        self.builtin = {name: f"{builtin_package}.{name}" for name in scan_dir(builtin_dir)}
+        self.added = {name: f"{added_dir.replace(os.sep, '.')}.{name}" for name in self.list_dir(added_dir)}
+        if self.changed:
+            self.write_manifest()
+        self.loaded: Dict[str, Type] = {}
+
+    def read_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest["dirs"]
+
+    # Best effort: without a manifest the directory is listed again on the next run
+    def write_manifest(self):
+        if not os.path.isdir(os.path.dirname(self.manifest_path) or "."):
+            return
+        try:
+            with open(self.manifest_path + ".tmp", "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "dirs": self.manifest}, f, indent=4)
+            os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        except OSError:
+            pass
+
+    # Task names of a directory, listed again when a task is added, removed or renamed in it
+    def list_dir(self, dir_path: str) -> List[str]:
+        key = os.path.abspath(dir_path)
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        cached = self.manifest.get(key)
+        if cached is not None and cached["mtime_ns"] == mtime_ns:
+            return cached["tasks"]
+        names = scan_dir(dir_path)
+        self.manifest[key] = {"mtime_ns": mtime_ns, "tasks": names}
+        self.changed = True
+        return names
+
+    def builtin_names(self) -> List[str]:
+        return list(self.builtin)
+
+    def added_names(self) -> List[str]:
+        return list(self.added)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.added or name in self.builtin
+
+    def is_builtin(self, name: str) -> bool:
+        return name in self.builtin and name not in self.added
+
+    # Task class of a task, its package imported on the first call. None for an unknown task.
+    def get(self, name: str) -> Optional[Type]:
+        if name not in self:
+            return None
+        if name not in self.loaded:
+            package = self.added[name] if name in self.added else self.builtin[name]
+            self.loaded[name] = importlib.import_module(package).task.Task
+        return self.loaded[name]
@@ -0,0 +1,60 @@
+from typing import List
+import io
+import json
+import re
+import tomllib
+import zipfile
+
+# Mod metadata files and how to read the mod ids from them
+FABRIC_METADATA = "fabric.mod.json"
+QUILT_METADATA = "quilt.mod.json"
+FORGE_METADATA = ("META-INF/mods.toml", "META-INF/neoforge.mods.toml")
+LEGACY_FORGE_METADATA = "mcmod.info"
+# Loader names ending a jar name: "sodium-fabric-0.5.3.jar" is the "sodium" project
+LOADER_WORDS = {"fabric", "forge", "neoforge", "quilt"}
+
+SEPARATORS = re.compile(r"[-_+ ]+")
+# Version parts of a jar name: 0.5.3, v2, mc1.20.1, 1.20.x
+VERSION_TOKEN = re.compile(r"^(v|mc)?\d", re.IGNORECASE)
+
+# Project names in a jar file name, the most specific first
+def file_name_candidates(file_name: str) -> List[str]:
+    stem = file_name.rsplit(".", 1)[0]
+    name_tokens = []
+    for token in SEPARATORS.split(stem):
+        if VERSION_TOKEN.match(token):
+            break
+        name_tokens.append(token)
+    candidates = []
+    if name_tokens:
+        candidates.append(" ".join(name_tokens))
+    while len(name_tokens) > 1 and name_tokens[-1].lower() in LOADER_WORDS:
+        name_tokens.pop()
+        candidates.append(" ".join(name_tokens))
+    return candidates
+
+# Mod ids declared by a jar, empty if it has no readable metadata
+def read_mod_ids(content: bytes) -> List[str]:
+    mod_ids = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            names = set(archive.namelist())
+            if FABRIC_METADATA in names:
+                mod_ids.append(json.loads(archive.read(FABRIC_METADATA).decode("utf-8-sig"), strict=False).get("id"))
+            if QUILT_METADATA in names:
+                mod_ids.append(json.loads(archive.read(QUILT_METADATA).decode("utf-8-sig"), strict=False).get("quilt_loader", {}).get("id"))
+            for metadata in FORGE_METADATA:
+                if metadata in names:
+                    mod_ids += [mod.get("modId") for mod in tomllib.loads(archive.read(metadata).decode("utf-8-sig")).get("mods", [])]
+            if LEGACY_FORGE_METADATA in names:
+                info = json.loads(archive.read(LEGACY_FORGE_METADATA).decode("utf-8-sig"), strict=False)
+                mods = info.get("modList", []) if isinstance(info, dict) else info
+                mod_ids += [mod.get("modid") for mod in mods if isinstance(mod, dict)]
+    except (zipfile.BadZipFile, ValueError, tomllib.TOMLDecodeError, AttributeError, KeyError):
+        # Not a zip, or metadata the loaders would refuse too: the file name is left
+        pass
+    return [mod_id for mod_id in mod_ids if isinstance(mod_id, str) and mod_id]
+
+# Names to look a jar up with: its mod ids, then the names in its file name
+def jar_names(file_name: str, content: bytes) -> List[str]:
+    return list(dict.fromkeys(read_mod_ids(content) + file_name_candidates(file_name)))
@@ -0,0 +1,224 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+
+# Index of the projects of the providers (slugs, titles, mod ids) for the loose matching of jars, built from a dump:
+# one JSON object per line, {"provider": "modrinth", "id": "AANobbMI", "slug": "sodium", "title": "Sodium", "mod_ids": ["sodium"]}
+# ("project_id" is read as "id", Modrinth search hits can be dumped as they are).
+#
+# Binary file, memory mapped, little endian uint32 tables after the header:
+#   projects: provider, id offset, id length, title offset, title length
+#   keys:     key offset, key length, project, trigram count, sorted by key for the exact lookups
+#   grams:    postings start, postings count, for each of the GRAM_COUNT trigram codes
+#   postings: key numbers, by trigram
+#   strings:  UTF-8 pool
+MAGIC = b"MPIX"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<4s6I")
+PROVIDERS = ("modrinth", "curseforge")
+# Characters of normalized keys, and the start and end marks of the trigrams
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+START, END = len(ALPHABET) + 1, len(ALPHABET) + 2
+BASE = len(ALPHABET) + 3
+GRAM_COUNT = BASE ** 3
+CHAR_CODES = {char: code + 1 for code, char in enumerate(ALPHABET)}
+# Dice coefficient of the trigrams of a loose match
+DEFAULT_THRESHOLD = 0.8
+
+NOT_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+# "Fabric API" and "fabric-api" -> "fabricapi"
+def normalize(name: str) -> str:
+    return NOT_ALPHANUMERIC.sub("", name.lower())
+
+def trigrams(key: str) -> List[int]:
+    codes = [START] + [CHAR_CODES[char] for char in key] + [END]
+    return [(codes[i] * BASE + codes[i + 1]) * BASE + codes[i + 2] for i in range(len(codes) - 2)]
+
+def uint32_array(values: Iterable[int]) -> array:
+    table = array("I", values)
+    if sys.byteorder == "big":
+        table.byteswap()
+    return table
+
+# Build the index file from a dump, through a temp file and a rename
+def build_index(dump_path: str, index_path: str) -> int:
+    strings = bytearray()
+    string_offsets: Dict[str, Tuple[int, int]] = {}
+
+    def add_string(value: str) -> Tuple[int, int]:
+        if value not in string_offsets:
+            encoded = value.encode()
+            string_offsets[value] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_offsets[value]
+
+    projects = []
+    keys: Dict[str, int] = {}
+    with open(dump_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            project = json.loads(line)
+            project_id = project.get("id") or project.get("project_id")
+            provider = project.get("provider", "modrinth")
+            if not project_id or provider not in PROVIDERS:
+                continue
+            number = len(projects)
+            title = project.get("title") or project.get("slug") or str(project_id)
+            projects.append((PROVIDERS.index(provider), *add_string(str(project_id)), *add_string(title)))
+            for name in [project.get("slug"), title] + list(project.get("mod_ids") or []):
+                key = normalize(name or "")
+                # The first project keeps a key shared by several: dumps list the most followed first
+                if key and key not in keys:
+                    keys[key] = number
+    sorted_keys = sorted(keys, key=lambda key: key.encode())
+    postings_by_gram: Dict[int, List[int]] = {}
+    for number, key in enumerate(sorted_keys):
+        for gram in set(trigrams(key)):
+            postings_by_gram.setdefault(gram, []).append(number)
+    grams = [0] * (GRAM_COUNT * 2)
+    postings = []
+    for gram in sorted(postings_by_gram):
+        grams[gram * 2] = len(postings)
+        grams[gram * 2 + 1] = len(postings_by_gram[gram])
+        postings += postings_by_gram[gram]
+    key_rows = []
+    for key in sorted_keys:
+        key_rows += [*add_string(key), keys[key], len(set(trigrams(key)))]
+    directory = os.path.dirname(index_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".project-index-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, INDEX_VERSION, len(projects), len(sorted_keys), len(postings), len(strings), 0))
+            f.write(uint32_array(value for row in projects for value in row).tobytes())
+            f.write(uint32_array(key_rows).tobytes())
+            f.write(uint32_array(grams).tobytes())
+            f.write(uint32_array(postings).tobytes())
+            f.write(strings)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(projects)
+
+# Rebuild the index when the dump is newer. True if it was rebuilt.
+def refresh_index(dump_path: str, index_path: str) -> bool:
+    if os.path.isfile(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(dump_path):
+        return False
+    build_index(dump_path, index_path)
+    return True
+
+class ProjectMatch:
+    __slots__ = ("provider", "project_id", "title", "key", "score")
+
+    def __init__(self, provider: str, project_id: str, title: str, key: str, score: float):
+        self.provider = provider
+        self.project_id = project_id
+        self.title = title
+        # Key of the index that matched and its similarity, 1.0 for an exact match
+        self.key = key
+        self.score = score
+
+class ProjectIndex:
+    # Memory mapped index: opening it reads nothing but the header, lookups touch only the pages they need
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.project_count, self.key_count, posting_count, strings_size, _ = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != INDEX_VERSION:
+            raise Exception(f"{path} is not a project index of version {INDEX_VERSION}, refresh it from a dump")
+        if sys.byteorder == "big":
+            raise Exception("The project index is little endian, this platform isn't")
+        offset = HEADER.size
+        self.projects = memoryview(self.map)[offset:offset + self.project_count * 20].cast("I")
+        offset += self.project_count * 20
+        self.keys = memoryview(self.map)[offset:offset + self.key_count * 16].cast("I")
+        offset += self.key_count * 16
+        self.grams = memoryview(self.map)[offset:offset + GRAM_COUNT * 8].cast("I")
+        offset += GRAM_COUNT * 8
+        self.postings = memoryview(self.map)[offset:offset + posting_count * 4].cast("I")
+        offset += posting_count * 4
+        self.strings = memoryview(self.map)[offset:offset + strings_size]
+
+    def close(self):
+        for view in (self.projects, self.keys, self.grams, self.postings, self.strings):
+            view.release()
+        self.map.close()
+
+    def string(self, offset: int, length: int) -> str:
+        return bytes(self.strings[offset:offset + length]).decode()
+
+    def key(self, number: int) -> bytes:
+        return bytes(self.strings[self.keys[number * 4]:self.keys[number * 4] + self.keys[number * 4 + 1]])
+
+    def project(self, number: int, key: str, score: float) -> ProjectMatch:
+        provider, id_offset, id_length, title_offset, title_length = self.projects[number * 5:number * 5 + 5]
+        return ProjectMatch(PROVIDERS[provider], self.string(id_offset, id_length), self.string(title_offset, title_length), key, score)
+
+    # Project of a normalized key, by binary search on the sorted keys
+    def exact(self, key: str) -> Optional[ProjectMatch]:
+        encoded = key.encode()
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.key_count and self.key(low) == encoded:
+            return self.project(self.keys[low * 4 + 2], key, 1.0)
+        return None
+
+    # Most similar key by trigrams, with a Dice coefficient of at least threshold.
+    # Only the keys found in the rarest trigrams can reach it, and only if their trigram count is close enough:
+    # the others are not read.
+    def similar(self, key: str, threshold: float = DEFAULT_THRESHOLD) -> Optional[ProjectMatch]:
+        grams = sorted(set(trigrams(key)), key=lambda gram: self.grams[gram * 2 + 1])
+        if not grams:
+            return None
+        # A key with a Dice coefficient of threshold shares at least this many trigrams
+        needed = max(int(threshold * len(grams) / (2 - threshold) + 0.999), 1)
+        candidates = set()
+        for gram in grams[:len(grams) - needed + 1]:
+            start, count = self.grams[gram * 2], self.grams[gram * 2 + 1]
+            candidates.update(self.postings[start:start + count])
+        fewest = threshold * len(grams) / (2 - threshold)
+        most = len(grams) * (2 - threshold) / threshold
+        best = None
+        best_score = threshold
+        for number in sorted(candidates):
+            candidate_count = self.keys[number * 4 + 3]
+            if not fewest <= candidate_count <= most:
+                continue
+            candidate = self.key(number).decode()
+            score = 2 * len(set(trigrams(candidate)).intersection(grams)) / (candidate_count + len(grams))
+            # Ties go to the first key in order
+            if score > best_score or (score == best_score and best is None):
+                best, best_score = (candidate, number), score
+        if best is None:
+            return None
+        return self.project(self.keys[best[1] * 4 + 2], best[0], best_score)
+
+    # First match of names, in order: exact matches of all of them first, then similar keys
+    def match(self, names: List[str], threshold: float = DEFAULT_THRESHOLD) -> Optional[ProjectMatch]:
+        keys = [key for key in dict.fromkeys(normalize(name) for name in names) if key]
+        for key in keys:
+            found = self.exact(key)
+            if found is not None:
+                return found
+        for key in keys:
+            found = self.similar(key, threshold)
+            if found is not None:
+                return found
+        return None
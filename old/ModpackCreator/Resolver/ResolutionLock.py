@@ -0,0 +1,158 @@
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import tempfile
+
+from ModpackCreator.Modrinth.ModrinthApi import ResolvedFile
+from ModpackCreator.Zip.ZipPatcher import current_umask
+
+LOCK_VERSION = 1
+# Name of the lockfile, next to config.json
+LOCK_FILE_NAME = "resolution-lock.json"
+
+def resolved_to_entry(resolved_file: Optional[ResolvedFile]) -> Dict:
+    # A miss is locked too: the file isn't looked up again
+    if resolved_file is None:
+        return {"provider": None}
+    return {
+        "provider": resolved_file.provider,
+        "project_id": resolved_file.project_id,
+        "version_id": resolved_file.version_id,
+        "url": resolved_file.url,
+        "sha512": resolved_file.sha512,
+        "size": resolved_file.size,
+        "title": resolved_file.title,
+        "env": resolved_file.env,
+    }
+
+# Loose matches keep the sha1 of the published file, which isn't the one of the jar
+def loose_entry(resolved_file: Optional[ResolvedFile]) -> Dict:
+    entry = resolved_to_entry(resolved_file)
+    if resolved_file is not None:
+        entry["sha1"] = resolved_file.sha1
+    return entry
+
+def entry_to_resolved(sha1: str, entry: Dict) -> Optional[ResolvedFile]:
+    if entry.get("provider") is None:
+        return None
+    return ResolvedFile(entry.get("sha1", sha1), entry["sha512"], entry["url"], entry["size"], entry["project_id"], entry["version_id"], entry["title"], entry["env"], entry["provider"])
+
+class ResolutionLock:
+    # Resolver answering from a lockfile: {sha1: provider, project and version ids, download URL...}.
+    # Only the hashes the lockfile hasn't seen are given to the resolver, so an unchanged pack is rebuilt without a
+    # request and with the same answers. With refresh, every hash is looked up again and the lockfile rewritten.
+
+    def __init__(self, path: str, resolver: Callable, refresh: bool = False):
+        self.path = path
+        self.resolver = resolver
+        self.refresh = refresh
+        self.lock = Lock()
+        self.entries: Dict[str, Dict] = {}
+        if not refresh:
+            self.entries = read_lock_entries(path)
+        self.reset_counters()
+
+    # Counters of this build, reset between the builds of a long-running process
+    def reset_counters(self):
+        self.locked = set()
+        self.looked_up = set()
+
+    def __call__(self, sha1s: List[str], fingerprints: Optional[Dict[str, int]] = None) -> Dict[str, ResolvedFile]:
+        with self.lock:
+            unseen = [sha1 for sha1 in dict.fromkeys(sha1s) if sha1 not in self.entries]
+            self.locked.update(sha1 for sha1 in sha1s if sha1 in self.entries and sha1 not in self.looked_up)
+            if unseen:
+                if fingerprints is not None:
+                    resolved = self.resolver(unseen, {sha1: fingerprints[sha1] for sha1 in unseen if sha1 in fingerprints})
+                else:
+                    resolved = self.resolver(unseen)
+                for sha1 in unseen:
+                    self.entries[sha1] = resolved_to_entry(resolved.get(sha1))
+                self.looked_up.update(unseen)
+            resolved = {}
+            for sha1 in sha1s:
+                resolved_file = entry_to_resolved(sha1, self.entries[sha1])
+                if resolved_file is not None:
+                    resolved[sha1] = resolved_file
+            return resolved
+
+    # Loose matches are locked under "loose" in the entry of the jar
+    def resolve_loose(self, sha1s: List[str], read_jar: Callable[[str], Tuple[str, bytes]]) -> Dict[str, ResolvedFile]:
+        with self.lock:
+            unseen = [sha1 for sha1 in dict.fromkeys(sha1s) if "loose" not in self.entries.get(sha1, {})]
+            if unseen and hasattr(self.resolver, "wants_loose") and self.resolver.wants_loose():
+                resolved = self.resolver.resolve_loose(unseen, read_jar)
+                for sha1 in unseen:
+                    self.entries.setdefault(sha1, {"provider": None})["loose"] = loose_entry(resolved.get(sha1))
+                self.looked_up.update(unseen)
+            resolved = {}
+            for sha1 in sha1s:
+                resolved_file = entry_to_resolved(sha1, self.entries.get(sha1, {}).get("loose", {}))
+                if resolved_file is not None:
+                    resolved[sha1] = resolved_file
+            return resolved
+
+    def wants_fingerprints(self) -> bool:
+        return hasattr(self.resolver, "wants_fingerprints") and self.resolver.wants_fingerprints()
+
+    # Locked loose matches are answered even without an index
+    def wants_loose(self) -> bool:
+        return (hasattr(self.resolver, "wants_loose") and self.resolver.wants_loose()) or any("loose" in entry for entry in self.entries.values())
+
+    # Write the lockfile if entries were added
+    def save(self):
+        if not self.looked_up and not self.refresh:
+            return
+        write_lock(self.path, self.entries)
+
+    def close(self):
+        if hasattr(self.resolver, "close"):
+            self.resolver.close()
+
+    def summary(self) -> str:
+        found = sum(1 for sha1 in self.looked_up if self.entries[sha1].get("provider") is not None or self.entries[sha1].get("loose", {}).get("provider") is not None)
+        summary = f"Resolution lock: {len(self.locked)} files from {self.path}, {len(self.looked_up)} looked up ({found} found)"
+        if self.looked_up and hasattr(self.resolver, "summary"):
+            summary += "\n" + self.resolver.summary()
+        return summary
+
+# Write a lockfile atomically, sorted to keep the diffs small
+def write_lock(path: str, entries: Dict[str, Dict]):
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(prefix=".resolution-lock-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": LOCK_VERSION, "files": entries}, f, indent=4, sort_keys=True)
+            f.write("\n")
+        # Versioned with the pack, the usual permissions rather than the private ones of mkstemp
+        os.chmod(temp_path, 0o666 & ~current_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def read_lock_entries(path: str) -> Dict[str, Dict]:
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r") as f:
+        content = json.load(f)
+    if content.get("version") != LOCK_VERSION:
+        raise Exception(f"{path} has version {content.get('version')}, expected {LOCK_VERSION}: rebuild it with --refresh-lock")
+    return content["files"]
+
+# Add the entries of a lockfile to another one, the added entries win. Returns the number of new or changed entries.
+# The builds of a batch lock in their own workspace, their answers are merged in the lockfile of the pack one at a time.
+def merge_lock(from_path: str, to_path: str) -> int:
+    added = read_lock_entries(from_path)
+    entries = read_lock_entries(to_path)
+    changed = [sha1 for sha1, entry in added.items() if entries.get(sha1) != entry]
+    if changed:
+        entries.update((sha1, added[sha1]) for sha1 in changed)
+        write_lock(to_path, entries)
+    return len(changed)
+
+# Lockfile of a config file: next to it
+def lock_path(config_path: str) -> str:
+    return os.path.join(os.path.dirname(config_path), LOCK_FILE_NAME)
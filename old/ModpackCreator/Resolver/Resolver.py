@@ -0,0 +1,182 @@
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+
+from ModpackCreator.CurseForge.CurseForgeApi import DEFAULT_BASE_URL as CURSEFORGE_BASE_URL, PROVIDER_CURSEFORGE, resolve_fingerprints
+from ModpackCreator.CurseForge.CurseForgeApi import resolve_file_names as resolve_curseforge_file_names
+from ModpackCreator.Http.HttpSession import HttpSession
+from ModpackCreator.Logging.BuildLog import log
+from ModpackCreator.Modrinth.ModrinthApi import DEFAULT_BASE_URL as MODRINTH_BASE_URL, PROVIDER_MODRINTH, ResolvedFile, resolve_sha1, search_projects
+from ModpackCreator.Modrinth.ModrinthApi import resolve_file_names as resolve_modrinth_file_names
+from ModpackCreator.Resolver.JarIdentity import file_name_candidates, jar_names
+from ModpackCreator.Resolver.ProjectIndex import ProjectIndex, ProjectMatch, refresh_index
+
+PROVIDERS = (PROVIDER_MODRINTH, PROVIDER_CURSEFORGE)
+# Environment variable of the CurseForge API key, when it isn't in the config
+CURSEFORGE_API_KEY_ENV = "CURSEFORGE_API_KEY"
+# Index of the projects for the loose matching, refreshed from "project_index_dump"
+DEFAULT_PROJECT_INDEX = "temp/project_index.bin"
+
+class Resolver:
+    # Looks files up on the providers, in order: a file found on a provider is not looked up on the next ones.
+    # Bulk requests only (Modrinth version_files by sha1, CurseForge fingerprints), through one pooled session.
+    # Answers are kept, misses included: the writers of a build share the lookups, the second one sends no request.
+
+    #
+    # Files not found by hash (a jar rebuilt or repacked by the author of the pack) can be matched loosely, by name:
+    # their mod ids and file name are looked up in the local project index, and a published file of the project
+    # with the same file name is taken, with its own hashes. Only the names the index doesn't know are searched
+    # on Modrinth, when network_search is set.
+
+    def __init__(self, session: HttpSession, providers: List[str] = (PROVIDER_MODRINTH,), modrinth_url: str = MODRINTH_BASE_URL, curseforge_url: str = CURSEFORGE_BASE_URL, curseforge_api_key: Optional[str] = None, project_index: Optional[ProjectIndex] = None, network_search: bool = False):
+        for provider in providers:
+            if provider not in PROVIDERS:
+                raise Exception(f"Unknown provider {provider}, expected one of {', '.join(PROVIDERS)}")
+        if PROVIDER_CURSEFORGE in providers and not curseforge_api_key:
+            raise Exception(f"The CurseForge provider needs an API key: \"curseforge_api_key\" in the config or {CURSEFORGE_API_KEY_ENV}")
+        self.session = session
+        self.providers = list(providers)
+        self.modrinth_url = modrinth_url.rstrip("/")
+        self.curseforge_url = curseforge_url.rstrip("/")
+        self.curseforge_api_key = curseforge_api_key
+        self.lock = Lock()
+        # {sha1: ResolvedFile or None}
+        self.known: Dict[str, Optional[ResolvedFile]] = {}
+        self.project_index = project_index
+        self.network_search = network_search
+        # Loose matches {local sha1: ResolvedFile of the published file or None}, and how their projects were found
+        self.known_loose: Dict[str, Optional[ResolvedFile]] = {}
+        self.matched_locally = 0
+        self.searched = 0
+
+    # {sha1: ResolvedFile} of the files found. fingerprints {sha1: CurseForge fingerprint} are needed for CurseForge.
+    def __call__(self, sha1s: List[str], fingerprints: Optional[Dict[str, int]] = None) -> Dict[str, ResolvedFile]:
+        # One lookup at a time: a writer asking for the same files waits for the answers of the other
+        with self.lock:
+            missing = [sha1 for sha1 in dict.fromkeys(sha1s) if sha1 not in self.known]
+            resolved = {}
+            for provider in self.providers:
+                left = [sha1 for sha1 in missing if sha1 not in resolved]
+                if not left:
+                    break
+                if provider == PROVIDER_MODRINTH:
+                    resolved.update(resolve_sha1(left, self.modrinth_url, self.session))
+                elif provider == PROVIDER_CURSEFORGE:
+                    sha1_by_fingerprint = {fingerprints[sha1]: sha1 for sha1 in left if fingerprints and fingerprints.get(sha1) is not None}
+                    if sha1_by_fingerprint:
+                        resolved.update(resolve_fingerprints(sha1_by_fingerprint, self.curseforge_api_key, self.curseforge_url, self.session))
+            for sha1 in missing:
+                self.known[sha1] = resolved.get(sha1)
+            return {sha1: self.known[sha1] for sha1 in sha1s if self.known[sha1] is not None}
+
+    # Loose matching of files not found by hash: {local sha1: ResolvedFile of the published file}.
+    # read_jar(sha1) gives the file name and content of a jar.
+    def resolve_loose(self, sha1s: List[str], read_jar: Callable[[str], Tuple[str, bytes]]) -> Dict[str, ResolvedFile]:
+        with self.lock:
+            missing = [sha1 for sha1 in dict.fromkeys(sha1s) if sha1 not in self.known_loose]
+            file_names = {}
+            matches: Dict[str, ProjectMatch] = {}
+            unmatched = []
+            for sha1 in missing:
+                file_name, content = read_jar(sha1)
+                file_names[sha1] = file_name
+                match = self.project_index.match(jar_names(file_name, content)) if self.project_index is not None else None
+                if match is not None and match.provider in self.providers:
+                    matches[sha1] = match
+                    self.matched_locally += 1
+                else:
+                    unmatched.append(sha1)
+            # A search request per jar: only for the names the index doesn't know
+            if self.network_search and PROVIDER_MODRINTH in self.providers:
+                for sha1 in unmatched:
+                    candidates = file_name_candidates(file_names[sha1])
+                    if candidates:
+                        self.searched += 1
+                        project_ids = search_projects(candidates[-1], self.modrinth_url, self.session)
+                        if project_ids:
+                            matches[sha1] = ProjectMatch(PROVIDER_MODRINTH, project_ids[0], candidates[-1], candidates[-1], 0.0)
+            # A request per matched project for its files, whatever the number of jars matching it
+            by_provider: Dict[str, Dict[str, List[str]]] = {provider: {} for provider in PROVIDERS}
+            for sha1, match in matches.items():
+                by_provider[match.provider].setdefault(match.project_id, []).append(file_names[sha1])
+            published = {}
+            if by_provider[PROVIDER_MODRINTH]:
+                published.update(resolve_modrinth_file_names(by_provider[PROVIDER_MODRINTH], self.modrinth_url, self.session))
+            if by_provider[PROVIDER_CURSEFORGE] and self.curseforge_api_key:
+                published.update(resolve_curseforge_file_names(by_provider[PROVIDER_CURSEFORGE], self.curseforge_api_key, self.curseforge_url, self.session))
+            for sha1 in missing:
+                match = matches.get(sha1)
+                self.known_loose[sha1] = published.get((match.project_id, file_names[sha1])) if match is not None else None
+            return {sha1: self.known_loose[sha1] for sha1 in sha1s if self.known_loose[sha1] is not None}
+
+    # CurseForge fingerprints are only worth computing when CurseForge is asked
+    def wants_fingerprints(self) -> bool:
+        return PROVIDER_CURSEFORGE in self.providers
+
+    # Loose matching is worth reading the jars for with an index or the network search
+    def wants_loose(self) -> bool:
+        return self.project_index is not None or self.network_search
+
+    def close(self):
+        self.session.close()
+        if self.project_index is not None:
+            self.project_index.close()
+
+    def summary(self) -> str:
+        found = sum(1 for resolved_file in self.known.values() if resolved_file is not None)
+        summary = f"Resolver: {found}/{len(self.known)} files found ({', '.join(self.providers)}). {self.session.summary()}"
+        if self.known_loose:
+            loose_found = sum(1 for resolved_file in self.known_loose.values() if resolved_file is not None)
+            summary += f"\nLoose matching: {loose_found}/{len(self.known_loose)} files found, {self.matched_locally} projects from the index, {self.searched} searched"
+        return summary
+
+# The resolver is any callable {sha1: ResolvedFile} of sha1s. The ones with a wants_fingerprints method
+# (Resolver, ResolutionLock) also take the CurseForge fingerprints.
+def wants_fingerprints(resolver: Optional[Callable]) -> bool:
+    return hasattr(resolver, "wants_fingerprints") and resolver.wants_fingerprints()
+
+def wants_loose(resolver: Optional[Callable]) -> bool:
+    return hasattr(resolver, "wants_loose") and resolver.wants_loose()
+
+# Look the files {sha1: fingerprint or None} up with a resolver, nothing without one.
+# The files not found by hash are then matched loosely, if the resolver can and read_jar is given.
+def resolve(resolver: Optional[Callable], files: Dict[str, Optional[int]], read_jar: Optional[Callable[[str], Tuple[str, bytes]]] = None) -> Dict[str, ResolvedFile]:
+    if resolver is None or not files:
+        return {}
+    if wants_fingerprints(resolver):
+        resolved = resolver(list(files), {sha1: murmur2 for sha1, murmur2 in files.items() if murmur2 is not None})
+    else:
+        resolved = resolver(list(files))
+    unresolved = [sha1 for sha1 in files if sha1 not in resolved]
+    if unresolved and read_jar is not None and wants_loose(resolver):
+        resolved.update(resolver.resolve_loose(unresolved, read_jar))
+    return resolved
+
+# Resolver of the config, None if "modrinth_resolve" is false.
+# "resolve_providers": ["modrinth", "curseforge"] in priority order, "resolve_connections", "resolve_retries",
+# "modrinth_api_url", "curseforge_api_url", "curseforge_api_key" (or CURSEFORGE_API_KEY).
+# Loose matching: "loose_matching" (true), with the "project_index" file rebuilt from "project_index_dump" when the
+# dump is newer, and "loose_network_search" (false) to search the names the index doesn't know.
+def load_resolver(config: Dict) -> Optional[Resolver]:
+    if not config.get("modrinth_resolve", True):
+        return None
+    project_index = None
+    network_search = False
+    if config.get("loose_matching", True):
+        index_path = config.get("project_index", DEFAULT_PROJECT_INDEX)
+        dump_path = config.get("project_index_dump")
+        if dump_path and refresh_index(dump_path, index_path):
+            log.info(f"Project index {index_path} rebuilt from {dump_path}")
+        if os.path.isfile(index_path):
+            project_index = ProjectIndex(index_path)
+        network_search = config.get("loose_network_search", False)
+    session = HttpSession(config.get("resolve_connections", 4), config.get("resolve_retries", 4))
+    return Resolver(
+        session,
+        config.get("resolve_providers", [PROVIDER_MODRINTH]),
+        config.get("modrinth_api_url", MODRINTH_BASE_URL),
+        config.get("curseforge_api_url", CURSEFORGE_BASE_URL),
+        config.get("curseforge_api_key") or os.environ.get(CURSEFORGE_API_KEY_ENV),
+        project_index,
+        network_search,
+    )
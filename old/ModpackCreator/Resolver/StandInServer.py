@@ -0,0 +1,189 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+import json
+import re
+import time
+
+from ModpackCreator.CurseForge.CurseForgeApi import MINECRAFT_GAME_ID
+
+NOT_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+# Hashes and ids in the paths, counted as one endpoint
+PATH_PARAMETERS = re.compile(r"(/version_file/|/project/|/mods/)[^/]+")
+
+class StandInServer:
+    # Local stand-in for the Modrinth and CurseForge APIs, to run the resolution offline.
+    # Serves the endpoints used by the resolver, plus the one-file-per-request Modrinth lookup, from an in memory
+    # catalogue. Counts the requests and connections, and can add latency, a rate limit and failures.
+
+    def __init__(self, latency: float = 0.0, rate_limit: Optional[int] = None, rate_window: float = 1.0, fail_every: Optional[int] = None):
+        # Seconds added to each answer
+        self.latency = latency
+        # At most rate_limit requests per rate_window seconds, 429 after that
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        # Every fail_every-th request answers 503
+        self.fail_every = fail_every
+        # Catalogue: Modrinth versions by sha1, projects by id, CurseForge files by fingerprint, mods by id
+        self.versions: Dict[str, Dict] = {}
+        self.projects: Dict[str, Dict] = {}
+        self.curseforge_files: Dict[int, Dict] = {}
+        self.curseforge_mods: Dict[int, Dict] = {}
+        self.lock = Lock()
+        self.requests = Counter()
+        self.connections = 0
+        self.window_start = 0.0
+        self.window_requests = 0
+        self.server = None
+        self.thread = None
+
+    def add_modrinth_file(self, sha1: str, sha512: str, file_name: str, size: int, client_side: str = "required", server_side: str = "required", project_id: Optional[str] = None, title: Optional[str] = None):
+        project_id = project_id or "P" + sha1[:7]
+        version_id = "V" + sha1[:7]
+        self.projects[project_id] = {"id": project_id, "title": title or file_name.rsplit(".", 1)[0], "client_side": client_side, "server_side": server_side}
+        self.versions[sha1] = {"id": version_id, "project_id": project_id, "files": [{
+            "hashes": {"sha1": sha1, "sha512": sha512},
+            "url": f"https://cdn.modrinth.com/data/{project_id}/versions/{version_id}/{file_name}",
+            "filename": file_name,
+            "primary": True,
+            "size": size,
+        }]}
+
+    def add_curseforge_file(self, fingerprint: int, sha1: str, file_name: str, size: int):
+        file_id = len(self.curseforge_files) + 1000
+        mod_id = len(self.curseforge_mods) + 100
+        self.curseforge_mods[mod_id] = {"id": mod_id, "name": file_name.rsplit(".", 1)[0]}
+        self.curseforge_files[fingerprint] = {
+            "id": file_id, "modId": mod_id, "fileName": file_name, "fileLength": size, "fileFingerprint": fingerprint,
+            "downloadUrl": f"https://edge.forgecdn.net/files/{file_id // 1000}/{file_id % 1000}/{file_name}",
+            "hashes": [{"value": sha1, "algo": 1}],
+        }
+
+    # http://127.0.0.1:<port>/v2, for "modrinth_api_url"
+    @property
+    def modrinth_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v2"
+
+    # http://127.0.0.1:<port>, for "curseforge_api_url"
+    @property
+    def curseforge_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self, port: int = 0) -> "StandInServer":
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests.clear()
+            self.connections = 0
+
+    # (status, headers) before answering a request: rate limit and injected failures
+    def admit(self, key: str):
+        with self.lock:
+            self.requests[key] += 1
+            headers = {}
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                if now - self.window_start >= self.rate_window:
+                    self.window_start = now
+                    self.window_requests = 0
+                self.window_requests += 1
+                reset = self.rate_window - (now - self.window_start)
+                headers = {"X-Ratelimit-Limit": str(self.rate_limit), "X-Ratelimit-Remaining": str(max(self.rate_limit - self.window_requests, 0)), "X-Ratelimit-Reset": f"{reset:.3f}"}
+                if self.window_requests > self.rate_limit:
+                    return 429, dict(headers, **{"Retry-After": f"{reset:.3f}"})
+            if self.fail_every and sum(self.requests.values()) % self.fail_every == 0:
+                return 503, headers
+            return 200, headers
+
+    def answer(self, method: str, path: str, query: Dict, body) -> Optional[object]:
+        if method == "POST" and path == "/v2/version_files":
+            return {sha1: self.versions[sha1] for sha1 in body["hashes"] if sha1 in self.versions}
+        if method == "GET" and path.startswith("/v2/version_file/"):
+            return self.versions.get(path.rsplit("/", 1)[1])
+        if method == "GET" and path.startswith("/v2/project/") and path.endswith("/version"):
+            project_id = path.split("/")[3]
+            if project_id not in self.projects:
+                return None
+            return [version for version in self.versions.values() if version["project_id"] == project_id]
+        if method == "GET" and path == "/v2/search":
+            words = NOT_ALPHANUMERIC.sub("", query.get("query", [""])[0].lower())
+            hits = [{"project_id": project["id"], "title": project["title"]} for project in self.projects.values() if words and words in NOT_ALPHANUMERIC.sub("", project["title"].lower())]
+            return {"hits": hits[:int(query.get("limit", ["10"])[0])]}
+        if method == "GET" and path == "/v2/projects":
+            return [self.projects[project_id] for project_id in json.loads(query["ids"][0]) if project_id in self.projects]
+        if method == "POST" and path in ("/v1/fingerprints", f"/v1/fingerprints/{MINECRAFT_GAME_ID}"):
+            matches = [{"id": self.curseforge_files[fingerprint]["modId"], "file": self.curseforge_files[fingerprint]} for fingerprint in body["fingerprints"] if fingerprint in self.curseforge_files]
+            return {"data": {"exactMatches": matches, "exactFingerprints": [match["file"]["fileFingerprint"] for match in matches]}}
+        if method == "GET" and path.startswith("/v1/mods/") and path.endswith("/files"):
+            mod_id = int(path.split("/")[3])
+            return {"data": [file for file in self.curseforge_files.values() if file["modId"] == mod_id]}
+        if method == "POST" and path == "/v1/mods":
+            return {"data": [self.curseforge_mods[mod_id] for mod_id in body["modIds"] if mod_id in self.curseforge_mods]}
+        return None
+
+def make_handler(stand_in: StandInServer):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real APIs
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with stand_in.lock:
+                stand_in.connections += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, content, headers: Dict[str, str]):
+            data = json.dumps(content).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_request(self, method: str):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            key = f"{method} {PATH_PARAMETERS.sub(lambda match: match.group(1) + '<id>', parts.path)}"
+            status, headers = stand_in.admit(key)
+            if stand_in.latency:
+                time.sleep(stand_in.latency)
+            if status != 200:
+                self.send_json(status, {"error": "stand-in", "status": status}, headers)
+                return
+            content = stand_in.answer(method, parts.path, parse_qs(parts.query), body)
+            if content is None:
+                self.send_json(404, {"error": "not_found"}, headers)
+                return
+            self.send_json(200, content, headers)
+
+        def do_GET(self):
+            self.handle_request("GET")
+
+        def do_POST(self):
+            self.handle_request("POST")
+
+    return Handler
@@ -0,0 +1,185 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from ModpackCreator.Text.Normalizer import CHUNK_SIZE, SNIFF_SIZE, map_batches, normalize_file, should_normalize
+
+# Bump when the normalized output of a given input changes, older caches are dropped
+CACHE_VERSION = 1
+# Default location and size cap
+DEFAULT_CACHE_DIR = "temp/normalize_cache"
+DEFAULT_CACHE_SIZE_MB = 256
+# Size of the entry of an input that was already normalized: nothing is stored for it
+SAME = -1
+
+# Entries known by the main process when the build started, installed once in each worker: {key: blob size or SAME}
+worker_cache_dir = ""
+worker_entries: Dict[str, int] = {}
+
+def init_worker(cache_dir: str, entries: Dict[str, int]):
+    global worker_cache_dir, worker_entries
+    worker_cache_dir = cache_dir
+    worker_entries = entries
+
+# Cache key of a file: the normalization mode and a hash of the content
+def content_key(f, mode: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return f"{mode}-{digest.hexdigest()}"
+
+def blob_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, "objects", key[-2:], key)
+
+# Replace a file with a copy of another one, keeping its mode
+def replace_with_copy(from_path: str, to_path: str):
+    fd, temp_path = tempfile.mkstemp(prefix=".normalize-", dir=os.path.dirname(to_path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as temp_file, open(from_path, "rb") as from_file:
+            shutil.copyfileobj(from_file, temp_file, CHUNK_SIZE)
+        if os.path.exists(to_path):
+            shutil.copymode(to_path, temp_path)
+        os.replace(temp_path, to_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# Normalize a file through the cache. Runs in a worker process.
+# Returns (path, text file, rewritten, size, key, hit, blob size, output size, output mtime).
+def normalize_file_cached(file_path: str, mode: str, extensions: List[str], sniff_unknown: bool, record: Optional[List]) -> Tuple:
+    st = os.stat(file_path)
+    # Pre-check: the file is still the output of the previous build, no need to read it
+    if record is not None and record[0] == st.st_size and record[1] == st.st_mtime_ns and record[2].startswith(mode + "-"):
+        return file_path, True, False, st.st_size, record[2], True, None, st.st_size, st.st_mtime_ns
+    with open(file_path, "rb") as f:
+        if not should_normalize(file_path, f.read(SNIFF_SIZE), extensions, sniff_unknown):
+            return file_path, False, False, st.st_size, None, False, None, st.st_size, st.st_mtime_ns
+        f.seek(0)
+        key = content_key(f, mode)
+    blob_size = worker_entries.get(key)
+    if blob_size == SAME:
+        return file_path, True, False, st.st_size, key, True, SAME, st.st_size, st.st_mtime_ns
+    if blob_size is not None and os.path.isfile(blob_path(worker_cache_dir, key)):
+        replace_with_copy(blob_path(worker_cache_dir, key), file_path)
+        out_st = os.stat(file_path)
+        return file_path, True, True, st.st_size, key, True, blob_size, out_st.st_size, out_st.st_mtime_ns
+    # Miss: normalize, then keep the output if it differs from the input
+    _, rewritten, size = normalize_file(file_path, mode, extensions, sniff_unknown)
+    out_st = os.stat(file_path)
+    blob_size = SAME
+    if rewritten:
+        path = blob_path(worker_cache_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replace_with_copy(file_path, path)
+        blob_size = out_st.st_size
+    return file_path, True, rewritten, size, key, False, blob_size, out_st.st_size, out_st.st_mtime_ns
+
+def normalize_cached_batch(file_paths: List[str], mode: str, extensions: List[str], sniff_unknown: bool, records: Dict[str, List]) -> List[Tuple]:
+    return [normalize_file_cached(file_path, mode, extensions, sniff_unknown, records.get(os.path.abspath(file_path))) for file_path in file_paths]
+
+class NormalizationCache:
+    # Persistent cache of normalized files, keyed by a hash of their content.
+    # index.json keeps the entries in least recently used order and the size/mtime of the files normalized last time,
+    # objects/ keeps the normalized output of the inputs that had to be rewritten.
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.index_path = os.path.join(cache_dir, "index.json")
+        # {key: blob size or SAME}, least recently used first
+        self.entries: Dict[str, int] = {}
+        # {absolute path: [size, mtime_ns, key]} of the files as they were left by the last build
+        self.files: Dict[str, List] = {}
+        self.load()
+        self.size = sum(size for size in self.entries.values() if size > 0)
+        # Counters of the current build
+        self.hits = 0
+        self.unchanged = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if index.get("version") != CACHE_VERSION:
+            return
+        self.entries = index["entries"]
+        self.files = index["files"]
+
+    def save(self):
+        # Forget the files that don't exist anymore
+        self.files = {path: record for path, record in self.files.items() if os.path.isfile(path)}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".index-", dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries, "files": self.files}, f)
+        os.replace(temp_path, self.index_path)
+
+    # Mark an entry as the most recently used one
+    def touch(self, key: str, blob_size: int):
+        if key in self.entries:
+            del self.entries[key]
+        elif blob_size > 0:
+            self.size += blob_size
+        self.entries[key] = blob_size
+
+    # Remove the least recently used entries until the cache fits in its size cap
+    def evict(self):
+        for key in list(self.entries):
+            if self.size <= self.max_size:
+                break
+            blob_size = self.entries.pop(key)
+            if blob_size > 0:
+                self.size -= blob_size
+                if os.path.isfile(blob_path(self.cache_dir, key)):
+                    os.remove(blob_path(self.cache_dir, key))
+            self.evictions += 1
+
+    # Normalize files with the process pool of the Normalizer. Returns (text files, rewritten, size) like normalize_batch.
+    def normalize_files(self, file_paths: List[str], workers: int, mode: str, extensions: List[str], sniff_unknown: bool) -> Tuple[int, int, int]:
+        records = {path: self.files[path] for path in map(os.path.abspath, file_paths) if path in self.files}
+        results = map_batches(normalize_cached_batch, file_paths, workers, (mode, extensions, sniff_unknown, records), init_worker, (self.cache_dir, self.entries))
+        files = 0
+        rewritten = 0
+        size = 0
+        for batch in results:
+            for file_path, is_text, is_rewritten, file_size, key, hit, blob_size, out_size, out_mtime_ns in batch:
+                path = os.path.abspath(file_path)
+                if not is_text:
+                    self.files.pop(path, None)
+                    continue
+                files += 1
+                rewritten += is_rewritten
+                size += file_size
+                if blob_size is None:
+                    # Pre-check hit, the entry of the content may be gone since
+                    self.unchanged += 1
+                    if key in self.entries:
+                        self.touch(key, self.entries[key])
+                else:
+                    if hit:
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                    self.touch(key, blob_size)
+                self.files[path] = [out_size, out_mtime_ns, key]
+        self.evict()
+        self.save()
+        return files, rewritten, size
+
+    def summary(self) -> str:
+        return f"Normalization cache: {self.unchanged} unchanged files, {self.hits} hits, {self.misses} misses, {self.evictions} evicted ({self.size / 1024 / 1024:.1f} / {self.max_size / 1024 / 1024:.1f} MB)"
+
+# Cache of the config: {"normalize_cache": "temp/normalize_cache", "normalize_cache_size_mb": 256}. None if disabled with "normalize_cache": null.
+def load_cache(config: Dict) -> Optional[NormalizationCache]:
+    cache_dir = config.get("normalize_cache", DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return None
+    return NormalizationCache(cache_dir, config.get("normalize_cache_size_mb", DEFAULT_CACHE_SIZE_MB) * 1024 * 1024)
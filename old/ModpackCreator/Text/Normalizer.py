@@ -0,0 +1,225 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+import io
+import os
+import shutil
+import tempfile
+import time
+
+# Files normalized with CRLF end of lines
+TXT_EXTENSIONS = [".txt", ".json", ".toml", ".cfg", ".properties", ".lang", ".mcmeta", ".log", ".md", ".yml", ".yaml", ".json5"]
+# Files never normalized, whatever their content
+BINARY_EXTENSIONS = {".jar", ".zip", ".png", ".jpg", ".jpeg", ".gif", ".ogg", ".mp3", ".wav", ".class", ".dat", ".dat_old", ".nbt", ".mca", ".gz", ".xz", ".7z", ".ttf", ".otf", ".so", ".dll", ".exe", ".bin"}
+# Bytes read to guess whether a file is text
+SNIFF_SIZE = 8192
+# Bytes read at once, the memory used per file doesn't depend on its size
+CHUNK_SIZE = 1024 * 1024
+# Files per task sent to a worker: big enough to amortize the inter process calls
+BATCH_SIZE = 64
+# Normalization modes
+# Lines joined with \r\n, the output of "\r\n".join(content.splitlines()) of the old builds: the line breaks of
+# str.splitlines become \r\n and the last one is dropped. The UTF-8 ones are matched as bytes.
+MODE_CRLF_JOIN_LINES = "crlf_join_lines"
+# All line breaks (\r\n, \r, \n) become \r\n, the final one kept
+MODE_CRLF = "crlf"
+# Same, and each run of line breaks is halved, like the packwiz task always did
+MODE_CRLF_COLLAPSE_BLANK_LINES = "crlf_collapse_blank_lines"
+# Line breaks of str.splitlines other than \r and \n: \v, \f, \x1c-\x1e, U+0085, U+2028, U+2029
+SPLITLINES_BREAKS = [b"\x0b", b"\x0c", b"\x1c", b"\x1d", b"\x1e", b"\xc2\x85", b"\xe2\x80\xa8", b"\xe2\x80\xa9"]
+# Bytes a piece must not end with: a line break, or the start of one, could be cut
+LINE_BREAK_BYTES = b"\r\n"
+SPLITLINES_BYTES = b"\r\n\x0b\x0c\x1c\x1d\x1e\xc2\x85\xe2\x80\xa8\xa9"
+# Bytes found in text files
+TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F})
+
+""" SNIFFING """
+
+# Text if there is no NUL nor unusual control byte at the start of the content
+def looks_like_text(head: bytes) -> bool:
+    return not head.translate(None, TEXT_BYTES)
+
+# Whether a file should be normalized, from its name and the start of its content
+def should_normalize(file_name: str, head: bytes, extensions: List[str] = TXT_EXTENSIONS, sniff_unknown: bool = False) -> bool:
+    extension = os.path.splitext(file_name)[1]
+    if extension.lower() in BINARY_EXTENSIONS:
+        return False
+    if extension not in extensions and not sniff_unknown:
+        return False
+    # Even listed extensions are sniffed, a binary file is never rewritten
+    return looks_like_text(head)
+
+# Whether the content of a file has to be read to know if it should be normalized
+def may_normalize(file_name: str, extensions: List[str] = TXT_EXTENSIONS, sniff_unknown: bool = False) -> bool:
+    extension = os.path.splitext(file_name)[1]
+    return extension.lower() not in BINARY_EXTENSIONS and (sniff_unknown or extension in extensions)
+
+""" NORMALIZERS """
+
+def normalize_piece(piece: bytes, mode: str) -> bytes:
+    # The piece must not end in the middle of a run of line breaks
+    piece = piece.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if mode == MODE_CRLF_JOIN_LINES:
+        for line_break in SPLITLINES_BREAKS:
+            piece = piece.replace(line_break, b"\n")
+    if mode == MODE_CRLF_COLLAPSE_BLANK_LINES:
+        piece = piece.replace(b"\n\n", b"\n")
+    return piece.replace(b"\n", b"\r\n")
+
+def pieces(reader: BinaryIO, mode: str = MODE_CRLF_JOIN_LINES) -> Iterator[bytes]:
+    # Chunks of the reader, cut outside of runs of line breaks: a \r\n is never split
+    break_bytes = SPLITLINES_BYTES if mode == MODE_CRLF_JOIN_LINES else LINE_BREAK_BYTES
+    carry = b""
+    while True:
+        chunk = reader.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        piece = carry + chunk
+        stripped = piece.rstrip(break_bytes)
+        carry = piece[len(stripped):]
+        if stripped:
+            yield stripped
+    if carry:
+        yield carry
+
+# (piece, normalized piece) of the reader. MODE_CRLF_JOIN_LINES drops the final line break of the last piece.
+def normalized_pieces(reader: BinaryIO, mode: str) -> Iterator[Tuple[bytes, bytes]]:
+    previous = None
+    for piece in pieces(reader, mode):
+        if previous is not None:
+            yield previous
+        previous = (piece, normalize_piece(piece, mode))
+    if previous is not None:
+        piece, normalized = previous
+        if mode == MODE_CRLF_JOIN_LINES and normalized.endswith(b"\r\n"):
+            normalized = normalized[:-2]
+        yield piece, normalized
+
+def normalized_chunks(reader: BinaryIO, mode: str = MODE_CRLF_JOIN_LINES) -> Iterator[bytes]:
+    for _, normalized in normalized_pieces(reader, mode):
+        if normalized:
+            yield normalized
+
+def normalize_bytes(content: bytes, mode: str = MODE_CRLF_JOIN_LINES) -> bytes:
+    return b"".join(normalized_chunks(io.BytesIO(content), mode))
+
+# Fast scan: True if normalizing would not change anything
+def is_normalized(reader: BinaryIO, mode: str = MODE_CRLF_JOIN_LINES) -> bool:
+    for piece, normalized in normalized_pieces(reader, mode):
+        if normalized != piece:
+            return False
+    return True
+
+class NormalizingReader:
+    # Readable file object returning the normalized content of another one
+    def __init__(self, reader: BinaryIO, mode: str = MODE_CRLF_JOIN_LINES):
+        self.chunks = normalized_chunks(reader, mode)
+        self.buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+# Normalize a file in place. Returns (text file, rewritten, size). Already normalized files are not rewritten.
+def normalize_file(file_path: str, mode: str = MODE_CRLF_JOIN_LINES, extensions: List[str] = TXT_EXTENSIONS, sniff_unknown: bool = False) -> Tuple[bool, bool, int]:
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not should_normalize(file_path, f.read(SNIFF_SIZE), extensions, sniff_unknown):
+            return False, False, size
+        f.seek(0)
+        if is_normalized(f, mode):
+            return True, False, size
+        f.seek(0)
+        # Write next to the file then replace it, the file is never half written
+        fd, temp_path = tempfile.mkstemp(prefix=".normalize-", dir=os.path.dirname(file_path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in normalized_chunks(f, mode):
+                    temp_file.write(chunk)
+            shutil.copymode(file_path, temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return True, True, size
+
+def normalize_batch(file_paths: List[str], mode: str, extensions: List[str], sniff_unknown: bool) -> Tuple[int, int, int]:
+    # Runs in a worker process: (files normalized, files rewritten, bytes)
+    files = 0
+    rewritten = 0
+    size = 0
+    for file_path in file_paths:
+        is_text, is_rewritten, file_size = normalize_file(file_path, mode, extensions, sniff_unknown)
+        if is_text:
+            files += 1
+            rewritten += is_rewritten
+            size += file_size
+    return files, rewritten, size
+
+""" TREE """
+
+class NormalizeStats:
+    # Result of a tree normalization
+    def __init__(self, files: int, rewritten: int, size: int, seconds: float, workers: int):
+        self.files = files
+        self.rewritten = rewritten
+        self.size = size
+        self.seconds = seconds
+        self.workers = workers
+
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    def mb_per_second(self) -> float:
+        return self.size / 1024 / 1024 / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return f"Normalized {self.files} files ({self.size / 1024 / 1024:.1f} MB, {self.rewritten} rewritten, {self.files - self.rewritten} already normalized) in {self.seconds:.2f}s with {self.workers} workers: {self.files_per_second():.0f} files/s, {self.mb_per_second():.1f} MB/s"
+
+def list_candidate_files(root: str, extensions: List[str] = TXT_EXTENSIONS, sniff_unknown: bool = False) -> List[str]:
+    file_paths = []
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if may_normalize(file_name, extensions, sniff_unknown):
+                file_paths.append(os.path.join(dir_path, file_name))
+    return file_paths
+
+# Run function(batch, *args) on batches of the files, in a process pool. The initializer runs once per worker.
+def map_batches(function: Callable, file_paths: List[str], workers: int, args: Tuple, initializer: Optional[Callable] = None, initargs: Tuple = ()) -> List:
+    batches = [file_paths[i:i + BATCH_SIZE] for i in range(0, len(file_paths), BATCH_SIZE)]
+    if workers == 1 or len(batches) <= 1:
+        # Not worth starting processes
+        if initializer is not None:
+            initializer(*initargs)
+        return [function(batch, *args) for batch in batches]
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        return list(pool.map(function, batches, *[[arg] * len(batches) for arg in args]))
+
+# Normalize all the text files of a tree, sharded across a process pool. Same result as normalizing them one by one.
+# With a NormalizationCache, the files already normalized in a previous build are not processed again.
+def normalize_tree(root: str, extensions: List[str] = TXT_EXTENSIONS, workers: Optional[int] = None, mode: str = MODE_CRLF_JOIN_LINES, sniff_unknown: bool = False, cache=None) -> NormalizeStats:
+    return normalize_paths(list_candidate_files(root, extensions, sniff_unknown), extensions, workers, mode, sniff_unknown, cache)
+
+# Same as normalize_tree, for a list of files
+def normalize_paths(file_paths: List[str], extensions: List[str] = TXT_EXTENSIONS, workers: Optional[int] = None, mode: str = MODE_CRLF_JOIN_LINES, sniff_unknown: bool = False, cache=None) -> NormalizeStats:
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    file_paths = [file_path for file_path in file_paths if may_normalize(file_path, extensions, sniff_unknown)]
+    if cache is not None:
+        files, rewritten, size = cache.normalize_files(file_paths, workers, mode, extensions, sniff_unknown)
+        return NormalizeStats(files, rewritten, size, time.perf_counter() - start, workers)
+    files = 0
+    rewritten = 0
+    size = 0
+    for batch_files, batch_rewritten, batch_size in map_batches(normalize_batch, file_paths, workers, (mode, extensions, sniff_unknown)):
+        files += batch_files
+        rewritten += batch_rewritten
+        size += batch_size
+    return NormalizeStats(files, rewritten, size, time.perf_counter() - start, workers)
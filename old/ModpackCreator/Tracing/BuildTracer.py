@@ -0,0 +1,218 @@
+from contextlib import nullcontext
+from threading import Lock, local
+from typing import Dict, List, Optional
+import functools
+import json
+import os
+import threading
+import time
+
+from ModpackCreator.Logging.BuildLog import log
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS
+    resource = None
+
+# Stages shown in the summary table, the longest ones
+SUMMARY_ROWS = 25
+# Shared by every stage when tracing is disabled
+NO_STAGE = nullcontext()
+
+# Bytes read and written by the process: through syscalls (rchar, wchar) and from the disk (read_bytes, write_bytes).
+# Linux only, None elsewhere.
+def read_io_counters() -> Optional[Dict[str, int]]:
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return {key: int(counters[key]) for key in ("rchar", "wchar", "read_bytes", "write_bytes")}
+    except (OSError, KeyError, ValueError):
+        return None
+
+# Peak RSS of the process and of its waited children, in bytes
+def read_peak_rss() -> Dict[str, int]:
+    if resource is None:
+        return {}
+    # Kilobytes on Linux, bytes on macOS
+    unit = 1 if os.uname().sysname == "Darwin" else 1024
+    return {"peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit, "children_peak_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit}
+
+def cpu_seconds() -> float:
+    # The threads of the process, and the subprocesses (mmc-export, process pools) once they are waited for
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class TracedStage:
+    # A stage being traced: measures on enter and exit, counters added while it runs
+
+    def __init__(self, tracer: "BuildTracer", name: str):
+        self.tracer = tracer
+        self.name = name
+        self.counters: Dict[str, int] = {}
+
+    def __enter__(self):
+        self.tracer.stack().append(self)
+        self.snapshot = None
+        if self.tracer.tracemalloc_top:
+            import tracemalloc
+            self.snapshot = tracemalloc.take_snapshot()
+        self.io = read_io_counters()
+        self.cpu = cpu_seconds()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        args = {"cpu_seconds": round(cpu_seconds() - self.cpu, 6)}
+        io = read_io_counters()
+        if io is not None and self.io is not None:
+            args.update({key: io[key] - self.io[key] for key in io})
+        args.update(read_peak_rss())
+        args.update(self.counters)
+        if exc_type is not None:
+            args["error"] = f"{exc_type.__name__}: {exc_value}"
+        if self.snapshot is not None:
+            import tracemalloc
+            statistics = tracemalloc.take_snapshot().compare_to(self.snapshot, "lineno")[:self.tracer.tracemalloc_top]
+            args["top_allocations"] = [f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno} {statistic.size_diff:+d} B in {statistic.count_diff:+d} blocks" for statistic in statistics]
+        self.tracer.stack().pop()
+        self.tracer.record(self.name, self.start, end, args)
+        return False
+
+class BuildTracer:
+    # Stages of a build: wall and CPU time, bytes read and written, files, peak RSS and optionally the top
+    # allocations traced by tracemalloc. Written as a Chrome trace (chrome://tracing, https://ui.perfetto.dev)
+    # and summarized in a table. Disabled, a stage is a shared null context: nothing is measured.
+
+    def __init__(self):
+        self.enabled = False
+        self.tracemalloc_top = 0
+        self.lock = Lock()
+        self.events: List[Dict] = []
+        self.local = local()
+        self.origin = time.perf_counter()
+
+    # Start tracing. tracemalloc_top > 0 also lists the top allocations of each stage, at a high cost.
+    # tracemalloc is only imported then: the CLI imports this module on every task run.
+    def start(self, tracemalloc_top: int = 0):
+        self.enabled = True
+        self.tracemalloc_top = tracemalloc_top
+        self.events = []
+        self.origin = time.perf_counter()
+        if tracemalloc_top:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def stop(self):
+        self.enabled = False
+        if self.tracemalloc_top:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    # Stages open on this thread, innermost last
+    def stack(self) -> List[TracedStage]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return NO_STAGE
+        return TracedStage(self, name)
+
+    # Add to a counter of the innermost stage of this thread: files, bytes...
+    def count(self, name: str, value: int):
+        if not self.enabled:
+            return
+        stack = self.stack()
+        if stack:
+            stack[-1].counters[name] = stack[-1].counters.get(name, 0) + value
+
+    # Span measured elsewhere, start and end from time.perf_counter(): a subprocess
+    def record(self, name: str, start: float, end: float, args: Optional[Dict] = None):
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": "stage", "ph": "X", "ts": round((start - self.origin) * 1e6), "dur": round((end - start) * 1e6), "pid": os.getpid(), "tid": threading.get_ident(), "args": dict(args or {}, wall_seconds=round(end - start, 6))}
+        with self.lock:
+            self.events.append(event)
+
+    def write_chrome_trace(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, indent=1)
+
+    # One line per stage name, the calls of a stage added up, in the order they started
+    def summary(self) -> str:
+        rows: Dict[str, Dict] = {}
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+        for event in events:
+            row = rows.setdefault(event["name"], {"calls": 0, "wall": 0.0, "cpu": 0.0, "read": 0, "written": 0, "files": 0, "peak_rss": 0})
+            args = event["args"]
+            row["calls"] += 1
+            row["wall"] += args["wall_seconds"]
+            row["cpu"] += args.get("cpu_seconds", 0.0)
+            row["read"] += args.get("rchar", 0)
+            row["written"] += args.get("wchar", 0)
+            row["files"] += args.get("files", 0)
+            row["peak_rss"] = max(row["peak_rss"], args.get("peak_rss", 0))
+        longest = set(sorted(rows, key=lambda name: rows[name]["wall"], reverse=True)[:SUMMARY_ROWS])
+        lines = [f"{'stage':<44} {'calls':>5} {'wall':>8} {'cpu':>8} {'read':>10} {'written':>10} {'files':>7} {'peak rss':>10}"]
+        for name, row in rows.items():
+            if name in longest:
+                lines.append(f"{name[:44]:<44} {row['calls']:>5} {row['wall']:7.2f}s {row['cpu']:7.2f}s {format_size(row['read']):>10} {format_size(row['written']):>10} {row['files']:>7} {format_size(row['peak_rss']):>10}")
+        if len(rows) > SUMMARY_ROWS:
+            lines.append(f"... {len(rows) - SUMMARY_ROWS} shorter stages in the trace file")
+        return "\n".join(lines)
+
+TRACER = BuildTracer()
+
+def trace_stage(name: str):
+    return TRACER.stage(name)
+
+def trace_count(name: str, value: int):
+    TRACER.count(name, value)
+
+# Decorator tracing each call of a function or method as a stage, named after it by default
+def traced(name: Optional[str] = None):
+    def decorate(function):
+        stage_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            with TracedStage(TRACER, stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Start tracing for a build if the config asks for it: "trace" (false), "trace_tracemalloc" (0, top allocations per stage)
+def start_tracing(config: Dict, forced: bool = False) -> bool:
+    if not forced and not config.get("trace", False):
+        return False
+    TRACER.start(config.get("trace_tracemalloc", 0))
+    return True
+
+# Write the trace of the build in "trace_dir" (temp/traces) and print the summary table
+def finish_tracing(config: Dict, label: str) -> Optional[str]:
+    if not TRACER.enabled:
+        return None
+    TRACER.stop()
+    path = os.path.join(config.get("trace_dir", "temp/traces"), f"trace-{label}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    TRACER.write_chrome_trace(path)
+    log.info(TRACER.summary())
+    log.info(f"Trace written to {path}")
+    return path
@@ -0,0 +1,182 @@
+from collections import deque
+from threading import Condition, Thread
+from typing import Deque, Dict, List, Optional, Set, Tuple
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import sys
+import time
+
+from ModpackCreator.Logging.BuildLog import log
+from ModpackCreator.Zip.ZipIndex import get_zip_index
+
+# Seconds a zip must keep the same size and mtime before it is read, after its last change
+DEFAULT_SETTLE_SECONDS = 2.0
+# Seconds between two scans of the polling watcher, and between two checks of the pending zips
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+def is_zip_name(name: str) -> bool:
+    return name.lower().endswith(".zip")
+
+class InotifyWatcher:
+    # Names of the zips written in a directory, from inotify: no scan of the directory. Linux only.
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed on {directory}")
+
+    # Names changed since the last call, waiting timeout seconds at most for the first one
+    def wait(self, timeout: float) -> Set[str]:
+        names = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while readable:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(errors="replace")
+                if is_zip_name(name):
+                    names.add(name)
+                offset += EVENT_HEADER.size + length
+            readable, _, _ = select.select([self.fd], [], [], 0)
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    # Names of the zips written in a directory, by comparing the size and mtime of its zips between two scans
+
+    def __init__(self, directory: str, interval: float = DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.signatures = self.scan()
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if is_zip_name(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def wait(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        signatures = self.scan()
+        names = {name for name, signature in signatures.items() if self.signatures.get(name) != signature}
+        self.signatures = signatures
+        return names
+
+    def close(self):
+        pass
+
+# inotify where it is available, a polling watcher elsewhere (other systems, network file systems, no watch left)
+def open_watcher(directory: str, interval: float = DEFAULT_POLL_INTERVAL):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            log.warning(f"inotify unavailable ({e}), polling {directory} every {interval}s")
+    return PollingWatcher(directory, interval)
+
+class ExportWatcher:
+    # Exports written in a directory, given to the builds once they are complete: same size and mtime for settle
+    # seconds, then a central directory that can be read. Several events of a zip written in bursts wait for the
+    # last one. The complete exports wait in a queue while a build runs, each at most once; an export written
+    # again while it is built is built again after.
+
+    def __init__(self, directory: str, version_pattern: str, settle: float = DEFAULT_SETTLE_SECONDS, interval: float = DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.version_pattern = version_pattern
+        self.settle = settle
+        self.interval = interval
+        self.condition = Condition()
+        # {name: (size, mtime_ns, time of the last change)} of the zips being written
+        self.pending: Dict[str, Tuple[int, int, float]] = {}
+        self.queue: Deque[str] = deque()
+        self.stopped = False
+        self.watcher = open_watcher(directory, interval)
+        self.thread = Thread(target=self.watch, name="export-watcher", daemon=True)
+
+    def start(self):
+        log.info(f"Watching {self.directory} ({type(self.watcher).__name__})")
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.watcher.close()
+
+    def watch(self):
+        while not self.stopped:
+            names = self.watcher.wait(min(self.settle, self.interval) if self.pending else self.interval)
+            now = time.monotonic()
+            for name in names:
+                # Reset by every event: a burst is one change
+                self.pending[name] = (-1, -1, now)
+            for name in list(self.pending):
+                self.check_pending(name, now)
+
+    def check_pending(self, name: str, now: float):
+        path = os.path.join(self.directory, name)
+        size, mtime_ns, changed = self.pending[name]
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            del self.pending[name]
+            return
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            self.pending[name] = (stat.st_size, stat.st_mtime_ns, now)
+            return
+        if now - changed < self.settle:
+            return
+        del self.pending[name]
+        try:
+            entries = len(get_zip_index(path))
+        except Exception as e:
+            log.warning(f"{name} isn't a valid zip ({e}), waiting for it to be written again")
+            return
+        if re.search(self.version_pattern, name) is None:
+            log.warning(f"{name} has no version in its name, skipped")
+            return
+        with self.condition:
+            if name not in self.queue:
+                self.queue.append(name)
+                log.info(f"{name} is complete ({entries} entries, {stat.st_size / 1024 / 1024:.1f} MB), {len(self.queue)} export(s) queued")
+                self.condition.notify_all()
+
+    # Next complete export, waiting for one. None once stopped.
+    def next_export(self, timeout: Optional[float] = None) -> Optional[str]:
+        with self.condition:
+            self.condition.wait_for(lambda: self.queue or self.stopped, timeout)
+            if self.stopped or not self.queue:
+                return None
+            return self.queue.popleft()
+
+    def queued(self) -> List[str]:
+        with self.condition:
+            return list(self.queue)
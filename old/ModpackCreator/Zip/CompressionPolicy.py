@@ -0,0 +1,189 @@
+from fnmatch import fnmatchcase
+from threading import Lock
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import time
+import zlib
+
+from ModpackCreator.Zip.ZipRecords import ZIP_DEFLATED, ZIP_STORED
+
+# Methods of a rule
+STORE = "store"
+DEFLATE = "deflate"
+# Profiles
+PROFILE_RELEASE = "release"
+PROFILE_INTERMEDIATE = "intermediate"
+# Profile of each output target when not set in the config
+DEFAULT_TARGET_PROFILES = {
+    # Consumed locally by mmc-export, never distributed
+    "prepared_export": PROFILE_INTERMEDIATE,
+    "curseforge_pack": PROFILE_RELEASE,
+    "modrinth_pack": PROFILE_RELEASE,
+}
+# Already compressed formats: deflating them again saves almost nothing
+DEFAULT_STORE_PATTERNS = ["*.jar", "*.zip", "*.png", "*.jpg", "*.jpeg", "*.ogg", "*.mp3", "*.gz", "*.xz", "*.7z", "*.mrpack"]
+# Level of the "deflate everything" baseline used to compute the savings
+BASELINE_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+# Bytes of each entry compressed at the baseline level to estimate the savings
+SAMPLE_SIZE = 32 * 1024
+# Reports: sizes per rule, or also the savings compared to the baseline, estimated by compressing a sample of
+# every entry again: opt-in, it costs CPU time on every entry written
+REPORT_SUMMARY = "summary"
+REPORT_DETAILED = "detailed"
+
+class CompressionRule:
+    # Entries matching the glob pattern are stored or deflated at the level
+    __slots__ = ("pattern", "method", "level")
+
+    def __init__(self, pattern: str, method: str, level: int = zlib.Z_DEFAULT_COMPRESSION):
+        if method not in (STORE, DEFLATE):
+            raise Exception(f"Invalid compression method '{method}', expected '{STORE}' or '{DEFLATE}'")
+        self.pattern = pattern
+        self.method = method
+        self.level = level
+
+    # Patterns without "/" match the file name, the others the whole entry name
+    def matches(self, name: str) -> bool:
+        if "/" not in self.pattern:
+            name = name.rstrip("/").rsplit("/", 1)[-1]
+        return fnmatchcase(name, self.pattern)
+
+    def compress_type(self) -> int:
+        return ZIP_STORED if self.method == STORE else ZIP_DEFLATED
+
+    def is_baseline(self) -> bool:
+        return self.method == DEFLATE and self.level == BASELINE_LEVEL
+
+    def __str__(self):
+        return f"{self.pattern} -> {self.method}" + (f" (level {self.level})" if self.method == DEFLATE and self.level != zlib.Z_DEFAULT_COMPRESSION else "")
+
+class RuleStats:
+    # What a rule did during a build, and what deflating at the baseline level would have cost
+    __slots__ = ("entries", "size", "compressed_size", "cpu_time", "baseline_size", "baseline_cpu_time")
+
+    def __init__(self):
+        self.entries = 0
+        self.size = 0
+        self.compressed_size = 0
+        self.cpu_time = 0.0
+        self.baseline_size = 0.0
+        self.baseline_cpu_time = 0.0
+
+class SamplingReader:
+    # Keeps the start of what is read, to estimate the compression savings of streamed entries
+    def __init__(self, reader: BinaryIO):
+        self.reader = reader
+        self.sample = b""
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.reader.read(size)
+        if len(self.sample) < SAMPLE_SIZE:
+            self.sample += chunk[:SAMPLE_SIZE - len(self.sample)]
+        return chunk
+
+class CompressionPolicy:
+    # Chooses the compression of each entry of a zip and collects per rule statistics. Thread safe.
+
+    def __init__(self, rules: List[CompressionRule], target: str = "", profile: str = PROFILE_RELEASE, report_mode: str = REPORT_SUMMARY):
+        if report_mode not in (REPORT_SUMMARY, REPORT_DETAILED):
+            raise Exception(f"Invalid compression report '{report_mode}', expected '{REPORT_SUMMARY}' or '{REPORT_DETAILED}'")
+        self.target = target
+        self.profile = profile
+        self.detailed = report_mode == REPORT_DETAILED
+        # The last rule always matches
+        self.rules = rules + [CompressionRule("*", DEFLATE)]
+        self.stats = [RuleStats() for _ in self.rules]
+        self.lock = Lock()
+
+    # Rule index, compress type and level of an entry
+    def choose(self, name: str) -> Tuple[int, int, int]:
+        for i, rule in enumerate(self.rules):
+            if rule.matches(name):
+                return i, rule.compress_type(), rule.level
+        raise AssertionError("The catch-all rule always matches")
+
+    # Compress content with the rule, record the statistics. Returns (crc, compressed content).
+    def compress(self, rule_index: int, content: bytes) -> Tuple[int, bytes]:
+        rule = self.rules[rule_index]
+        start = time.thread_time()
+        crc = zlib.crc32(content)
+        compressed = content
+        if rule.method == DEFLATE:
+            compressor = zlib.compressobj(rule.level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(content) + compressor.flush()
+        cpu_time = time.thread_time() - start
+        self.record(rule_index, content[:SAMPLE_SIZE] if self.detailed else b"", len(content), len(compressed), cpu_time)
+        return crc, compressed
+
+    # Record a compressed entry. The sample is the start of the entry, used to estimate the baseline of a detailed report.
+    def record(self, rule_index: int, sample: bytes, size: int, compressed_size: int, cpu_time: float):
+        rule = self.rules[rule_index]
+        if not self.detailed or rule.is_baseline() or not sample:
+            baseline_size, baseline_cpu_time = compressed_size, cpu_time
+        else:
+            start = time.thread_time()
+            compressor = zlib.compressobj(BASELINE_LEVEL, zlib.DEFLATED, -15)
+            sample_size = len(compressor.compress(sample) + compressor.flush())
+            sample_cpu_time = time.thread_time() - start
+            ratio = size / len(sample)
+            baseline_size, baseline_cpu_time = sample_size * ratio, sample_cpu_time * ratio
+        with self.lock:
+            stats = self.stats[rule_index]
+            stats.entries += 1
+            stats.size += size
+            stats.compressed_size += compressed_size
+            stats.cpu_time += cpu_time
+            stats.baseline_size += baseline_size
+            stats.baseline_cpu_time += baseline_cpu_time
+
+    # One line per rule used: entries and sizes, and in a detailed report the bytes and CPU time saved compared to
+    # deflating everything
+    def report(self) -> str:
+        if not self.detailed:
+            lines = [f"Compression of {self.target or 'zip'} ({self.profile} profile):"]
+            lines.append(f"  {'rule':<32}{'entries':>8}{'in':>12}{'out':>12}{'CPU':>11}")
+            for rule, stats in zip(self.rules, self.stats):
+                if stats.entries:
+                    lines.append(f"  {str(rule):<32}{stats.entries:>8}{format_size(stats.size):>12}{format_size(stats.compressed_size):>12}{stats.cpu_time:>10.2f}s")
+            return "\n".join(lines)
+        lines = [f"Compression of {self.target or 'zip'} ({self.profile} profile), savings compared to deflating everything:"]
+        lines.append(f"  {'rule':<32}{'entries':>8}{'in':>12}{'out':>12}{'bytes saved':>14}{'CPU saved':>11}")
+        for rule, stats in zip(self.rules, self.stats):
+            if stats.entries == 0:
+                continue
+            bytes_saved = stats.baseline_size - stats.compressed_size
+            cpu_saved = stats.baseline_cpu_time - stats.cpu_time
+            lines.append(f"  {str(rule):<32}{stats.entries:>8}{format_size(stats.size):>12}{format_size(stats.compressed_size):>12}{format_size(bytes_saved):>14}{cpu_saved:>10.2f}s")
+        return "\n".join(lines)
+
+    # Stream an entry through a raw zip writer with the rule of its name, record the statistics
+    def write_stream(self, writer, record, reader: BinaryIO, size: int):
+        rule_index, record.compress_type, level = self.choose(record.name)
+        sampling_reader = SamplingReader(reader) if self.detailed else None
+        start = time.thread_time()
+        writer.write_stream(record, sampling_reader or reader, size, level)
+        self.record(rule_index, sampling_reader.sample if sampling_reader else b"", record.size, record.compressed_size, time.thread_time() - start)
+
+def format_size(size: float) -> str:
+    return f"{size / 1024 / 1024:.1f} MB"
+
+# Policy of an output target, from the "compression" section of the config:
+# {"rules": [{"pattern": "*.jar", "method": "store"}, {"pattern": "*.json", "method": "deflate", "level": 9}],
+#  "level": 6, "targets": {"prepared_export": {"profile": "intermediate"}, "curseforge_pack": {"level": 9}},
+#  "report": "summary"}. "report": "detailed" also estimates the savings compared to deflating everything.
+def load_policy(config: Dict, target: str) -> CompressionPolicy:
+    compression = config.get("compression", {})
+    target_config = compression.get("targets", {}).get(target, {})
+    profile = target_config.get("profile", DEFAULT_TARGET_PROFILES.get(target, PROFILE_RELEASE))
+    level = target_config.get("level", compression.get("level", zlib.Z_DEFAULT_COMPRESSION))
+    if profile == PROFILE_INTERMEDIATE:
+        rules = [CompressionRule("*", STORE)]
+    elif profile == PROFILE_RELEASE:
+        rules_config: Optional[List[Dict]] = compression.get("rules")
+        if rules_config is None:
+            rules = [CompressionRule(pattern, STORE) for pattern in DEFAULT_STORE_PATTERNS]
+        else:
+            rules = [CompressionRule(rule["pattern"], rule.get("method", DEFLATE), rule.get("level", level)) for rule in rules_config]
+        rules.append(CompressionRule("*", DEFLATE, level))
+    else:
+        raise Exception(f"Invalid compression profile '{profile}' for {target}, expected '{PROFILE_RELEASE}' or '{PROFILE_INTERMEDIATE}'")
+    return CompressionPolicy(rules, target, profile, compression.get("report", REPORT_SUMMARY))
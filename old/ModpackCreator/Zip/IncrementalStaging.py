@@ -0,0 +1,144 @@
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from ModpackCreator.Zip.ZipIndex import get_zip_index
+from ModpackCreator.Zip.ZipPatcher import current_umask
+from ModpackCreator.Zip.ZipRecords import CHUNK_SIZE
+
+# Bump when the layout of the staging tree changes, older stagings are rebuilt
+MANIFEST_VERSION = 1
+
+class RestageStats:
+    # What an update of the staging tree did
+    def __init__(self, extracted: int, extracted_size: int, deleted: int, unchanged: int, full: bool, seconds: float):
+        self.extracted = extracted
+        self.extracted_size = extracted_size
+        self.deleted = deleted
+        self.unchanged = unchanged
+        self.full = full
+        self.seconds = seconds
+
+    def summary(self) -> str:
+        kind = "Full restaging" if self.full else "Incremental restaging"
+        return f"{kind}: {self.extracted} entries extracted ({self.extracted_size / 1024 / 1024:.1f} MB), {self.deleted} deleted, {self.unchanged} unchanged in {self.seconds:.2f}s"
+
+class IncrementalStaging:
+    # Staging tree kept between builds, with a manifest of the export entries it was built from (name, size, CRC).
+    # update() only extracts the entries that changed and deletes the ones that are gone. The manifest is removed
+    # while the tree is modified and written back by commit(): an interrupted build is followed by a full restaging.
+
+    def __init__(self, staging_dir: str, manifest_path: str, settings: Dict):
+        self.staging_dir = staging_dir
+        self.manifest_path = manifest_path
+        # Everything else the content of the tree depends on (normalization mode...), a change means a full restaging
+        self.settings = settings
+        # {entry name: [size, crc]} of the entries in the tree
+        self.entries: Dict[str, List[int]] = {}
+        # Stats of the last update
+        self.stats: Optional[RestageStats] = None
+
+    def load_manifest(self) -> bool:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != self.settings or not os.path.isdir(self.staging_dir):
+            return False
+        self.entries = manifest["entries"]
+        return True
+
+    def staged_path(self, name: str) -> str:
+        parts = name.rstrip("/").split("/")
+        if name.startswith("/") or ".." in parts:
+            raise Exception(f"Unsafe entry name in export: '{name}'")
+        return os.path.join(self.staging_dir, *parts)
+
+    # Bring the tree up to date with the included entries of the zip. Returns the paths of the extracted files.
+    def update(self, zip_path: str, is_included: Callable[[str], bool]) -> List[str]:
+        start = time.perf_counter()
+        full = not self.load_manifest()
+        if full:
+            self.entries = {}
+            if os.path.isdir(self.staging_dir):
+                shutil.rmtree(self.staging_dir)
+        # The tree is about to differ from the manifest
+        forget_staging(self.manifest_path)
+        index = get_zip_index(zip_path)
+        new_entries = {entry.name: [entry.size, entry.crc] for entry in index if is_included(entry.name)}
+        # Gone entries first: a file can be replaced by a directory of the same name
+        deleted = 0
+        for name in sorted(set(self.entries) - set(new_entries), reverse=True):
+            if self.remove_entry(name):
+                deleted += 1
+        extracted_paths = []
+        extracted_size = 0
+        unchanged = 0
+        with zipfile.ZipFile(zip_path) as archive:
+            for name, record in new_entries.items():
+                path = self.staged_path(name)
+                if self.entries.get(name) == record and (os.path.isdir(path) if name.endswith("/") else os.path.isfile(path)):
+                    unchanged += 1
+                    continue
+                if name.endswith("/"):
+                    os.makedirs(path, exist_ok=True)
+                    continue
+                self.extract_entry(archive, name, path)
+                extracted_paths.append(path)
+                extracted_size += record[0]
+        self.entries = new_entries
+        self.stats = RestageStats(len(extracted_paths), extracted_size, deleted, unchanged, full, time.perf_counter() - start)
+        return extracted_paths
+
+    def extract_entry(self, archive: zipfile.ZipFile, name: str, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written next to the staged file then renamed, the tree never holds a half written file
+        fd, temp_path = tempfile.mkstemp(prefix=".restage-", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as temp_file, archive.open(name) as from_file:
+                shutil.copyfileobj(from_file, temp_file, CHUNK_SIZE)
+            # Same mode as a file extracted by shutil.unpack_archive
+            os.chmod(temp_path, 0o666 & ~current_umask())
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def remove_entry(self, name: str) -> bool:
+        path = self.staged_path(name)
+        if name.endswith("/"):
+            # Directories are only removed once empty
+            if os.path.isdir(path) and not os.listdir(path):
+                os.rmdir(path)
+                return True
+            return False
+        if not os.path.isfile(path):
+            return False
+        os.remove(path)
+        # Remove the parent directories left empty, they were not entries of their own
+        parent = os.path.dirname(path)
+        while os.path.realpath(parent) != os.path.realpath(self.staging_dir) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+        return True
+
+    # The tree is complete: write the manifest
+    def commit(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".manifest-", dir=os.path.dirname(self.manifest_path) or ".")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "settings": self.settings, "entries": self.entries}, f)
+        os.replace(temp_path, self.manifest_path)
+
+# To call when the staging tree is rebuilt by other means
+def forget_staging(manifest_path: str):
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
@@ -0,0 +1,125 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Deque, Optional, Tuple
+import os
+import time
+import zlib
+
+from ModpackCreator.Zip.CompressionPolicy import CompressionPolicy, load_policy
+from ModpackCreator.Zip.ZipRecords import CentralRecord, RawZipWriter, ZIP_STORED
+
+# Bigger entries are compressed by chunks on the calling thread instead of in the pool
+LARGE_ENTRY_SIZE = 64 * 1024 * 1024
+# Max size of the entries waiting to be written, bounds the memory use
+MAX_PENDING_SIZE = 256 * 1024 * 1024
+# Oldest date a zip can store
+MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def store_entry(content: bytes) -> Tuple[int, bytes]:
+    return zlib.crc32(content), content
+
+def file_date_time(st: os.stat_result) -> Tuple[int, int, int, int, int, int]:
+    return max(time.localtime(st.st_mtime)[:6], MIN_DATE_TIME)
+
+class ParallelZipWriter:
+    # Zip writer compressing the entries in a thread pool. Entries are written in the order they are added.
+    # The compression of each entry is chosen by the policy, the default one if none is given.
+
+    def __init__(self, zip_path: str, workers: Optional[int] = None, policy: Optional[CompressionPolicy] = None):
+        self.zip_path = zip_path
+        self.policy = policy or load_policy({}, "")
+        self.f = open(zip_path, "wb")
+        self.writer = RawZipWriter(self.f)
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        # Entries compressed or being compressed, in order
+        self.pending: Deque[Tuple[CentralRecord, Future]] = deque()
+        self.pending_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # Add a directory entry
+    def add_dir(self, arcname: str, date_time: Optional[Tuple[int, int, int, int, int, int]] = None, external_attr: int = (0o40755 << 16) | 0x10):
+        record = CentralRecord(arcname.rstrip("/") + "/", ZIP_STORED, date_time, external_attr)
+        record.size = 0
+        self._append(record, self.pool.submit(store_entry, b""))
+
+    # Add an entry from bytes
+    def add_bytes(self, arcname: str, content: bytes, date_time: Optional[Tuple[int, int, int, int, int, int]] = None, external_attr: int = 0o600 << 16):
+        rule_index, compress_type, _ = self.policy.choose(arcname)
+        record = CentralRecord(arcname, compress_type, date_time, external_attr)
+        record.size = len(content)
+        self._append(record, self.pool.submit(self.policy.compress, rule_index, content))
+
+    # Add an entry from a readable file object. Large entries are streamed, the others compressed in the pool.
+    def add_stream(self, arcname: str, reader: BinaryIO, size: int, date_time: Optional[Tuple[int, int, int, int, int, int]] = None, external_attr: int = 0o600 << 16):
+        if size <= LARGE_ENTRY_SIZE:
+            self.add_bytes(arcname, reader.read(), date_time, external_attr)
+            return
+        record = CentralRecord(arcname, date_time=date_time, external_attr=external_attr)
+        # Keep the order: everything added before is written first
+        self._drain(wait_all=True)
+        self.policy.write_stream(self.writer, record, reader, size)
+
+    # Add a file or a directory from the disk, with its date and permissions
+    def add_file(self, path: str, arcname: str):
+        st = os.stat(path)
+        if os.path.isdir(path):
+            self.add_dir(arcname, file_date_time(st), (st.st_mode & 0xFFFF) << 16 | 0x10)
+            return
+        with open(path, "rb") as reader:
+            self.add_stream(arcname, reader, st.st_size, file_date_time(st), (st.st_mode & 0xFFFF) << 16)
+
+    # Write the remaining entries and the central directory
+    def close(self):
+        try:
+            self._drain(wait_all=True)
+            self.writer.close()
+        finally:
+            self.pool.shutdown()
+            self.f.close()
+
+    # Stop without writing a valid zip
+    def abort(self):
+        for _, future in self.pending:
+            future.cancel()
+        self.pool.shutdown()
+        self.f.close()
+
+    def _append(self, record: CentralRecord, future: Future):
+        self.pending.append((record, future))
+        self.pending_size += record.size
+        self._drain()
+
+    def _drain(self, wait_all: bool = False):
+        # Write the compressed oldest entries, wait for them if too much data is pending
+        while self.pending and (wait_all or self.pending_size > MAX_PENDING_SIZE or self.pending[0][1].done()):
+            record, future = self.pending.popleft()
+            record.crc, compressed = future.result()
+            self.pending_size -= record.size
+            self.writer.write_compressed(record, compressed)
+
+# Same result as shutil.make_archive(base_name, "zip", root_dir), with the compression done in parallel
+def make_archive(base_name: str, root_dir: str, workers: Optional[int] = None, policy: Optional[CompressionPolicy] = None) -> str:
+    zip_path = base_name + ".zip"
+    if os.path.dirname(zip_path):
+        os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    with ParallelZipWriter(zip_path, workers, policy) as writer:
+        for dir_path, dir_names, file_names in os.walk(root_dir):
+            # Sorted walk, the output doesn't depend on the file system order
+            dir_names.sort()
+            arc_dir_path = os.path.relpath(dir_path, root_dir)
+            arc_dir_path = "" if arc_dir_path == os.curdir else arc_dir_path.replace(os.sep, "/") + "/"
+            for name in dir_names:
+                writer.add_file(os.path.join(dir_path, name), arc_dir_path + name)
+            for name in sorted(file_names):
+                path = os.path.join(dir_path, name)
+                if os.path.isfile(path):
+                    writer.add_file(path, arc_dir_path + name)
+    return zip_path
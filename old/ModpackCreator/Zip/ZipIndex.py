@@ -0,0 +1,166 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import zipfile
+
+from ModpackCreator.Zip.ZipRecords import read_central_records
+
+class ZipEntry:
+    # Compact record of a central directory entry
+    __slots__ = ("name", "size", "compressed_size", "crc", "offset", "compress_type", "flag_bits", "dos_date_time", "external_attr")
+
+    def __init__(self, name: str, size: int, compressed_size: int, crc: int, offset: int, compress_type: int, flag_bits: int, dos_date_time: int, external_attr: int):
+        self.name = name
+        self.size = size
+        self.compressed_size = compressed_size
+        self.crc = crc
+        self.offset = offset
+        self.compress_type = compress_type
+        self.flag_bits = flag_bits
+        self.dos_date_time = dos_date_time
+        self.external_attr = external_attr
+
+    # Date time tuple, like ZipInfo.date_time
+    @property
+    def date_time(self) -> Tuple[int, int, int, int, int, int]:
+        date = self.dos_date_time >> 16
+        time = self.dos_date_time & 0xFFFF
+        return ((date >> 9) + 1980, (date >> 5) & 0xF, date & 0x1F, time >> 11, (time >> 5) & 0x3F, (time & 0x1F) * 2)
+
+    def is_dir(self) -> bool:
+        return self.name.endswith("/")
+
+    def __repr__(self):
+        return f"ZipEntry({self.name!r}, size={self.size}, compressed_size={self.compressed_size}, crc={self.crc:#010x}, offset={self.offset})"
+
+class ZipIndex:
+    # In-memory index of the central directory of a zip. The zip is read once, at init.
+
+    def __init__(self, zip_path: str):
+        self.zip_path = zip_path
+        # Entries in central directory order, array backed
+        self.names: List[str] = []
+        self.sizes = array("Q")
+        self.compressed_sizes = array("Q")
+        self.crcs = array("L")
+        self.offsets = array("Q")
+        self.compress_types = array("H")
+        self.flag_bits = array("H")
+        self.dos_date_times = array("L")
+        self.external_attrs = array("L")
+        # Name to position in the arrays
+        self.positions: Dict[str, int] = {}
+        with open(zip_path, "rb") as f:
+            try:
+                records = read_central_records(f)
+            except zipfile.BadZipFile as e:
+                raise zipfile.BadZipFile(f"{e}: {zip_path}")
+        for record in records:
+            self.positions[record.name] = len(self.names)
+            self.names.append(record.name)
+            self.sizes.append(record.size)
+            self.compressed_sizes.append(record.compressed_size)
+            self.crcs.append(record.crc)
+            self.offsets.append(record.offset)
+            self.compress_types.append(record.compress_type)
+            self.flag_bits.append(record.flag_bits)
+            self.dos_date_times.append(record.dos_date << 16 | record.dos_time)
+            self.external_attrs.append(record.external_attr)
+        # Sorted names for prefix and directory lookups
+        self.sorted_names = sorted(self.positions.keys())
+
+    """ ENTRIES """
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[ZipEntry]:
+        for i in range(len(self.names)):
+            yield self._entry(i)
+
+    def __contains__(self, name: str):
+        return name in self.positions
+
+    def _entry(self, i: int) -> ZipEntry:
+        return ZipEntry(self.names[i], self.sizes[i], self.compressed_sizes[i], self.crcs[i], self.offsets[i], self.compress_types[i], self.flag_bits[i], self.dos_date_times[i], self.external_attrs[i])
+
+    # Get an entry by name, None if it doesn't exist
+    def get(self, name: str) -> Optional[ZipEntry]:
+        i = self.positions.get(name)
+        if i is None:
+            return None
+        return self._entry(i)
+
+    """ LOOKUPS """
+
+    # Verify that the zip contains the file
+    def contains_file(self, name: str) -> bool:
+        return name in self.positions and not name.endswith("/")
+
+    # Verify that at least one entry name starts with the prefix. O(log n)
+    def contains_prefix(self, prefix: str) -> bool:
+        i = bisect_left(self.sorted_names, prefix)
+        return i < len(self.sorted_names) and self.sorted_names[i].startswith(prefix)
+
+    # Verify that the zip contains the directory, even if it has no directory entry. O(log n)
+    def contains_dir(self, dir_name: str) -> bool:
+        return self.contains_prefix(dir_name.strip("/") + "/")
+
+    # Names starting with the prefix, in sorted order
+    def list_prefix(self, prefix: str) -> Iterator[str]:
+        i = bisect_left(self.sorted_names, prefix)
+        while i < len(self.sorted_names) and self.sorted_names[i].startswith(prefix):
+            yield self.sorted_names[i]
+            i += 1
+
+    # Direct children of a directory ("" for the zip root), directories end with "/"
+    def list_dir(self, dir_name: str = "") -> List[str]:
+        prefix = dir_name.strip("/") + "/" if dir_name.strip("/") else ""
+        children = []
+        i = bisect_left(self.sorted_names, prefix)
+        while i < len(self.sorted_names) and self.sorted_names[i].startswith(prefix):
+            name = self.sorted_names[i][len(prefix):]
+            separator = name.find("/")
+            if separator < 0:
+                children.append(name)
+                i += 1
+            else:
+                # Skip the whole sub directory
+                child = name[:separator + 1]
+                if child != "/":
+                    children.append(child)
+                i = bisect_left(self.sorted_names, prefix + child[:-1] + "0", i)
+        return children
+
+# Indexes already loaded, least recently used first. An index is replaced when its zip changes on disk, dropped when
+# the zip is gone, and the least recently used ones are dropped past ZIP_INDEXES_CACHE_SIZE: a watch or daemon process
+# sees a new export per build, the cache must not grow with them.
+ZIP_INDEXES_CACHE_SIZE = 8
+zip_indexes_cache: "OrderedDict[str, Tuple[Tuple[int, int, int], ZipIndex]]" = OrderedDict()
+zip_indexes_lock = Lock()
+
+# Get the index of a zip. The zip is parsed only if it changed since the last call.
+def get_zip_index(zip_path: str) -> ZipIndex:
+    key = os.path.realpath(zip_path)
+    try:
+        stat = os.stat(key)
+    except FileNotFoundError:
+        with zip_indexes_lock:
+            zip_indexes_cache.pop(key, None)
+        raise
+    signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    with zip_indexes_lock:
+        cached = zip_indexes_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            zip_indexes_cache.move_to_end(key)
+            return cached[1]
+    index = ZipIndex(zip_path)
+    with zip_indexes_lock:
+        zip_indexes_cache[key] = (signature, index)
+        zip_indexes_cache.move_to_end(key)
+        while len(zip_indexes_cache) > ZIP_INDEXES_CACHE_SIZE:
+            zip_indexes_cache.popitem(last=False)
+    return index
@@ -0,0 +1,99 @@
+from typing import Dict, Optional, Set, Tuple
+import io
+import os
+import tempfile
+import time
+
+from ModpackCreator.Zip.CompressionPolicy import CompressionPolicy
+from ModpackCreator.Zip.ZipRecords import CentralRecord, RawZipWriter, ZIP_DEFLATED, ZIP_STORED, read_central_records
+
+# Umask of the process, os.umask can only be read by setting it
+def current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+class ZipPatcher:
+    # Replace, add or delete entries of a zip. Unchanged entries are copied as raw compressed bytes,
+    # only the new entries are compressed. Memory use doesn't depend on the size of the entries.
+    # With a policy, the new entries are compressed with its rules.
+
+    def __init__(self, archive_path: str, policy: Optional[CompressionPolicy] = None):
+        self.archive_path = archive_path
+        self.policy = policy
+        # Entry name -> ("file", path) or ("bytes", content)
+        self.puts: Dict[str, Tuple[str, object]] = {}
+        self.deletes: Set[str] = set()
+
+    # Add or replace an entry with the content of a file
+    def put_file(self, name: str, file_path: str):
+        self.deletes.discard(name)
+        self.puts[name] = ("file", file_path)
+
+    # Add or replace an entry with bytes
+    def put_bytes(self, name: str, content: bytes):
+        self.deletes.discard(name)
+        self.puts[name] = ("bytes", content)
+
+    # Delete an entry
+    def delete(self, name: str):
+        self.puts.pop(name, None)
+        self.deletes.add(name)
+
+    # Write the patched zip to output_path, or replace the archive if no output path is given
+    def apply(self, output_path: Optional[str] = None):
+        target_path = output_path or self.archive_path
+        target_dir = os.path.dirname(os.path.abspath(target_path))
+        # Write next to the target, then replace it: the archive is never left half written
+        fd, temp_path = tempfile.mkstemp(prefix=".patch-", suffix=".zip", dir=target_dir)
+        try:
+            with open(self.archive_path, "rb") as source, os.fdopen(fd, "wb") as f:
+                writer = RawZipWriter(f)
+                written = set()
+                for record in read_central_records(source):
+                    if record.name in self.deletes or record.name in written:
+                        continue
+                    if record.name in self.puts:
+                        # Replaced entries keep their place and attributes, stored entries stay stored
+                        compress_type = ZIP_STORED if record.compress_type == ZIP_STORED else ZIP_DEFLATED
+                        new_record = CentralRecord(record.name, compress_type, external_attr=record.external_attr)
+                        self._write_put(writer, new_record)
+                    else:
+                        writer.write_raw_entry(source, record)
+                    written.add(record.name)
+                # New entries at the end
+                for name in self.puts:
+                    if name not in written:
+                        self._write_put(writer, self._new_record(name))
+                writer.close()
+            # Keep the permissions of the replaced file, mkstemp creates it private
+            if os.path.exists(target_path):
+                os.chmod(temp_path, os.stat(target_path).st_mode & 0o7777)
+            else:
+                os.chmod(temp_path, 0o666 & ~current_umask())
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    # Record of an added entry. From a file, its modification time and mode, like ZipFile.write; from bytes, the
+    # current time and 0o600, like ZipFile.writestr.
+    def _new_record(self, name: str) -> CentralRecord:
+        kind, value = self.puts[name]
+        if kind != "file":
+            return CentralRecord(name)
+        st = os.stat(value)
+        return CentralRecord(name, date_time=time.localtime(st.st_mtime)[0:6], external_attr=(st.st_mode & 0xFFFF) << 16)
+
+    def _write_put(self, writer: RawZipWriter, record: CentralRecord):
+        kind, value = self.puts[record.name]
+        if kind == "file":
+            reader, size = open(value, "rb"), os.path.getsize(value)
+        else:
+            reader, size = io.BytesIO(value), len(value)
+        with reader:
+            if self.policy is not None:
+                self.policy.write_stream(writer, record, reader, size)
+            else:
+                writer.write_stream(record, reader, size)
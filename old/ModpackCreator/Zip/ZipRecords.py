@@ -0,0 +1,332 @@
+from typing import BinaryIO, List, Optional, Tuple
+import os
+import struct
+import time
+import zipfile
+import zlib
+
+# End of central directory record
+EOCD_STRUCT = struct.Struct("<4s4H2LH")
+EOCD_SIGNATURE = b"PK\x05\x06"
+# Zip64 end of central directory locator
+ZIP64_LOCATOR_STRUCT = struct.Struct("<4sLQL")
+ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+# Zip64 end of central directory record
+ZIP64_EOCD_STRUCT = struct.Struct("<4sQ2H2L4Q")
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+# Central directory file header
+CENTRAL_DIR_STRUCT = struct.Struct("<4s4B4HL2L5H2L")
+CENTRAL_DIR_SIGNATURE = b"PK\x01\x02"
+# Local file header
+LOCAL_HEADER_STRUCT = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+# Data descriptor
+DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# Zip64 extra field id
+ZIP64_EXTRA_ID = 0x0001
+# Values above these limits need zip64 records
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+# Versions needed to extract
+DEFAULT_VERSION = 20
+ZIP64_VERSION = 45
+# Flag bits
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+# Compression methods
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+# Chunk size used to copy and compress entries
+CHUNK_SIZE = 1024 * 1024
+# Max size of the end of central directory record with its comment
+EOCD_MAX_SIZE = EOCD_STRUCT.size + 0xFFFF
+
+""" DATES """
+
+def dos_date_time(date_time: Tuple[int, int, int, int, int, int]) -> Tuple[int, int]:
+    # Same encoding as zipfile: (dos date, dos time)
+    dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dos_time = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    return dos_date, dos_time
+
+def now_date_time() -> Tuple[int, int, int, int, int, int]:
+    return time.localtime(time.time())[:6]
+
+""" EXTRA FIELDS """
+
+def strip_zip64_extra(extra: bytes) -> bytes:
+    # Remove the zip64 field, it is rebuilt when the entry is written
+    stripped = b""
+    position = 0
+    while position + 4 <= len(extra):
+        extra_id, extra_length = struct.unpack_from("<2H", extra, position)
+        if extra_id != ZIP64_EXTRA_ID:
+            stripped += extra[position:position + 4 + extra_length]
+        position += 4 + extra_length
+    return stripped
+
+def read_zip64_extra(extra: bytes, size: int, compressed_size: int, offset: int) -> Tuple[int, int, int]:
+    position = 0
+    while position + 4 <= len(extra):
+        extra_id, extra_length = struct.unpack_from("<2H", extra, position)
+        position += 4
+        if extra_id == ZIP64_EXTRA_ID:
+            values = iter(struct.unpack_from(f"<{extra_length // 8}Q", extra, position))
+            # Only the values saturated in the header are present, in this order
+            if size == ZIP64_LIMIT:
+                size = next(values)
+            if compressed_size == ZIP64_LIMIT:
+                compressed_size = next(values)
+            if offset == ZIP64_LIMIT:
+                offset = next(values)
+            break
+        position += extra_length
+    return size, compressed_size, offset
+
+""" RECORDS """
+
+class CentralRecord:
+    # Everything needed to write the central directory header of an entry
+    __slots__ = ("name", "create_version", "create_system", "extract_version", "flag_bits", "compress_type", "dos_time", "dos_date", "crc", "compressed_size", "size", "internal_attr", "external_attr", "offset", "extra", "comment")
+
+    def __init__(self, name: str, compress_type: int = ZIP_DEFLATED, date_time: Optional[Tuple[int, int, int, int, int, int]] = None, external_attr: int = 0o600 << 16):
+        self.name = name
+        self.create_version = DEFAULT_VERSION
+        # Unix, like zipfile on posix platforms
+        self.create_system = 3
+        self.extract_version = DEFAULT_VERSION
+        self.flag_bits = 0 if name.isascii() else FLAG_UTF8
+        self.compress_type = compress_type
+        self.dos_date, self.dos_time = dos_date_time(date_time or now_date_time())
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+        self.internal_attr = 0
+        self.external_attr = external_attr
+        self.offset = 0
+        self.extra = b""
+        self.comment = b""
+
+    def encoded_name(self) -> bytes:
+        return self.name.encode("utf-8" if self.flag_bits & FLAG_UTF8 else "cp437")
+
+    # Central directory header, with a zip64 extra field if needed
+    def central_header(self) -> bytes:
+        zip64_values = []
+        size, compressed_size, offset = self.size, self.compressed_size, self.offset
+        if size >= ZIP64_LIMIT:
+            zip64_values.append(size)
+            size = ZIP64_LIMIT
+        if compressed_size >= ZIP64_LIMIT:
+            zip64_values.append(compressed_size)
+            compressed_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            zip64_values.append(offset)
+            offset = ZIP64_LIMIT
+        extra = self.extra
+        extract_version = self.extract_version
+        create_version = self.create_version
+        if zip64_values:
+            extra = struct.pack(f"<2H{len(zip64_values)}Q", ZIP64_EXTRA_ID, 8 * len(zip64_values), *zip64_values) + extra
+            extract_version = max(extract_version, ZIP64_VERSION)
+            create_version = max(create_version, ZIP64_VERSION)
+        name = self.encoded_name()
+        header = CENTRAL_DIR_STRUCT.pack(CENTRAL_DIR_SIGNATURE, create_version, self.create_system, extract_version, 0,
+                                         self.flag_bits, self.compress_type, self.dos_time, self.dos_date, self.crc,
+                                         compressed_size, size, len(name), len(extra), len(self.comment), 0,
+                                         self.internal_attr, self.external_attr, offset)
+        return header + name + extra + self.comment
+
+    # Local file header. With zip64, both sizes are in the extra field.
+    def local_header(self, zip64: bool) -> bytes:
+        size, compressed_size = self.size, self.compressed_size
+        extra = self.extra
+        extract_version = self.extract_version
+        if zip64:
+            extra = struct.pack("<2H2Q", ZIP64_EXTRA_ID, 16, size, compressed_size) + extra
+            size = compressed_size = ZIP64_LIMIT
+            extract_version = max(extract_version, ZIP64_VERSION)
+        name = self.encoded_name()
+        header = LOCAL_HEADER_STRUCT.pack(LOCAL_HEADER_SIGNATURE, extract_version, 0, self.flag_bits & ~FLAG_DATA_DESCRIPTOR,
+                                          self.compress_type, self.dos_time, self.dos_date, self.crc, compressed_size,
+                                          size, len(name), len(extra))
+        return header + name + extra
+
+def parse_central_record(data: bytes, position: int) -> Tuple[CentralRecord, int]:
+    # Parse the central directory header at position, return it with the position of the next one
+    if data[position:position + 4] != CENTRAL_DIR_SIGNATURE:
+        raise zipfile.BadZipFile("Bad magic number for central directory")
+    (_, create_version, create_system, extract_version, _, flag_bits, compress_type, dos_time, dos_date, crc,
+     compressed_size, size, name_length, extra_length, comment_length, _, internal_attr, external_attr,
+     offset) = CENTRAL_DIR_STRUCT.unpack_from(data, position)
+    position += CENTRAL_DIR_STRUCT.size
+    raw_name = data[position:position + name_length]
+    position += name_length
+    extra = data[position:position + extra_length]
+    position += extra_length
+    comment = data[position:position + comment_length]
+    position += comment_length
+    # Same name decoding as zipfile
+    record = CentralRecord.__new__(CentralRecord)
+    record.name = raw_name.decode("utf-8" if flag_bits & FLAG_UTF8 else "cp437")
+    record.create_version = create_version
+    record.create_system = create_system
+    record.extract_version = extract_version
+    record.flag_bits = flag_bits
+    record.compress_type = compress_type
+    record.dos_time = dos_time
+    record.dos_date = dos_date
+    record.crc = crc
+    record.size, record.compressed_size, record.offset = read_zip64_extra(extra, size, compressed_size, offset)
+    record.internal_attr = internal_attr
+    record.external_attr = external_attr
+    record.extra = strip_zip64_extra(extra)
+    record.comment = comment
+    return record, position
+
+def read_central_records(f: BinaryIO) -> List[CentralRecord]:
+    # Read all the central directory headers of a zip, offsets are absolute positions in the file
+    # Find the end of central directory record
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    tail_size = min(file_size, EOCD_MAX_SIZE)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+    eocd_position = tail.rfind(EOCD_SIGNATURE)
+    if eocd_position < 0 or eocd_position + EOCD_STRUCT.size > len(tail):
+        raise zipfile.BadZipFile("File is not a zip file")
+    _, _, _, _, entries_count, cd_size, cd_offset, _ = EOCD_STRUCT.unpack_from(tail, eocd_position)
+    cd_end = file_size - tail_size + eocd_position
+    # Zip64 archive: the real values are in the zip64 end of central directory record
+    locator_position = eocd_position - ZIP64_LOCATOR_STRUCT.size
+    if locator_position >= 0 and tail[locator_position:locator_position + 4] == ZIP64_LOCATOR_SIGNATURE:
+        _, _, zip64_eocd_offset, _ = ZIP64_LOCATOR_STRUCT.unpack_from(tail, locator_position)
+        f.seek(zip64_eocd_offset)
+        record = f.read(ZIP64_EOCD_STRUCT.size)
+        if len(record) == ZIP64_EOCD_STRUCT.size and record[:4] == ZIP64_EOCD_SIGNATURE:
+            _, _, _, _, _, _, _, entries_count, cd_size, cd_offset = ZIP64_EOCD_STRUCT.unpack(record)
+            cd_end = zip64_eocd_offset
+    # Bytes prepended to the zip (self-extracting archives), offsets in the zip are relative to its start
+    concat = cd_end - cd_size - cd_offset
+    if concat < 0:
+        raise zipfile.BadZipFile("Bad central directory offset")
+    f.seek(cd_offset + concat)
+    data = f.read(cd_size)
+    records = []
+    position = 0
+    for _ in range(entries_count):
+        record, position = parse_central_record(data, position)
+        record.offset += concat
+        records.append(record)
+    return records
+
+def end_of_central_directory(entries_count: int, cd_offset: int, cd_size: int) -> bytes:
+    # End of central directory, preceded by the zip64 records if needed
+    records = b""
+    if entries_count >= ZIP64_COUNT_LIMIT or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_eocd_offset = cd_offset + cd_size
+        records += ZIP64_EOCD_STRUCT.pack(ZIP64_EOCD_SIGNATURE, ZIP64_EOCD_STRUCT.size - 12, ZIP64_VERSION, ZIP64_VERSION, 0, 0, entries_count, entries_count, cd_size, cd_offset)
+        records += ZIP64_LOCATOR_STRUCT.pack(ZIP64_LOCATOR_SIGNATURE, 0, zip64_eocd_offset, 1)
+        entries_count = min(entries_count, ZIP64_COUNT_LIMIT)
+        cd_offset = min(cd_offset, ZIP64_LIMIT)
+        cd_size = min(cd_size, ZIP64_LIMIT)
+    records += EOCD_STRUCT.pack(EOCD_SIGNATURE, 0, 0, entries_count, entries_count, cd_size, cd_offset, 0)
+    return records
+
+""" WRITER """
+
+class RawZipWriter:
+    # Low level zip writer: entries are written from raw compressed data or compressed by chunks
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.records: List[CentralRecord] = []
+
+    # Copy an entry of another zip as is: local header, compressed data, and data descriptor
+    def write_raw_entry(self, source: BinaryIO, record: CentralRecord):
+        source.seek(record.offset)
+        header = source.read(LOCAL_HEADER_STRUCT.size)
+        if header[:4] != LOCAL_HEADER_SIGNATURE:
+            raise ValueError(f"Bad magic number for file header: {record.name}")
+        _, _, _, flag_bits, _, _, _, _, _, _, name_length, extra_length = LOCAL_HEADER_STRUCT.unpack(header)
+        header += source.read(name_length + extra_length)
+        local_extra = header[LOCAL_HEADER_STRUCT.size + name_length:]
+        new_record = self._copy_record(record)
+        new_record.offset = self.f.tell()
+        self.f.write(header)
+        remaining = record.compressed_size
+        while remaining > 0:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ValueError(f"Truncated zip entry: {record.name}")
+            self.f.write(chunk)
+            remaining -= len(chunk)
+        if flag_bits & FLAG_DATA_DESCRIPTOR:
+            # crc and sizes, 8 bytes sizes for zip64 entries, with an optional signature
+            zip64 = record.size >= ZIP64_LIMIT or record.compressed_size >= ZIP64_LIMIT or read_zip64_extra(local_extra, ZIP64_LIMIT, 0, 0)[0] != ZIP64_LIMIT
+            descriptor_size = 20 if zip64 else 12
+            descriptor = source.read(4)
+            if descriptor == DATA_DESCRIPTOR_SIGNATURE:
+                descriptor += source.read(descriptor_size)
+            else:
+                descriptor += source.read(descriptor_size - 4)
+            self.f.write(descriptor)
+        self.records.append(new_record)
+
+    # Write an entry from data already compressed with record.compress_type
+    def write_compressed(self, record: CentralRecord, compressed: bytes):
+        record.offset = self.f.tell()
+        record.compressed_size = len(compressed)
+        self.f.write(record.local_header(record.size >= ZIP64_LIMIT or record.compressed_size >= ZIP64_LIMIT))
+        self.f.write(compressed)
+        self.records.append(record)
+
+    # Write an entry by compressing a readable file object by chunks. The header is patched when done.
+    def write_stream(self, record: CentralRecord, reader: BinaryIO, size_hint: Optional[int] = None, level: int = zlib.Z_DEFAULT_COMPRESSION):
+        # Same zip64 choice as zipfile: the compressed data may be a bit bigger than the original
+        zip64 = size_hint is None or size_hint * 1.05 > ZIP64_LIMIT
+        record.offset = self.f.tell()
+        self.f.write(record.local_header(zip64))
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if record.compress_type == ZIP_DEFLATED else None
+        crc = 0
+        size = 0
+        compressed_size = 0
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            self.f.write(chunk)
+            compressed_size += len(chunk)
+        if compressor is not None:
+            chunk = compressor.flush()
+            self.f.write(chunk)
+            compressed_size += len(chunk)
+        record.crc = crc
+        record.size = size
+        record.compressed_size = compressed_size
+        if not zip64 and (size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT):
+            raise ValueError(f"File size too large without zip64: {record.name}")
+        # Rewrite the local header with the real crc and sizes
+        end = self.f.tell()
+        self.f.seek(record.offset)
+        self.f.write(record.local_header(zip64))
+        self.f.seek(end)
+        self.records.append(record)
+
+    # Write the central directory and the end records
+    def close(self):
+        cd_offset = self.f.tell()
+        for record in self.records:
+            self.f.write(record.central_header())
+        cd_size = self.f.tell() - cd_offset
+        self.f.write(end_of_central_directory(len(self.records), cd_offset, cd_size))
+
+    def _copy_record(self, record: CentralRecord) -> CentralRecord:
+        new_record = CentralRecord.__new__(CentralRecord)
+        for slot in CentralRecord.__slots__:
+            setattr(new_record, slot, getattr(record, slot))
+        return new_record
@@ -1,12 +1,12 @@
 import argparse
 from . import __version__, __doc__
-import importlib
-from typing import Dict
 from .ATask import ATask
+from ModpackCreator.Config.ConfigStore import config_store
+from ModpackCreator.Registry.TaskRegistry import TaskRegistry
+from ModpackCreator.Tracing.BuildTracer import finish_tracing, start_tracing
+from ModpackCreator.Logging.BuildLog import LEVELS, configure_logging, finish_logging, log
 
-from typing import List
 import os
-import pkgutil
 import sys
 
 import ModpackCreator
@@ -26,90 +26,104 @@ parser.add_argument('-l', '--list-tasks', action='store_true', help='List all ta
 # Optionals arguments: tasks. -t, --tasks. Each use of this argument will add a task to the list of tasks to execute. If no tasks are passed, list is empty, all tasks will be executed.
 parser.add_argument('-t', '--tasks', action='append', help='Each use of this argument will add a task to the list of tasks to execute. All tasks selectioned if no tasks are passed.')
 
+# Optional argument: --cache-stats. Print the content of the hash cache and exit.
+parser.add_argument('--cache-stats', action='store_true', help='Print the content of the hash cache and exit.')
+
+# Optional argument: --trace. Trace the stages of the executed tasks: a Chrome trace in temp/traces and a summary table.
+parser.add_argument('--trace', action='store_true', help='Trace the stages of the executed tasks: a Chrome trace in temp/traces and a summary table.')
+
+# Optional argument: --log-level. Level of the build logs, debug adds a line per copied or deleted file. The "log_level" of the config by default.
+parser.add_argument('--log-level', choices=list(LEVELS), help='Level of the build logs, debug adds a line per copied or deleted file. The "log_level" of the config (info) by default.')
+
 # Optional argument: --setup. If you want to setup the tasks indeed of executing them. False by default.
 parser.add_argument('--setup', action='store_true', help='If you want to setup the tasks instead of executing them. False by default.')
 
-def import_all_tasks_in_directory(dir_path: str) -> Dict[str, ATask]:
-    # tasksmap: Dict[str, ATask] = {}
-    tasks_map: Dict[str, ATask] = {}
-    # Verify that the directory exists
-    if not os.path.isdir(dir_path):
-        raise Exception(f"Directory {dir_path} does not exist")
-    # Get the list of directories in the directory
-    dirs = os.listdir(dir_path)
-    # For each directory
-    for dir in dirs:
-        # If the directory is a python module and is not nammed common
-        if os.path.isdir(dir_path + "/" + dir) and dir != "common":
-            # Import the module
-            module = importlib.import_module(f"{dir_path}.{dir}", package='')
-            # Add the module to the list of modules
-            tasks_map[dir] = module.task.Task
-    return tasks_map
-
-# Task map
-
-def import_all_built_in_tasks() -> Dict[str, ATask]:
-    builtin_tasks_map: Dict[str, ATask] = {}
-    builtins_tasks = pkgutil.iter_modules(ModpackCreator.BuiltInTasks.__path__)
-    for task in builtins_tasks:
-        if task.name != "common":
-            builtin_tasks_map[task.name] = importlib.import_module(f"ModpackCreator.BuiltInTasks.{task.name}").task.Task
-    return builtin_tasks_map
-
-def list_all_tasks(builtin_tasks_map: Dict[str, ATask], added_tasks_map: Dict[str, ATask]):
+# Task names of the built-in tasks and of the tasks directory, the tasks are imported when they run
+def load_task_registry() -> TaskRegistry:
+    return TaskRegistry(ModpackCreator.BuiltInTasks.__path__[0], "ModpackCreator.BuiltInTasks", "tasks")
+
+def print_cache_stats():
+    # Imported here: the hash cache pulls multiprocessing and sqlite3, the other commands don't need them
+    from ModpackCreator.Hashing.HashCache import load_hash_cache
+    # Hash cache of the config, the default one if there is no config
+    config = config_store().snapshot()
+    hash_cache = load_hash_cache(config)
+    if hash_cache is None:
+        print("The hash cache is disabled")
+        return
+    print(hash_cache.stats())
+    hash_cache.close()
+
+def list_all_tasks(registry: TaskRegistry):
     print("Built-in tasks:")
-    for task_name in builtin_tasks_map.keys():
+    for task_name in registry.builtin_names():
         print(f"  {task_name}")
     print("Added tasks:")
-    for task_name in added_tasks_map.keys():
+    for task_name in registry.added_names():
         print(f"  {task_name}")
 
 # Run function
 def run():
     # Parse the arguments
     args = parser.parse_args()
-    # Import all tasks
-    builtin_tasks_map = import_all_built_in_tasks()
-    added_tasks_map = import_all_tasks_in_directory("tasks")
+    # If cache-stats argument is passed
+    if args.cache_stats:
+        print_cache_stats()
+        exit(0)
+    # List the tasks, none is imported yet
+    registry = load_task_registry()
     # If list-tasks argument is passed
     if args.list_tasks:
-        list_all_tasks(builtin_tasks_map=builtin_tasks_map, added_tasks_map=added_tasks_map)
+        list_all_tasks(registry)
         exit(0)
     # If no tasks argument is passed (list is empty)
-    if len(args.tasks) == 0:
+    if not args.tasks:
         if not args.setup:
             print("You can't execute all tasks at once. Use --setup to setup all tasks, or pass the tasks you want to execute with -t")
             exit(1)
-        tasks = builtin_tasks_map.keys()
+        tasks = registry.builtin_names()
     # If tasks argument is not passed
     else:
         tasks = args.tasks
+    # Logging and tracing settings of the config ("log_level", "log_json", "trace", "trace_dir", "trace_tracemalloc")
+    config = config_store().snapshot()
+    configure_logging(config, args.log_level)
     # If setup argument is passed
     if args.setup:
-        # Setup the tasks
-        for task in tasks:
-            print(f"Setting up {task}")
-            task: ATask = builtin_tasks_map[task]()
-            # Print type
-            task.setup()
-        pass
+        # Setup the tasks, the config is written once for all of them
+        try:
+            with config_store().batch():
+                for task in tasks:
+                    if task not in registry:
+                        log.error(f"Task {task} does not exist")
+                        exit(1)
+                    print(f"Setting up {task}")
+                    task: ATask = registry.get(task)()
+                    # Print type
+                    task.setup()
+        finally:
+            finish_logging()
     # If setup argument is not passed
     else:
-        # Execute the tasks
-        for task in tasks:
-            print(f"Executing {task}")
-            if task in builtin_tasks_map and not task in added_tasks_map:
-                print(f"Task {task} is a built-in task")
-                task: ATask = builtin_tasks_map[task]()
-                task.run()
-            elif task in added_tasks_map:
-                print(f"Task {task} is an added task")
-                task: ATask = added_tasks_map[task]()
-                task.run()
-            else:
-                print(f"Task {task} does not exist")
-                exit(1)
+        start_tracing(config, args.trace)
+        try:
+            # Execute the tasks
+            for task in tasks:
+                log.info(f"Executing {task}")
+                if registry.is_builtin(task):
+                    log.info(f"Task {task} is a built-in task")
+                    task: ATask = registry.get(task)()
+                    task.run()
+                elif task in registry:
+                    log.info(f"Task {task} is an added task")
+                    task: ATask = registry.get(task)()
+                    task.run()
+                else:
+                    log.error(f"Task {task} does not exist")
+                    exit(1)
+        finally:
+            finish_tracing(config, "tasks")
+            finish_logging()
 
 # If this file is executed
 if __name__ == "__main__":
@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from bench_startup import budget_failures, measure_commands
+
+# Same budget as benchmarks/bench_startup.py, for --version, --list-tasks and -t
+BUDGET_MS = 100.0
+
+
+def test_startup_budget():
+    results = measure_commands("BuildMMCPackFromExport", runs=3, top=10)
+    assert budget_failures(results, BUDGET_MS) == []
+    assert results["version"]["tasks"] == []
+    assert results["list-tasks"]["tasks"] == []
+    assert results["task"]["tasks"] == ["BuildMMCPackFromExport"]